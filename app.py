@@ -1,71 +1,211 @@
 import os
+import re
 import json
-from google.oauth2 import service_account
-import json
-from werkzeug.middleware.proxy_fix import ProxyFix
-import requests
 import pathlib
+from urllib.parse import urldefrag, urlsplit
+from email.utils import parsedate_to_datetime
+import random
 import time
 import base64
 from datetime import datetime, timedelta, timezone
 from email.mime.text import MIMEText
-from flask import Flask, render_template, request, session, redirect, url_for
-from dotenv import load_dotenv
-from authlib.integrations.flask_client import OAuth
-# --- Pydantic Import ---
-from pydantic import BaseModel, Field
-#--Selenium Import---
-import time
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait, Select
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.keys import Keys
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service as ChromeService 
 import uuid
-# --- LangChain Imports ---
-from langchain.agents import AgentExecutor, create_react_agent
-from langchain_core.prompts import PromptTemplate
-from langchain_core.tools import tool
-from langchain import hub
-from langchain_community.tools import DuckDuckGoSearchRun
-from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.exceptions import OutputParserException
-# --- Google API Imports ---
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
+import queue
+import functools
+import inspect
+from typing import Annotated
+from concurrent.futures import ThreadPoolExecutor, Future
+import shutil
+import tempfile
+import sqlite3
+import atexit
+import hashlib
+import hmac
+import secrets
+import heapq
+import threading
+from contextlib import contextmanager, nullcontext
+from collections import OrderedDict, deque
+
+
+# ==============================================
+# STARTUP REPORT
+# ==============================================
+# Explanation: Importing this module used to import Selenium, build the
+# Supabase client, the service-account credentials and the Gemini client,
+# pull an (unused) prompt from the LangChain hub over the network and build
+# the agent, all before gunicorn could answer a single request. Heavy
+# clients are now `LazyResource`s built on first use, Selenium and
+# langchain-community are imported by the code that needs them, and the app
+# itself comes from `create_app`. `startup_report` records what is still
+# paid at boot (imports, eager init) and what was deferred (lazy, with how
+# long after boot it was first needed); it is printed once the app is
+# created and served at /stats/startup.
+class StartupReport:
+    """Wall time spent importing and initializing each component, in order."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._entries = []
+        self.ready_after = None
+
+    @contextmanager
+    def phase(self, component: str, kind: str = "import"):
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            self.record(component, kind, time.perf_counter() - start, start, error)
+
+    def record(self, component: str, kind: str, seconds: float, started_at: float, error: str = None):
+        entry = {
+            "component": component,
+            "kind": kind,
+            "ms": round(seconds * 1000, 1),
+            "at_ms": round((started_at - self.started) * 1000, 1),
+        }
+        if error:
+            entry["error"] = error
+        with self._lock:
+            self._entries.append(entry)
+
+    def mark_ready(self):
+        self.ready_after = time.perf_counter() - self.started
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            entries = list(self._entries)
+        boot = [e for e in entries if e["kind"] != "lazy"]
+        return {
+            "ready_ms": round(self.ready_after * 1000, 1) if self.ready_after is not None else None,
+            "boot_ms_by_kind": {
+                kind: round(sum(e["ms"] for e in boot if e["kind"] == kind), 1) for kind in ("import", "init")
+            },
+            "components": entries,
+        }
+
+    def log(self):
+        report = self.to_dict()
+        print(f"🚀 Startup report: ready in {report['ready_ms']} ms")
+        for entry in report["components"]:
+            print(f"   {entry['kind']:<7}{entry['component']:<32}{entry['ms']:>9.1f} ms")
+
+
+startup_report = StartupReport()
+
+
+class LazyResource:
+    """
+    A client that is built on first use. Attribute access is forwarded to the
+    built object, so call sites like `supabase.table(...)` stay unchanged.
+    """
+
+    def __init__(self, name: str, factory):
+        self.name = name
+        self._factory = factory
+        self._value = None
+        self._lock = threading.Lock()
+        lazy_resources.append(self)
+
+    @property
+    def loaded(self) -> bool:
+        return self._value is not None
+
+    def get(self):
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    with startup_report.phase(self.name, kind="lazy"):
+                        self._value = self._factory()
+        return self._value
+
+    def __getattr__(self, attr):
+        return getattr(self.get(), attr)
+
+
+lazy_resources = []
+
+
+with startup_report.phase("flask, authlib, pydantic"):
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    from werkzeug.exceptions import RequestEntityTooLarge
+    from flask import Flask, Blueprint, render_template, request, session, redirect, url_for, jsonify, Response, stream_with_context, send_from_directory, g
+    from dotenv import load_dotenv
+    from authlib.integrations.flask_client import OAuth
+    # --- Pydantic Import ---
+    from pydantic import BaseModel, Field
+
+with startup_report.phase("requests, lxml, filetype"):
+    import requests
+    from requests.adapters import HTTPAdapter
+    import filetype
+    from lxml import html as lxml_html
+
+# Selenium is imported by the functions that drive Chrome, and
+# langchain-community by the web search factory, so neither is paid at boot.
+with startup_report.phase("langchain"):
+    # --- LangChain Imports ---
+    from langchain.agents import AgentExecutor, create_react_agent
+    from langchain.agents.output_parsers import ReActSingleInputOutputParser
+    from langchain.agents.output_parsers.react_single_input import FINAL_ANSWER_ACTION
+    from langchain_core.agents import AgentAction
+    from langchain_core.prompts import PromptTemplate
+    from langchain_core.tools import tool, Tool, InjectedToolArg
+    from langchain_core.runnables.history import RunnableWithMessageHistory
+    from langchain_core.runnables import RunnableLambda
+    from langchain_core.callbacks import BaseCallbackHandler
+    from langchain_core.chat_history import BaseChatMessageHistory
+    from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+    from langchain_core.exceptions import OutputParserException
+
+with startup_report.phase("google api client"):
+    # --- Google API Imports ---
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import Flow
+    from googleapiclient.discovery import build, build_from_document
+    from googleapiclient import discovery_cache
+    from googleapiclient.errors import HttpError
+    from googleapiclient.http import BatchHttpRequest
+    from google_auth_httplib2 import AuthorizedHttp
+    import httplib2
+    from google.auth.transport.requests import Request
+    from google.auth.exceptions import RefreshError
 
 # ==============================================
 # ENV SETUP
 # ==============================================
 load_dotenv()
-from supabase import create_client, Client
 
 # Initialize Supabase
 supabase_url = os.getenv("SUPABASE_URL")
 supabase_key = os.getenv("SUPABASE_KEY")
 if not supabase_url or not supabase_key:
     raise ValueError("Supabase URL and Key must be set in the environment variables.")
-supabase: Client = create_client(supabase_url, supabase_key)
-print("✅ Supabase client initialized")
+
+
+def create_supabase_client():
+    from supabase import create_client
+    client = create_client(supabase_url, supabase_key)
+    print("✅ Supabase client initialized")
+    return client
+
+
+supabase = LazyResource("supabase client", create_supabase_client)
+
 # Flask setup
-app = Flask(__name__)
-app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1) 
-app.secret_key = os.getenv("FLASK_SECRET_KEY", "a-truly-secret-key-for-production")
-from datetime import timedelta
-# Tells Flask to make sessions permanent and last for 30 days
-app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=30)
+# Explanation: Routes live on the `web` blueprint; `create_app` (at the end of
+# this file) builds the Flask app around it.
+web = Blueprint("web", __name__)
 # LinkedIn OAuth Setup
 # Explanation: This configures Authlib to handle the LinkedIn OAuth2 flow.
 # We define the URLs and the permissions (scopes) our app needs.
-oauth = OAuth(app)
+# The Flask app is attached in `create_app` (oauth.init_app).
+oauth = OAuth()
 
 linkedin = oauth.register(
     name='linkedin',
@@ -81,49 +221,900 @@ linkedin = oauth.register(
     client_auth_method='client_secret_post')
 
 
-print("✅ LinkedIn OAuth client initialized")
-
-
 # SCOPES to include Calendar
 SCOPES = [
     "https://www.googleapis.com/auth/gmail.send",
     "https://www.googleapis.com/auth/calendar"
 ]
 
-def get_linkedin_credentials():
+# ==============================================
+# CREDENTIAL CACHE
+# ==============================================
+# Explanation: Every tool call and every status poll used to run a fresh
+# Supabase query. We keep the rows we read in a small in-process cache keyed
+# by (session_id, provider). Entries expire after a TTL and the least recently
+# used ones are evicted once the cache is full. "Not connected" answers are
+# cached too, so idle tabs polling the status endpoints cost no database I/O.
+CREDENTIAL_CACHE_TTL = int(os.getenv("CREDENTIAL_CACHE_TTL", "300"))
+CREDENTIAL_CACHE_MAX_ENTRIES = int(os.getenv("CREDENTIAL_CACHE_MAX_ENTRIES", "1024"))
+
+# Only the columns the credential helpers actually read
+CREDENTIAL_COLUMNS = {
+    "google": "id, access_token, refresh_token, expires_at, other_details",
+    "linkedin": "id, access_token, refresh_token, expires_at, other_details",
+}
+
+
+class TTLCache:
+    """A small thread-safe cache with a per-entry TTL and LRU eviction."""
+
+    def __init__(self, ttl: int, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns (hit, value). A cached None is a hit, e.g. 'no credentials stored'."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+credential_cache = TTLCache(CREDENTIAL_CACHE_TTL, CREDENTIAL_CACHE_MAX_ENTRIES)
+
+
+def fetch_credential_row(session_id: str, provider: str):
+    """
+    Returns the stored credentials row for this session and provider, or None.
+    Reads go through `credential_cache`; Supabase is only queried on a miss.
+    Exceptions from Supabase are not cached and propagate to the caller.
+    """
+    hit, row = credential_cache.get((session_id, provider))
+    if hit:
+        return row
+
+    response = timed_query("select", supabase.table("user_credentials").select(CREDENTIAL_COLUMNS[provider]).eq("session_id", session_id).eq("provider", provider))
+    row = response.data[0] if response.data else None
+    credential_cache.set((session_id, provider), row)
+    return row
+
+
+def fetch_credential_rows(session_id: str, providers: list) -> dict:
+    """
+    Like `fetch_credential_row` for several providers at once.
+    Any providers missing from the cache are resolved with a single
+    `provider IN (...)` query instead of one round trip each.
+    """
+    rows = {}
+    missing = []
+    for provider in providers:
+        hit, row = credential_cache.get((session_id, provider))
+        if hit:
+            rows[provider] = row
+        else:
+            missing.append(provider)
+
+    if missing:
+        columns = ", ".join(sorted({c.strip() for p in missing for c in CREDENTIAL_COLUMNS[p].split(",")} | {"provider"}))
+        response = timed_query("select", supabase.table("user_credentials").select(columns).eq("session_id", session_id).in_("provider", missing))
+        found = {r["provider"]: r for r in (response.data or [])}
+        for provider in missing:
+            rows[provider] = found.get(provider)
+            credential_cache.set((session_id, provider), rows[provider])
+
+    return rows
+
+
+# ==============================================
+# STATUS CHANGE NOTIFICATIONS
+# ==============================================
+# Explanation: The combined status endpoint needs to know when a session's
+# connections last changed (for Last-Modified) and the optional SSE stream
+# needs to wake up when an OAuth callback completes. This keeps a tiny
+# per-session change time, bounded like the credential cache.
+STATUS_STREAM_ENABLED = os.getenv("STATUS_STREAM_ENABLED", "false").lower() == "true"
+STATUS_STREAM_MAX_SECONDS = int(os.getenv("STATUS_STREAM_MAX_SECONDS", "300"))
+STATUS_STREAM_KEEPALIVE_SECONDS = 15
+
+
+class StatusNotifier:
+    """Tracks when each session's service status last changed and wakes up waiters."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.started_at = datetime.now(timezone.utc).replace(microsecond=0)
+        self._changed_at = OrderedDict()
+        self._condition = threading.Condition()
+
+    def last_changed(self, session_id: str) -> datetime:
+        with self._condition:
+            return self._changed_at.get(session_id, self.started_at)
+
+    def notify(self, session_id: str):
+        with self._condition:
+            # HTTP dates have one-second resolution, so always move forward by at least that much
+            now = datetime.now(timezone.utc).replace(microsecond=0)
+            previous = self._changed_at.get(session_id, self.started_at)
+            self._changed_at[session_id] = max(now, previous + timedelta(seconds=1))
+            self._changed_at.move_to_end(session_id)
+            while len(self._changed_at) > self.max_entries:
+                self._changed_at.popitem(last=False)
+            self._condition.notify_all()
+
+    def wait_for_change(self, session_id: str, since: datetime, timeout: float) -> bool:
+        """Blocks until the session changes after `since` or the timeout passes."""
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self._changed_at.get(session_id, self.started_at) > since,
+                timeout=timeout,
+            )
+
+
+status_notifier = StatusNotifier(CREDENTIAL_CACHE_MAX_ENTRIES)
+
+
+def credentials_changed(session_id: str, provider: str):
+    """Call whenever a stored credential is created, replaced or removed."""
+    credential_cache.invalidate((session_id, provider))
+    if provider == "google":
+        # A different Google account may have been connected
+        calendar_index.invalidate(session_id)
+    status_notifier.notify(session_id)
+
+
+# ==============================================
+# METRICS
+# ==============================================
+# Explanation: The only observability used to be emoji print() lines. Hot
+# paths now record latency histograms: every Flask endpoint (home() end to
+# end included), each agent tool, every Gemini call, every Supabase query,
+# each Selenium phase (driver startup, page load, per-field fill, submit) and
+# every outbound HTTP call. Gauges for the conversation store and live Chrome
+# processes are read when scraped. Everything is exposed in the Prometheus
+# text format at /metrics.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float("inf"))
+
+
+class LatencyHistogram:
+    """Cumulative-bucket latency histogram (Prometheus style), in seconds."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    self.counts[i] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "count": self.count,
+                "sum": round(self.total, 6),
+                "buckets": {format_bucket(b): c for b, c in zip(self.buckets, self.counts)},
+            }
+
+
+def format_bucket(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else str(bound)
+
+
+def escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label_value(value)}"' for name, value in labels.items()) + "}"
+
+
+class MetricFamily:
+    """A named metric with one child per distinct label set."""
+
+    kind = None
+
+    def __init__(self, name: str, documentation: str, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+            return child
+
+    def children(self) -> list:
+        with self._lock:
+            return [(dict(zip(self.label_names, key)), child) for key, child in self._children.items()]
+
+
+class HistogramFamily(MetricFamily):
+    kind = "histogram"
+
+    def _new_child(self):
+        return LatencyHistogram()
+
+    def observe(self, seconds: float, **labels):
+        self.labels(**labels).observe(seconds)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list:
+        lines = []
+        for labels, histogram in self.children():
+            snapshot = histogram.snapshot()
+            for bound, count in snapshot["buckets"].items():
+                lines.append(f"{self.name}_bucket{format_labels({**labels, 'le': bound})} {count}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {snapshot['sum']}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {snapshot['count']}")
+        return lines
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class CounterFamily(MetricFamily):
+    kind = "counter"
+
+    def _new_child(self):
+        return Counter()
+
+    def inc(self, amount: float = 1, **labels):
+        self.labels(**labels).inc(amount)
+
+    def render(self) -> list:
+        return [f"{self.name}{format_labels(labels)} {counter.value}" for labels, counter in self.children()]
+
+
+class CallbackMetric:
+    """A gauge or counter whose samples are read from `collect()` at scrape time."""
+
+    def __init__(self, name: str, documentation: str, kind: str, collect):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.collect = collect  # -> a number, or a list of (labels, value)
+
+    def render(self) -> list:
+        samples = self.collect()
+        if not isinstance(samples, list):
+            samples = [({}, samples)]
+        return [f"{self.name}{format_labels(labels)} {value}" for labels, value in samples]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def histogram(self, name: str, documentation: str, label_names=()) -> HistogramFamily:
+        return self._register(HistogramFamily(name, documentation, label_names))
+
+    def counter(self, name: str, documentation: str, label_names=()) -> CounterFamily:
+        return self._register(CounterFamily(name, documentation, label_names))
+
+    def gauge_callback(self, name: str, documentation: str, collect):
+        return self._register(CallbackMetric(name, documentation, "gauge", collect))
+
+    def counter_callback(self, name: str, documentation: str, collect):
+        return self._register(CallbackMetric(name, documentation, "counter", collect))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            try:
+                samples = metric.render()
+            except Exception as e:
+                print(f"⚠️ Could not collect metric {metric.name}: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+request_latency = metrics.histogram(
+    "http_request_duration_seconds", "Time to handle a request, by Flask endpoint.", ["endpoint", "method"]
+)
+tool_latency = metrics.histogram("agent_tool_duration_seconds", "Time spent in each agent tool call.", ["tool"])
+llm_latency = metrics.histogram("llm_invoke_duration_seconds", "Time per Gemini call.", ["model"])
+supabase_latency = metrics.histogram(
+    "supabase_query_duration_seconds", "Time per Supabase query.", ["operation"]
+)
+selenium_latency = metrics.histogram(
+    "selenium_phase_duration_seconds", "Time per Selenium phase: driver_startup, page_load, field_fill, submit.", ["phase"]
+)
+outbound_http_latency = metrics.histogram(
+    "outbound_http_request_duration_seconds", "Time per outbound HTTP attempt, by upstream.", ["upstream"]
+)
+outbound_http_errors = metrics.counter(
+    "outbound_http_errors_total", "Outbound HTTP attempts that failed or got a retryable status.", ["upstream"]
+)
+
+
+def timed_query(operation: str, query):
+    """Executes a Supabase query builder, timing it into `supabase_latency`."""
+    with supabase_latency.time(operation=operation):
+        return query.execute()
+
+
+class LLMMetricsCallbackHandler(BaseCallbackHandler):
+    """Attached to the LLM objects themselves, so every call is timed, in or outside the agent."""
+
+    def __init__(self):
+        self._started = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        self._started[run_id] = (time.perf_counter(), (metadata or {}).get("ls_model_name", "unknown"))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        self.on_llm_start(serialized, [], run_id=run_id, metadata=metadata)
+
+    def _finish(self, run_id):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            start, model = started
+            llm_latency.observe(time.perf_counter() - start, model=model)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id)
+
+
+llm_metrics_callback = LLMMetricsCallbackHandler()
+
+
+# ==============================================
+# OUTBOUND HTTP
+# ==============================================
+# Explanation: LinkedIn, weatherstack and the form-page checks used bare
+# `requests` calls: a new TCP/TLS connection per call and no timeout, so a
+# hung upstream could hold a worker thread until gunicorn killed it. All
+# outbound calls now go through one shared client with keep-alive pools per
+# host, default (connect, read) timeouts, and retries with jittered
+# exponential backoff that honor Retry-After. Each call is timed into a
+# latency histogram for its upstream; see /stats/upstreams.
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+HTTP_POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", "16"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "10"))
+# A Retry-After longer than this is not worth waiting for inside a request
+HTTP_RETRY_AFTER_MAX = float(os.getenv("HTTP_RETRY_AFTER_MAX", "30"))
+# Overridable so benchmarks can point them at local stand-ins
+LINKEDIN_API_BASE_URL = os.getenv("LINKEDIN_API_BASE_URL", "https://api.linkedin.com").rstrip("/")
+WEATHERSTACK_BASE_URL = os.getenv("WEATHERSTACK_BASE_URL", "https://api.weatherstack.com").rstrip("/")
+
+# Statuses worth another attempt. Only 429 is retried for non-idempotent
+# methods: it means the upstream refused the request without acting on it.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+def parse_retry_after(value):
+    """Retry-After is either delay-seconds or an HTTP-date. Returns seconds, or None."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class HttpClient:
+    """A shared requests.Session with pooling, default timeouts, retries and per-upstream timings."""
+
+    def __init__(self, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT), max_retries=HTTP_MAX_RETRIES):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        # Retries are ours (below); the adapter only pools connections per host
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_SIZE, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _backoff(self, attempt: int, retry_after=None) -> float:
+        if retry_after is not None:
+            return retry_after
+        # "Full jitter": spreads retries from many clients instead of syncing them up
+        return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt))
+
+    def request(self, method: str, url: str, upstream: str = None, retry: bool = None, **kwargs) -> requests.Response:
+        """
+        Sends a request. `upstream` names the histogram the call is timed into
+        (defaults to the host). `retry` defaults to True for idempotent methods;
+        other calls are still retried on connect timeouts and 429s, where the
+        upstream never acted on the request.
+        """
+        method = method.upper()
+        upstream = upstream or urlsplit(url).hostname or "unknown"
+        kwargs.setdefault("timeout", self.timeout)
+        if retry is None:
+            retry = method in IDEMPOTENT_METHODS
+        histogram = outbound_http_latency.labels(upstream=upstream)
+        errors = outbound_http_errors.labels(upstream=upstream)
+        # A streamed file body has to be rewound before it can be sent again
+        body = kwargs.get("data")
+        body_start = body.tell() if hasattr(body, "seek") else None
+
+        attempt = 0
+        while True:
+            if attempt and body_start is not None:
+                body.seek(body_start)
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                histogram.observe(time.perf_counter() - start)
+                errors.inc()
+                # Anything past the connect phase may already have reached the upstream
+                safe = retry or isinstance(e, requests.ConnectTimeout)
+                if attempt >= self.max_retries or not safe:
+                    raise
+                delay = self._backoff(attempt)
+                print(f"⚠️ {upstream}: {type(e).__name__}, retrying in {delay:.2f}s")
+            else:
+                histogram.observe(time.perf_counter() - start)
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                errors.inc()
+                if attempt >= self.max_retries or not (retry or response.status_code == 429):
+                    return response
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if retry_after is not None and retry_after > HTTP_RETRY_AFTER_MAX:
+                    return response
+                delay = self._backoff(attempt, retry_after)
+                print(f"⚠️ {upstream}: HTTP {response.status_code}, retrying in {delay:.2f}s")
+                response.close()
+            attempt += 1
+            time.sleep(delay)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> requests.Response:
+        return self.request("PUT", url, **kwargs)
+
+    def stats(self) -> dict:
+        errors = {labels["upstream"]: counter.value for labels, counter in outbound_http_errors.children()}
+        return {
+            labels["upstream"]: {**histogram.snapshot(), "errors": errors.get(labels["upstream"], 0)}
+            for labels, histogram in outbound_http_latency.children()
+        }
+
+
+http_client = HttpClient()
+
+
+# ==============================================
+# REQUEST CONTEXT
+# ==============================================
+# Explanation: Tools used to read the Flask `session` proxy directly, which
+# only works on the request thread. Instead each request builds a ToolContext
+# and the agent gets tool instances bound to it (see `bind_tools`), so tools
+# can run on any thread: worker pools, streaming threads, async workers.
+# The uploaded LinkedIn image waiting to be posted (a LinkedInImageUpload) is
+# kept server-side for the same reason: a tool may consume it after the
+# response has started.
+PENDING_LINKEDIN_ASSET_TTL = int(os.getenv("PENDING_LINKEDIN_ASSET_TTL", str(24 * 3600)))
+
+pending_linkedin_assets = TTLCache(PENDING_LINKEDIN_ASSET_TTL, CREDENTIAL_CACHE_MAX_ENTRIES)
+
+
+class ToolContext:
+    """Everything a tool needs to know about the request it is running for."""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.linkedin_image = pending_linkedin_assets.get(session_id)[1] if session_id else None
+        self._google_credentials = None
+        self._linkedin_credentials = None
+
+    def google_credentials(self):
+        """Google credentials for this session, looked up at most once per request."""
+        if self._google_credentials is None:
+            self._google_credentials = get_google_credentials(self.session_id)
+        return self._google_credentials
+
+    def linkedin_credentials(self):
+        """(token, user) for this session, looked up at most once per request."""
+        if self._linkedin_credentials is None or self._linkedin_credentials[0] is None:
+            self._linkedin_credentials = get_linkedin_credentials(self.session_id)
+        return self._linkedin_credentials
+
+    def take_linkedin_image(self):
+        """Returns the pending uploaded image (if any) and marks it as used."""
+        image = self.linkedin_image
+        if image:
+            pending_linkedin_assets.invalidate(self.session_id)
+            self.linkedin_image = None
+        return image
+
+
+# ==============================================
+# TOKEN REFRESH
+# ==============================================
+# Explanation: Google tokens were refreshed inside whichever tool call noticed
+# the expiry, and since the row's expires_at was never handed to google-auth,
+# every Credentials object looked expired, so in practice every call
+# refreshed and wrote back to Supabase. Concurrent requests for one session
+# could all do so at once. Now:
+# - Credentials carry their real expiry, so a valid token is simply used.
+# - `token_refresher` renews tokens TOKEN_REFRESH_MARGIN seconds before
+#   expires_at on background threads, for sessions that used them within
+#   TOKEN_REFRESH_ACTIVE_WINDOW; idle sessions are left alone.
+# - Refreshes of one (session, provider) go through a single-flight lock and
+#   re-read the row first, so however many callers ask, one refresh happens.
+# - A request only refreshes inline when the token has already expired (a
+#   session returning after a long idle); it has nothing to use otherwise.
+# - A refresh the provider rejects deletes the row, as before; a network
+#   error keeps the token and retries after TOKEN_REFRESH_RETRY_DELAY.
+# LinkedIn gets the same treatment: tokens are refreshed in the background
+# when LinkedIn issued a refresh token, and expired rows without one are
+# deleted by the refresher rather than by the request that notices.
+TOKEN_REFRESH_MARGIN = int(os.getenv("TOKEN_REFRESH_MARGIN", "600"))
+TOKEN_REFRESH_ACTIVE_WINDOW = int(os.getenv("TOKEN_REFRESH_ACTIVE_WINDOW", "7200"))
+TOKEN_REFRESH_RETRY_DELAY = int(os.getenv("TOKEN_REFRESH_RETRY_DELAY", "60"))
+TOKEN_REFRESH_WORKERS = int(os.getenv("TOKEN_REFRESH_WORKERS", "2"))
+LINKEDIN_TOKEN_URL = os.getenv("LINKEDIN_TOKEN_URL", "https://www.linkedin.com/oauth/v2/accessToken")
+
+
+class TokenRefreshRejected(Exception):
+    """The provider refused the refresh token; the stored credentials are no longer usable."""
+
+
+def parse_expires_at(value: str):
+    """expires_at as an aware datetime. Google rows were stored without an offset, in UTC."""
+    if not value:
+        return None
+    expires_at = datetime.fromisoformat(value)
+    return expires_at if expires_at.tzinfo else expires_at.replace(tzinfo=timezone.utc)
+
+
+def google_credentials_from_row(cred_data: dict) -> Credentials:
+    """Rebuilds the Credentials object from a stored row, expiry included."""
+    # The other_details JSONB column holds the info needed by from_authorized_user_info
+    info = {
+        "token": cred_data.get("access_token"),
+        "refresh_token": cred_data.get("refresh_token"),
+        **cred_data.get("other_details", {}) # Unpack the rest of the details
+    }
+    expires_at = parse_expires_at(cred_data.get("expires_at"))
+    if expires_at:
+        # Without an expiry google-auth treats the token as already expired
+        info["expiry"] = expires_at.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+    return Credentials.from_authorized_user_info(info, SCOPES)
+
+
+def refresh_google_row(cred_data: dict) -> dict:
+    """Refreshes a Google token and saves it. Returns the updated row."""
+    creds = google_credentials_from_row(cred_data)
+    try:
+        creds.refresh(Request())
+    except RefreshError as e:
+        if getattr(e, "retryable", False):
+            raise
+        raise TokenRefreshRejected(str(e)) from e
+
+    updated_data = {
+        "access_token": creds.token,
+        "expires_at": creds.expiry.replace(tzinfo=timezone.utc).isoformat(),
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
+    # We update the specific record using its primary key `id`
+    timed_query("update", supabase.table("user_credentials").update(updated_data).eq("id", cred_data['id']))
+    return {**cred_data, **updated_data}
+
+
+def linkedin_oauth_error(response) -> str:
+    """The OAuth `error` code of a token endpoint response, if it has one."""
+    try:
+        body = response.json()
+    except ValueError:
+        return None
+    return body.get("error") if isinstance(body, dict) else None
+
+
+def refresh_linkedin_row(cred_data: dict) -> dict:
+    """Exchanges a LinkedIn refresh token for a new access token and saves it. Returns the updated row."""
+    response = http_client.post(LINKEDIN_TOKEN_URL, upstream="linkedin-oauth", data={
+        'grant_type': 'refresh_token',
+        'refresh_token': cred_data['refresh_token'],
+        'client_id': os.getenv('LI_CLIENT_ID'),
+        'client_secret': os.getenv('LI_CLIENT_SECRET')
+    })
+    if response.status_code in (400, 401) and linkedin_oauth_error(response) == "invalid_grant":
+        raise TokenRefreshRejected(response.text[:200])
+    # Anything else (e.g. invalid_client from a misconfigured LI_CLIENT_SECRET) says
+    # nothing about this user's token, so it is retried rather than deleting the row
+    response.raise_for_status()
+    token = response.json()
+
+    updated_data = {
+        "access_token": token['access_token'],
+        "expires_at": (datetime.now(timezone.utc) + timedelta(seconds=token.get('expires_in', 3600))).isoformat(),
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
+    if token.get('refresh_token'):
+        updated_data["refresh_token"] = token['refresh_token']
+    timed_query("update", supabase.table("user_credentials").update(updated_data).eq("id", cred_data['id']))
+    return {**cred_data, **updated_data}
+
+
+class TokenRefresher:
+    """Renews stored OAuth tokens shortly before they expire, off the request path."""
+
+    def __init__(self, refreshers: dict, margin: int, active_window: int, retry_delay: int, workers: int):
+        self.refreshers = refreshers
+        self.margin = timedelta(seconds=margin)
+        self.active_window = active_window
+        self.retry_delay = retry_delay
+        self._due = []  # heap of (when, session_id, provider)
+        self._scheduled = {}  # (session_id, provider) -> when; heap entries that disagree are stale
+        self._last_used = {}
+        self._flights = {}  # (session_id, provider) -> [lock, waiters]
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="token-refresh")
+        self._counts = {"background": 0, "inline": 0, "coalesced": 0, "rejected": 0, "expired": 0, "failed": 0, "skipped_idle": 0}
+
+    def _count(self, outcome: str):
+        with self._lock:
+            self._counts[outcome] += 1
+
+    def track(self, session_id: str, provider: str, cred_data: dict):
+        """Called whenever a request uses these credentials: keeps them refreshed while the session is active."""
+        with self._lock:
+            self._last_used[(session_id, provider)] = time.time()
+        self._schedule(session_id, provider, cred_data)
+
+    def _schedule(self, session_id: str, provider: str, cred_data: dict):
+        expires_at = parse_expires_at(cred_data.get("expires_at"))
+        if expires_at is None:
+            return
+        # Without a refresh token there is nothing to renew, only a row to delete once it expires
+        when = expires_at - self.margin if cred_data.get("refresh_token") else expires_at
+        self._schedule_at(session_id, provider, when.timestamp())
+
+    def _schedule_at(self, session_id: str, provider: str, when: float):
+        key = (session_id, provider)
+        with self._lock:
+            if self._scheduled.get(key) == when:
+                return
+            self._scheduled[key] = when
+            heapq.heappush(self._due, (when, session_id, provider))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="token-refresh-scheduler", daemon=True)
+                self._thread.start()
+            self._wakeup.notify()
+
+    def refresh_soon(self, session_id: str, provider: str):
+        """Runs the refresh (or the expiry cleanup) in the background right away."""
+        self._executor.submit(self._refresh_in_background, session_id, provider)
+
+    def forget(self, session_id: str, provider: str):
+        key = (session_id, provider)
+        with self._lock:
+            self._scheduled.pop(key, None)
+            self._last_used.pop(key, None)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._due or self._due[0][0] > time.time():
+                    self._wakeup.wait(timeout=self._due[0][0] - time.time() if self._due else None)
+                when, session_id, provider = heapq.heappop(self._due)
+                key = (session_id, provider)
+                if self._scheduled.get(key) != when:
+                    continue
+                del self._scheduled[key]
+                if time.time() - self._last_used.get(key, 0) > self.active_window:
+                    # Idle sessions get refreshed inline if they ever come back
+                    self._last_used.pop(key, None)
+                    self._counts["skipped_idle"] += 1
+                    continue
+            self._executor.submit(self._refresh_in_background, session_id, provider)
+
+    def _refresh_in_background(self, session_id: str, provider: str):
+        try:
+            self.refresh(session_id, provider)
+        except Exception as e:
+            print(f"⚠️ Background {provider} token refresh failed, retrying in {self.retry_delay}s: {e}")
+            self._count("failed")
+            self._schedule_at(session_id, provider, time.time() + self.retry_delay)
+
+    @contextmanager
+    def _single_flight(self, key):
+        with self._lock:
+            flight = self._flights.setdefault(key, [threading.Lock(), 0])
+            flight[1] += 1
+        try:
+            with flight[0]:
+                yield
+        finally:
+            with self._lock:
+                flight[1] -= 1
+                if flight[1] == 0:
+                    del self._flights[key]
+
+    def refresh(self, session_id: str, provider: str, inline: bool = False):
+        """
+        Refreshes the stored token unless it no longer needs it (e.g. another
+        caller just did). Returns the current row, or None once there are no
+        usable credentials. Errors reading Supabase propagate.
+        """
+        key = (session_id, provider)
+        with self._single_flight(key):
+            cred_data = fetch_credential_row(session_id, provider)
+            if not cred_data:
+                self.forget(session_id, provider)
+                return None
+
+            now = datetime.now(timezone.utc)
+            expires_at = parse_expires_at(cred_data.get("expires_at"))
+            if expires_at is not None and expires_at - now > self.margin:
+                # Refreshed by whoever held the lock before us
+                self._count("coalesced")
+                self._schedule(session_id, provider, cred_data)
+                return cred_data
+
+            if not cred_data.get("refresh_token"):
+                if expires_at is not None and expires_at > now:
+                    self._schedule(session_id, provider, cred_data)
+                    return cred_data
+                print(f"⏳ {provider} token has expired and can't be refreshed. User needs to re-authenticate.")
+                self._count("expired")
+                self._delete(session_id, provider, cred_data)
+                return None
+
+            try:
+                cred_data = self.refreshers[provider](cred_data)
+            except TokenRefreshRejected as e:
+                print(f"❌ {provider} token refresh was rejected: {e}")
+                self._count("rejected")
+                # The user needs to re-authenticate, so the broken credentials go
+                self._delete(session_id, provider, cred_data)
+                return None
+            except Exception as e:
+                if not inline:
+                    raise
+                # The request carries on with what it has; google-auth may still manage on its own
+                print(f"⚠️ {provider} token refresh failed, retrying in {self.retry_delay}s: {e}")
+                self._count("failed")
+                self._schedule_at(session_id, provider, time.time() + self.retry_delay)
+                return cred_data
+
+            credential_cache.set(key, cred_data)
+            self._count("inline" if inline else "background")
+            print(f"✅ {provider} token refreshed and saved.")
+            self._schedule(session_id, provider, cred_data)
+            return cred_data
+
+    def _delete(self, session_id: str, provider: str, cred_data: dict):
+        timed_query("delete", supabase.table("user_credentials").delete().eq("id", cred_data['id']))
+        self.forget(session_id, provider)
+        credentials_changed(session_id, provider)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"scheduled": len(self._scheduled), "in_flight": len(self._flights), "refreshes": dict(self._counts)}
+
+
+token_refresher = TokenRefresher(
+    {"google": refresh_google_row, "linkedin": refresh_linkedin_row},
+    TOKEN_REFRESH_MARGIN, TOKEN_REFRESH_ACTIVE_WINDOW, TOKEN_REFRESH_RETRY_DELAY, TOKEN_REFRESH_WORKERS,
+)
+
+
+def get_linkedin_credentials(session_id: str):
     """
-    Gets the current user's LinkedIn credentials from Supabase.
+    Gets the given session's LinkedIn credentials from Supabase.
     Returns the token and user data in the same format as the old session method.
     """
-    # 1. Get the current user's session_id
-    session_id = session.get("session_id")
+    # 1. Make sure we know whose credentials to load
     if not session_id:
         return None, None # No user session
 
-    # 2. Query Supabase for the stored credentials
+    # 2. Look up the stored credentials (cached, falls back to Supabase)
     try:
-        response = supabase.table("user_credentials").select("*").eq("session_id", session_id).eq("provider", "linkedin").execute()
-        
-        if not response.data:
+        cred_data = fetch_credential_row(session_id, "linkedin")
+
+        if not cred_data:
             print("🔍 No LinkedIn credentials found in Supabase for this session.")
             return None, None
-        
-        cred_data = response.data[0]
 
     except Exception as e:
         print(f"❌ Error fetching LinkedIn credentials from Supabase: {e}")
         return None, None
 
     # 3. Check if the access token has expired
-    expires_at_str = cred_data.get("expires_at")
-    if expires_at_str:
-        # Convert the ISO format string back to a timezone-aware datetime object
-        expires_at = datetime.fromisoformat(expires_at_str)
-        if datetime.now(timezone.utc) > expires_at:
+    expires_at = parse_expires_at(cred_data.get("expires_at"))
+    if expires_at and datetime.now(timezone.utc) > expires_at:
+        if not cred_data.get("refresh_token"):
             print("⏳ LinkedIn token has expired. User needs to re-authenticate.")
-            # We can optionally delete the expired token to keep the table clean
-            supabase.table("user_credentials").delete().eq("id", cred_data['id']).execute()
+            # The refresher deletes the expired row; this request doesn't wait for it
+            token_refresher.refresh_soon(session_id, "linkedin")
+            return None, None
+        try:
+            cred_data = token_refresher.refresh(session_id, "linkedin", inline=True)
+        except Exception as e:
+            print(f"❌ Error refreshing LinkedIn credentials: {e}")
             return None, None
+        if not cred_data:
+            return None, None
+    token_refresher.track(session_id, "linkedin", cred_data)
 
     # 4. Reconstruct the token and user data in the original expected format
     # This ensures we don't have to change the tools that use this function.
@@ -146,7 +1137,7 @@ def get_linkedin_credentials():
 
 def post_to_linkedin_api(access_token: str, author_urn: str, text: str, asset_urn: str = None) -> dict:
     """Makes the API call to create a post on LinkedIn using the LEGACY v2 API."""
-    url = "https://api.linkedin.com/v2/ugcPosts"
+    url = f"{LINKEDIN_API_BASE_URL}/v2/ugcPosts"
     headers = {
         'Authorization': f'Bearer {access_token}',
         'Content-Type': 'application/json',
@@ -176,7 +1167,7 @@ def post_to_linkedin_api(access_token: str, author_urn: str, text: str, asset_ur
             }
         ]
     
-    response = requests.post(url, headers=headers, json=body)
+    response = http_client.post(url, upstream="linkedin", headers=headers, json=body)
     
     if response.status_code != 201:
         print(f"❌ LinkedIn API Error. Status: {response.status_code}, Body: {response.text}")
@@ -188,7 +1179,7 @@ def post_to_linkedin_api(access_token: str, author_urn: str, text: str, asset_ur
 
 def register_linkedin_image_upload(access_token: str, author_urn: str) -> dict:
     """Step 1: Tells LinkedIn we want to upload an image using the v2 API and correctly parses the response."""
-    url = "https://api.linkedin.com/v2/assets?action=registerUpload"
+    url = f"{LINKEDIN_API_BASE_URL}/v2/assets?action=registerUpload"
     headers = {
         'Authorization': f'Bearer {access_token}',
         'Content-Type': 'application/json',
@@ -201,7 +1192,7 @@ def register_linkedin_image_upload(access_token: str, author_urn: str) -> dict:
         }
     }
     
-    response = requests.post(url, headers=headers, json=body)
+    response = http_client.post(url, upstream="linkedin", headers=headers, json=body)
     response.raise_for_status()
     data = response.json()
     
@@ -225,110 +1216,623 @@ def register_linkedin_image_upload(access_token: str, author_urn: str) -> dict:
     print("✅ Successfully got Upload URL and Asset URN from legacy v2 endpoint.")
     return {"upload_url": upload_url, "asset_urn": asset_urn}
 
-def upload_image_to_linkedin(upload_url: str, image_data: bytes, mimetype: str):
-    """Step 2: Uploads the actual image bytes to the provided special URL."""
+def upload_image_to_linkedin(upload_url: str, image_data, mimetype: str):
+    """Step 2: Uploads the actual image (bytes, or a file object that is streamed) to the provided special URL."""
     headers = {'Content-Type': mimetype}
-    response = requests.put(upload_url, headers=headers, data=image_data)
+    response = http_client.put(upload_url, upstream="linkedin-upload", headers=headers, data=image_data)
     response.raise_for_status()
-    time.sleep(6)
     print("✅ Image bytes successfully uploaded to LinkedIn's server.")
 
+def get_linkedin_asset_status(access_token: str, asset_urn: str) -> str:
+    """Step 3: Asks LinkedIn whether the uploaded asset has been processed (e.g. 'PROCESSING', 'AVAILABLE')."""
+    asset_id = asset_urn.rsplit(':', 1)[-1]
+    url = f"{LINKEDIN_API_BASE_URL}/v2/assets/{asset_id}"
+    headers = {'Authorization': f'Bearer {access_token}'}
+    response = http_client.get(url, upstream="linkedin", headers=headers)
+    response.raise_for_status()
+    recipes = response.json().get('recipes', [])
+    statuses = {recipe.get('status') for recipe in recipes}
+    if not statuses:
+        return "PROCESSING"
+    if statuses == {"AVAILABLE"}:
+        return "AVAILABLE"
+    failed = statuses & {"CLIENT_ERROR", "INCOMPLETE"}
+    return failed.pop() if failed else "PROCESSING"
+
+
+# ==============================================
+# LINKEDIN IMAGE UPLOADS
+# ==============================================
+# Explanation: After the PUT, LinkedIn still has to process an image before a
+# post can reference it, and we used to cover that with a fixed 6-second
+# sleep inside the upload request. Now the upload route only registers the
+# upload and returns; the PUT and the readiness check run in the background.
+# The asset status is polled with backoff until it is AVAILABLE, and
+# post_on_linkedin only waits if the image is still being processed. If
+# LinkedIn is still processing it when polling gives up, the upload is
+# 'timed_out' rather than failed, and is checked once more when it is used.
+LINKEDIN_UPLOAD_WORKERS = int(os.getenv("LINKEDIN_UPLOAD_WORKERS", "2"))
+LINKEDIN_ASSET_POLL_INITIAL = float(os.getenv("LINKEDIN_ASSET_POLL_INITIAL", "0.5"))
+LINKEDIN_ASSET_POLL_MAX = float(os.getenv("LINKEDIN_ASSET_POLL_MAX", "5"))
+LINKEDIN_ASSET_READY_TIMEOUT = float(os.getenv("LINKEDIN_ASSET_READY_TIMEOUT", "60"))
+# Uploads are copied to a temp file in chunks of this size and streamed from
+# there, so memory per upload stays constant whatever the image size.
+LINKEDIN_IMAGE_MAX_BYTES = int(os.getenv("LINKEDIN_IMAGE_MAX_BYTES", str(8 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Image types LinkedIn accepts for feed shares, detected from the file's magic bytes
+LINKEDIN_IMAGE_TYPES = {"image/jpeg", "image/png", "image/gif"}
+
+linkedin_upload_executor = ThreadPoolExecutor(max_workers=LINKEDIN_UPLOAD_WORKERS, thread_name_prefix="linkedin-upload")
+
+
+class LinkedInImageUpload:
+    """An image on its way to LinkedIn: 'uploading' -> 'processing' -> 'available' (or 'failed', or 'timed_out')."""
+
+    def __init__(self, asset_urn: str):
+        self.asset_urn = asset_urn
+        self.status = "uploading"
+        self.error = None
+        self._done = threading.Event()
+
+    def finish(self, status: str, error: str = None):
+        self.status = status
+        self.error = error
+        self._done.set()
+
+    def wait(self, timeout: float) -> str:
+        """Blocks until the image is available, failed or timed out (or `timeout` passes) and returns the status."""
+        self._done.wait(timeout)
+        return self.status
+
+    def recheck(self, access_token: str) -> str:
+        """One more look at a timed-out upload, since LinkedIn may have finished processing it since."""
+        if self.status == "timed_out":
+            status = get_linkedin_asset_status(access_token, self.asset_urn)
+            if status == "AVAILABLE":
+                self.finish("available")
+            elif status != "PROCESSING":
+                self.finish("failed", f"LinkedIn reported the image as {status}.")
+        return self.status
+
+    def to_dict(self) -> dict:
+        return {"asset_urn": self.asset_urn, "status": self.status, "error": self.error}
+
+
+def wait_for_linkedin_asset(access_token: str, asset_urn: str, timeout: float = LINKEDIN_ASSET_READY_TIMEOUT) -> str:
+    """Polls the asset status with exponential backoff until it is no longer PROCESSING or `timeout` passes."""
+    deadline = time.monotonic() + timeout
+    delay = LINKEDIN_ASSET_POLL_INITIAL
+    while True:
+        status = get_linkedin_asset_status(access_token, asset_urn)
+        if status != "PROCESSING":
+            return status
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return status
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, LINKEDIN_ASSET_POLL_MAX)
+
+
+def spool_image_upload(stream, max_bytes: int = LINKEDIN_IMAGE_MAX_BYTES):
+    """
+    Copies an uploaded image to a temp file chunk by chunk and sniffs its type
+    from the first chunk. Returns (file, mimetype), with the file rewound.
+    Raises ValueError for non-images and RequestEntityTooLarge past `max_bytes`.
+    """
+    spooled = tempfile.TemporaryFile()
+    try:
+        first = stream.read(UPLOAD_CHUNK_SIZE)
+        kind = filetype.guess(first) if first else None
+        if kind is None or kind.mime not in LINKEDIN_IMAGE_TYPES:
+            raise ValueError("Unsupported file type. Please upload a PNG, JPG or GIF image.")
+        size = 0
+        chunk = first
+        while chunk:
+            size += len(chunk)
+            if size > max_bytes:
+                raise RequestEntityTooLarge()
+            spooled.write(chunk)
+            chunk = stream.read(UPLOAD_CHUNK_SIZE)
+        spooled.seek(0)
+        return spooled, kind.mime
+    except Exception:
+        spooled.close()
+        raise
+
+
+def run_linkedin_image_upload(upload: LinkedInImageUpload, access_token: str, upload_url: str, image_file, mimetype: str):
+    """Background half of an image upload: stream the file up, then wait for LinkedIn to process it."""
+    try:
+        upload_image_to_linkedin(upload_url, image_file, mimetype)
+        upload.status = "processing"
+        status = wait_for_linkedin_asset(access_token, upload.asset_urn)
+        if status == "AVAILABLE":
+            print(f"✅ LinkedIn asset {upload.asset_urn} is ready.")
+            upload.finish("available")
+        elif status == "PROCESSING":
+            upload.finish("timed_out", "LinkedIn is still processing the image.")
+        else:
+            upload.finish("failed", f"LinkedIn reported the image as {status}.")
+    except Exception as e:
+        print(f"❌ Background image upload failed: {e}")
+        upload.finish("failed", str(e))
+    finally:
+        image_file.close()
+
+
+def start_linkedin_image_upload(access_token: str, upload_info: dict, image_file, mimetype: str) -> LinkedInImageUpload:
+    """Hands the spooled image to the upload pool; the pool closes the file when done."""
+    upload = LinkedInImageUpload(upload_info['asset_urn'])
+    linkedin_upload_executor.submit(
+        run_linkedin_image_upload, upload, access_token, upload_info['upload_url'], image_file, mimetype
+    )
+    return upload
+
+# ==============================================
+# TOOL RESULT CACHE
+# ==============================================
+# Explanation: Weather and web search results are the same for everyone for a
+# while, yet each agent iteration (and each user) called the external API
+# again. Results are cached per tool with their own TTL, keyed on a normalized
+# input ("  New Delhi" and "new delhi" share an entry). If several requests
+# miss on the same key at once, only one fetch goes out and the others wait
+# for its result (single-flight). Hit/miss counters are at /stats/tool-cache.
+WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL", "600"))
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "3600"))
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "1024"))
+
+
+class SingleFlightCache:
+    """A TTLCache that coalesces concurrent misses for the same key into one computation."""
+
+    def __init__(self, ttl: int, max_entries: int):
+        self._cache = TTLCache(ttl, max_entries)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get_or_compute(self, key, compute, cacheable=lambda value: True):
+        hit, value = self._cache.get(key)
+        if hit:
+            with self._lock:
+                self.hits += 1
+            return value
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            value = compute()
+            if cacheable(value):
+                self._cache.set(key, value)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced, "entries": len(self._cache)}
+
+
+weather_cache = SingleFlightCache(WEATHER_CACHE_TTL, TOOL_CACHE_MAX_ENTRIES)
+search_cache = SingleFlightCache(SEARCH_CACHE_TTL, TOOL_CACHE_MAX_ENTRIES)
+
+
+def normalize_tool_query(text: str) -> str:
+    """Case-, quote- and whitespace-insensitive cache key."""
+    return " ".join(text.strip().strip('"\'').lower().split())
+
+
+def fetch_weather_report(city: str) -> str:
+    """Calls weatherstack and formats the result. Only 'Weather for ...' answers are worth caching."""
+    url = f'{WEATHERSTACK_BASE_URL}/current?access_key=9b550a2551e099dcd25e15757411be81&query={city}'
+    response = http_client.get(url, upstream="weatherstack")
+    response.raise_for_status()
+    data = response.json()
+
+    if 'error' in data:
+        return f"Weather API error: {data['error'].get('info', 'Unknown error')}"
+
+    if 'current' in data:
+        current = data['current']
+        location = data.get('location', {})
+        return (
+            f"Weather for {location.get('name', city)}, {location.get('country', '')}:\n"
+            f"Temperature: {current.get('temperature', 'N/A')}°C\n"
+            f"Weather: {current.get('weather_descriptions', ['N/A'])[0]}\n"
+            f"Humidity: {current.get('humidity', 'N/A')}%\n"
+            f"Wind Speed: {current.get('wind_speed', 'N/A')} km/h"
+        )
+
+    return f"No weather data found for {city}"
+
+
 @tool
 def get_weather_data(city: str) -> str:
     """Fetches current weather data for a given city."""
     try:
-        url = f'https://api.weatherstack.com/current?access_key=9b550a2551e099dcd25e15757411be81&query={city}'
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-
-        if 'error' in data:
-            return f"Weather API error: {data['error'].get('info', 'Unknown error')}"
-
-        if 'current' in data:
-            current = data['current']
-            location = data.get('location', {})
-            return (
-                f"Weather for {location.get('name', city)}, {location.get('country', '')}:\n"
-                f"Temperature: {current.get('temperature', 'N/A')}°C\n"
-                f"Weather: {current.get('weather_descriptions', ['N/A'])[0]}\n"
-                f"Humidity: {current.get('humidity', 'N/A')}%\n"
-                f"Wind Speed: {current.get('wind_speed', 'N/A')} km/h"
-            )
-
-        return f"No weather data found for {city}"
+        return weather_cache.get_or_compute(
+            normalize_tool_query(city),
+            lambda: fetch_weather_report(city),
+            cacheable=lambda report: report.startswith("Weather for"),
+        )
 
     except Exception as e:
         return f"Error fetching weather data: {str(e)}"
 
 
-def get_google_credentials():
+def get_google_credentials(session_id: str):
     """
-    Get Google credentials from Supabase for the current session.
+    Get Google credentials from Supabase for the given session.
     Handles token refresh and updates the database if necessary.
     """
-    # 1. Get the current user's session_id
-    session_id = session.get("session_id")
+    # 1. Make sure we know whose credentials to load
     if not session_id:
         return None # No user session
 
-    # 2. Query Supabase for the stored credentials
+    # 2. Look up the stored credentials (cached, falls back to Supabase)
     try:
-        response = supabase.table("user_credentials").select("*").eq("session_id", session_id).eq("provider", "google").execute()
-        
+        cred_data = fetch_credential_row(session_id, "google")
+
         # Check if any credentials were found
-        if not response.data:
+        if not cred_data:
             print("🔍 No Google credentials found in Supabase for this session.")
             return None
 
-        cred_data = response.data[0]
-
     except Exception as e:
         print(f"❌ Error fetching credentials from Supabase: {e}")
         return None
 
     # 3. Rebuild the Credentials object from the stored data
-    # The other_details JSONB column holds the info needed by from_authorized_user_info
-    info = {
-        "token": cred_data.get("access_token"),
-        "refresh_token": cred_data.get("refresh_token"),
-        **cred_data.get("other_details", {}) # Unpack the rest of the details
-    }
-    
-    creds = Credentials.from_authorized_user_info(info, SCOPES)
-    
-    # 4. Check if credentials are expired and refresh if needed
-    if creds and creds.expired and creds.refresh_token:
+    creds = google_credentials_from_row(cred_data)
+
+    # 4. Tokens are normally renewed in the background before they expire (see
+    # `token_refresher`); only an already expired one is refreshed here
+    if creds.expired:
         print("⏳ Google token expired. Refreshing...")
         try:
-            creds.refresh(Request())
-            
-            # 5. IMPORTANT: Save the refreshed credentials back to Supabase
-            print("💾 Saving refreshed token back to Supabase...")
-            updated_data = {
-                "access_token": creds.token,
-                "expires_at": creds.expiry.isoformat(),
-                "updated_at": datetime.now(timezone.utc).isoformat()
-            }
-            
-            # We update the specific record using its primary key `id`
-            supabase.table("user_credentials").update(updated_data).eq("id", cred_data['id']).execute()
-            print("✅ Token refreshed and saved successfully.")
-
+            cred_data = token_refresher.refresh(session_id, "google", inline=True)
         except Exception as e:
-            print(f"❌ Failed to refresh or save Google token: {e}")
-            # If refresh fails, the user may need to re-authenticate
-            # We can delete the broken credentials to force a new login
-            supabase.table("user_credentials").delete().eq("id", cred_data['id']).execute()
+            print(f"❌ Error refreshing Google credentials: {e}")
             return None
+        if not cred_data:
+            return None
+        creds = google_credentials_from_row(cred_data)
 
+    token_refresher.track(session_id, "google", cred_data)
     return creds
 
 
+# ==============================================
+# GOOGLE API CLIENTS
+# ==============================================
+# Explanation: `build()` re-reads and re-parses the discovery document and
+# opens a brand new HTTP transport on every tool call. Instead we parse the
+# static discovery documents shipped with google-api-python-client once per
+# process and give each thread one keep-alive httplib2 connection pool.
+# Binding a user's credentials is then just a thin AuthorizedHttp wrapper.
+GOOGLE_API_HTTP_TIMEOUT = int(os.getenv("GOOGLE_API_HTTP_TIMEOUT", "30"))
+# Replaces https://www.googleapis.com/ (e.g. with a local stand-in for benchmarks)
+GOOGLE_API_ROOT_URL = os.getenv("GOOGLE_API_ROOT_URL")
+
+
+class GoogleServiceFactory:
+    """Creates per-user Gmail/Calendar clients on top of shared, pre-parsed discovery documents."""
+
+    def __init__(self, timeout: int):
+        self.timeout = timeout
+        self._documents = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def document(self, api: str, version: str) -> dict:
+        key = (api, version)
+        doc = self._documents.get(key)
+        if doc is None:
+            with self._lock:
+                doc = self._documents.get(key)
+                if doc is None:
+                    doc = json.loads(discovery_cache.get_static_doc(api, version))
+                    self._documents[key] = doc
+        return doc
+
+    def http(self) -> httplib2.Http:
+        # httplib2.Http is not thread-safe, so each thread keeps its own pool
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = httplib2.Http(timeout=self.timeout)
+            self._local.http = http
+        return http
+
+    def service(self, api: str, version: str, creds: Credentials):
+        authorized_http = AuthorizedHttp(creds, http=self.http())
+        document = self.document(api, version)
+        client_options = None
+        if GOOGLE_API_ROOT_URL:
+            client_options = {"api_endpoint": GOOGLE_API_ROOT_URL.rstrip("/") + "/" + document["servicePath"]}
+        return build_from_document(document, http=authorized_http, client_options=client_options)
+
+    def batch(self, api: str, version: str, callback=None) -> BatchHttpRequest:
+        """
+        An empty HTTP batch for this API. service.new_batch_http_request() always
+        posts to the discovery document's rootUrl, ignoring GOOGLE_API_ROOT_URL.
+        """
+        document = self.document(api, version)
+        root = GOOGLE_API_ROOT_URL.rstrip("/") + "/" if GOOGLE_API_ROOT_URL else document["rootUrl"]
+        return BatchHttpRequest(callback=callback, batch_uri=root + document.get("batchPath", "batch"))
+
+
+google_service_factory = GoogleServiceFactory(GOOGLE_API_HTTP_TIMEOUT)
+
+
+def get_google_service(api: str, version: str, creds: Credentials):
+    """Drop-in replacement for build(api, version, credentials=creds)."""
+    return google_service_factory.service(api, version, creds)
+
+
+# ==============================================
+# GOOGLE API BATCHES
+# ==============================================
+# Explanation: The agent could create or delete one event, or send one email,
+# per tool call: one LLM iteration and one HTTP request each. The bulk tools
+# (create_calendar_events, delete_calendar_events, send_emails) take a list
+# and send all of it as a single HTTP batch request (multipart/mixed), which
+# the API answers with one response per item. Failures are reported per
+# item, so one bad entry doesn't hide what happened to the rest.
+GOOGLE_BATCH_MAX_REQUESTS = int(os.getenv("GOOGLE_BATCH_MAX_REQUESTS", "50"))  # Calendar's per-batch limit
+BULK_TOOL_MAX_ITEMS = int(os.getenv("BULK_TOOL_MAX_ITEMS", "50"))
+
+
+def execute_google_batch(api: str, version: str, api_requests: list) -> list:
+    """
+    Runs the given API requests as HTTP batches of up to GOOGLE_BATCH_MAX_REQUESTS.
+    Returns one (response, exception) pair per request, in order.
+    """
+    results = [(None, None)] * len(api_requests)
+
+    def collect(request_id, response, exception):
+        results[int(request_id)] = (response, exception)
+
+    for offset in range(0, len(api_requests), GOOGLE_BATCH_MAX_REQUESTS):
+        batch = google_service_factory.batch(api, version, callback=collect)
+        for i, api_request in enumerate(api_requests[offset:offset + GOOGLE_BATCH_MAX_REQUESTS], start=offset):
+            batch.add(api_request, request_id=str(i))
+        batch.execute()
+    return results
+
+
+def google_error_reason(error: Exception) -> str:
+    """The short reason of an API error, rather than HttpError's full repr."""
+    if isinstance(error, HttpError):
+        return f"{error.resp.status} {error.reason}"
+    return str(error)
+
+
+def parse_bulk_items(action_input: str, key: str) -> list:
+    """The list under `key` (or a bare JSON list); raises ValueError when there is none or too many."""
+    data = json.loads(action_input)
+    items = data.get(key) if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        raise ValueError(f"Expected a non-empty '{key}' list")
+    if len(items) > BULK_TOOL_MAX_ITEMS:
+        raise ValueError(f"At most {BULK_TOOL_MAX_ITEMS} items can be handled in one call, got {len(items)}")
+    return items
+
+
 # This alias function will now automatically use the new Supabase logic
-def get_gmail_credentials():
-    """Get Gmail credentials from session (alias for get_google_credentials)"""
-    return get_google_credentials()
+def get_gmail_credentials(session_id: str):
+    """Get Gmail credentials for a session (alias for get_google_credentials)"""
+    return get_google_credentials(session_id)
+
+
+# ==============================================
+# CALENDAR EVENT INDEX
+# ==============================================
+# Explanation: get_calendar_events listed events from the API on every call,
+# and deleting by title listed a whole year ahead and filtered it in Python.
+# Each session now keeps a local index of its upcoming primary-calendar
+# events. One full sync fills it (CALENDAR_INDEX_HORIZON_DAYS ahead); after
+# that the `nextSyncToken` of the last listing is sent back and Calendar
+# returns only the events changed since, cancelled ones included so they can
+# be dropped. A field mask trims every response to the properties the tools
+# read. Listing, title search and lookup-before-delete are answered from the
+# index, and our own inserts and deletes are applied to it directly. An
+# expired sync token (HTTP 410) falls back to a full sync, and an index is
+# rebuilt from scratch after CALENDAR_INDEX_TTL so its horizon moves forward.
+CALENDAR_INDEX_TTL = int(os.getenv("CALENDAR_INDEX_TTL", "3600"))
+CALENDAR_INDEX_MAX_ENTRIES = int(os.getenv("CALENDAR_INDEX_MAX_ENTRIES", "256"))
+CALENDAR_INDEX_HORIZON_DAYS = int(os.getenv("CALENDAR_INDEX_HORIZON_DAYS", "365"))
+# A sync this recent is reused, so the tool calls of one agent turn share it
+CALENDAR_SYNC_MIN_INTERVAL = float(os.getenv("CALENDAR_SYNC_MIN_INTERVAL", "10"))
+CALENDAR_SYNC_PAGE_SIZE = 2500  # the API maximum
+CALENDAR_EVENT_FIELDS = "id,status,summary,description,location,start,end"
+CALENDAR_SYNC_FIELDS = f"nextPageToken,nextSyncToken,items({CALENDAR_EVENT_FIELDS})"
+
+
+def calendar_event_time(value: dict) -> datetime:
+    """An event's start or end as an aware datetime; all-day dates count from midnight UTC."""
+    if "dateTime" in value:
+        dt = datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00"))
+        return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+    return datetime.fromisoformat(value["date"]).replace(tzinfo=timezone.utc)
+
+
+class CalendarEventIndex:
+    """One session's upcoming events, keyed by event ID."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.sync_token = None
+        self.horizon = None
+        self.synced_at = 0.0
+        self._events = {}
+
+    def reset(self):
+        with self.lock:
+            self._events.clear()
+            self.sync_token = None
+            self.horizon = None
+
+    def apply(self, items: list):
+        """Applies a listing or a delta: cancelled events are removed, the rest inserted or replaced."""
+        with self.lock:
+            for item in items:
+                if item.get("status") == "cancelled":
+                    self._events.pop(item["id"], None)
+                elif "start" in item and "end" in item:
+                    self._events[item["id"]] = (calendar_event_time(item["start"]), calendar_event_time(item["end"]), item)
+
+    def remove(self, event_id: str):
+        with self.lock:
+            self._events.pop(event_id, None)
+
+    def prune(self, now: datetime):
+        with self.lock:
+            for event_id in [event_id for event_id, (_, end, _) in self._events.items() if end <= now]:
+                del self._events[event_id]
+
+    def covers(self, until: datetime) -> bool:
+        return self.horizon is not None and until <= self.horizon
+
+    def upcoming(self, now: datetime, until: datetime = None) -> list:
+        """Events not yet over (like the API's timeMin) that start before `until`, soonest first."""
+        with self.lock:
+            entries = [
+                (start, item) for start, end, item in self._events.values()
+                if end > now and (until is None or start < until)
+            ]
+        return [item for _, item in sorted(entries, key=lambda entry: entry[0])]
+
+    def find_by_title(self, title: str, now: datetime):
+        """The soonest upcoming event whose title contains `title` (case-insensitive), or None."""
+        needle = title.lower()
+        return next((item for item in self.upcoming(now) if needle in item.get("summary", "").lower()), None)
+
+    def __len__(self):
+        with self.lock:
+            return len(self._events)
+
+
+class CalendarIndexStore:
+    """Per-session CalendarEventIndex objects, synced on use."""
+
+    def __init__(self, ttl: int, max_entries: int, horizon_days: int, min_interval: float):
+        self.horizon_days = horizon_days
+        self.min_interval = min_interval
+        self._indexes = TTLCache(ttl, max_entries)
+        self._lock = threading.Lock()
+        self._counts = {"full": 0, "delta": 0, "reused": 0, "expired_token": 0}
+
+    def _count(self, kind: str):
+        with self._lock:
+            self._counts[kind] += 1
+
+    def index(self, session_id: str, service) -> CalendarEventIndex:
+        """The session's index, brought up to date unless it was synced moments ago."""
+        with self._lock:
+            hit, index = self._indexes.get(session_id)
+            if not hit:
+                index = CalendarEventIndex()
+                self._indexes.set(session_id, index)
+        # Holding the index lock makes concurrent callers share one sync
+        with index.lock:
+            if index.sync_token is not None and time.monotonic() - index.synced_at < self.min_interval:
+                self._count("reused")
+            else:
+                self._sync(index, service)
+        return index
+
+    def _sync(self, index: CalendarEventIndex, service):
+        now = datetime.now(timezone.utc)
+        if index.sync_token is not None:
+            try:
+                items, sync_token = self._list(service, syncToken=index.sync_token)
+                index.apply(items)
+                self._count("delta")
+            except HttpError as e:
+                if e.resp.status != 410:
+                    raise
+                print("⚠️ Calendar sync token expired, running a full sync.")
+                self._count("expired_token")
+                index.reset()
+
+        if index.sync_token is None:
+            horizon = now + timedelta(days=self.horizon_days)
+            items, sync_token = self._list(
+                service, timeMin=now.isoformat().replace("+00:00", "Z"), timeMax=horizon.isoformat().replace("+00:00", "Z")
+            )
+            index.reset()
+            index.apply(items)
+            index.horizon = horizon
+            self._count("full")
+
+        index.prune(now)
+        # Without a token (it shouldn't happen) the next use simply runs a full sync again
+        index.sync_token = sync_token
+        index.synced_at = time.monotonic()
+
+    @staticmethod
+    def _list(service, **params):
+        """All pages of a primary-calendar listing; returns (items, nextSyncToken)."""
+        items, page_token = [], None
+        while True:
+            response = service.events().list(
+                calendarId="primary",
+                singleEvents=True,
+                maxResults=CALENDAR_SYNC_PAGE_SIZE,
+                fields=CALENDAR_SYNC_FIELDS,
+                pageToken=page_token,
+                **params,
+            ).execute()
+            items.extend(response.get("items", []))
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return items, response.get("nextSyncToken")
+
+    def _existing(self, session_id: str):
+        with self._lock:
+            return self._indexes.get(session_id)[1]
+
+    def record_created(self, session_id: str, event: dict):
+        index = self._existing(session_id)
+        if index is not None:
+            index.apply([event])
+
+    def record_deleted(self, session_id: str, event_id: str):
+        index = self._existing(session_id)
+        if index is not None:
+            index.remove(event_id)
+
+    def invalidate(self, session_id: str):
+        with self._lock:
+            self._indexes.invalidate(session_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"sessions": len(self._indexes), "syncs": dict(self._counts)}
+
+
+calendar_index = CalendarIndexStore(
+    CALENDAR_INDEX_TTL, CALENDAR_INDEX_MAX_ENTRIES, CALENDAR_INDEX_HORIZON_DAYS, CALENDAR_SYNC_MIN_INTERVAL
+)
+
 
 @tool
 def get_today_date() -> str:
@@ -337,34 +1841,24 @@ def get_today_date() -> str:
 
 
 @tool
-def send_email(action_input) -> str:
+def send_email(action_input, ctx: Annotated[ToolContext, InjectedToolArg]) -> str:
     """
     Send an email using Gmail API. The action_input is expected to be a
     JSON string containing the email details ('recipient', 'subject', 'body').
     """
     try:
         email_data = json.loads(action_input)
-        recipient = email_data.get("recipient")
-        subject = email_data.get("subject")
-        body = email_data.get("body")
+        send_message, error = build_email_message(email_data)
+        if error:
+            return error
 
-        if not all([recipient, subject, body]):
-            return f"❌ Error: Missing 'recipient', 'subject', or 'body' in the parsed data: {email_data}"
-
-        creds = get_google_credentials()
+        creds = ctx.google_credentials()
         if not creds:
             return "❌ Google services not authorized. Please visit /authorize to authenticate first."
 
-        service = build("gmail", "v1", credentials=creds)
-        message = MIMEText(body)
-        message["to"] = recipient
-        message["subject"] = subject
-
-        raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
-        send_message = {"raw": raw}
-
+        service = get_google_service("gmail", "v1", creds)
         result = service.users().messages().send(userId="me", body=send_message).execute()
-        return f"✅ Email successfully sent to {recipient} with subject '{subject}'"
+        return f"✅ Email successfully sent to {email_data['recipient']} with subject '{email_data['subject']}'"
 
     except json.JSONDecodeError:
         return f"❌ Error: Failed to decode the JSON string from the agent's input. The tool received: {action_input}"
@@ -372,8 +1866,73 @@ def send_email(action_input) -> str:
         return f"❌ An unexpected error occurred in the send_email tool: {str(e)}"
 
 
+def build_email_message(email_data: dict):
+    """Returns (Gmail send body, None), or (None, error message) when a field is missing."""
+    recipient = email_data.get("recipient")
+    subject = email_data.get("subject")
+    body = email_data.get("body")
+
+    if not all([recipient, subject, body]):
+        return None, f"❌ Error: Missing 'recipient', 'subject', or 'body' in the parsed data: {email_data}"
+
+    message = MIMEText(body)
+    message["to"] = recipient
+    message["subject"] = subject
+
+    raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
+    return {"raw": raw}, None
+
+
+@tool
+def send_emails(action_input, ctx: Annotated[ToolContext, InjectedToolArg]) -> str:
+    """
+    Send several emails in one go. The action_input should be a JSON string with either
+    'emails': a list of {"recipient", "subject", "body"} objects, or 'recipients': a list
+    of addresses plus one 'subject' and 'body' (each recipient gets their own copy).
+    """
+    try:
+        data = json.loads(action_input)
+        if isinstance(data, dict) and "recipients" in data and "emails" not in data:
+            recipients = parse_bulk_items(action_input, "recipients")
+            emails = [{"recipient": r, "subject": data.get("subject"), "body": data.get("body")} for r in recipients]
+        else:
+            emails = parse_bulk_items(action_input, "emails")
+
+        creds = ctx.google_credentials()
+        if not creds:
+            return "❌ Google services not authorized. Please visit /authorize to authenticate first."
+
+        service = get_google_service("gmail", "v1", creds)
+        lines, pending = [], []
+        for position, email_data in enumerate(emails, start=1):
+            send_message, error = build_email_message(email_data if isinstance(email_data, dict) else {})
+            if error:
+                lines.append((position, f"❌ {email_data}: missing 'recipient', 'subject' or 'body'"))
+            else:
+                pending.append((position, email_data, service.users().messages().send(userId="me", body=send_message)))
+
+        results = execute_google_batch("gmail", "v1", [api_request for _, _, api_request in pending]) if pending else []
+        sent = 0
+        for (position, email_data, _), (response, exception) in zip(pending, results):
+            if exception is None:
+                sent += 1
+                lines.append((position, f"✅ Sent to {email_data['recipient']} ('{email_data['subject']}')"))
+            else:
+                lines.append((position, f"❌ Not sent to {email_data['recipient']}: {google_error_reason(exception)}"))
+
+        lines.sort(key=lambda line: line[0])
+        return f"📧 Sent {sent} of {len(emails)} emails:\n" + "\n".join(f"{position}. {line}" for position, line in lines)
+
+    except json.JSONDecodeError:
+        return f"❌ Error: Failed to decode the JSON string from the agent's input. The tool received: {action_input}"
+    except ValueError as e:
+        return f"❌ Error: {e}"
+    except Exception as e:
+        return f"❌ An unexpected error occurred in the send_emails tool: {str(e)}"
+
+
 @tool
-def create_calendar_event(action_input) -> str:
+def create_calendar_event(action_input, ctx: Annotated[ToolContext, InjectedToolArg]) -> str:
     """
     Create a calendar event using Google Calendar API. The action_input should be a
     JSON string containing event details ('title', 'start_datetime', 'end_datetime', 'description', 'location').
@@ -381,50 +1940,21 @@ def create_calendar_event(action_input) -> str:
     """
     try:
         event_data = json.loads(action_input)
-        title = event_data.get("title")
-        start_datetime = event_data.get("start_datetime")
-        end_datetime = event_data.get("end_datetime")
-        description = event_data.get("description", "")
-        location = event_data.get("location", "")
+        event, error = build_calendar_event(event_data)
+        if error:
+            return error
 
-        if not all([title, start_datetime, end_datetime]):
-            return f"❌ Error: Missing required fields 'title', 'start_datetime', or 'end_datetime' in: {event_data}"
-
-        creds = get_google_credentials()
+        creds = ctx.google_credentials()
         if not creds:
             return "❌ Google services not authorized. Please visit /authorize to authenticate first."
 
-        service = build("calendar", "v3", credentials=creds)
+        service = get_google_service("calendar", "v3", creds)
+        title = event['summary']
+        start_datetime = event['start']['dateTime']
+        end_datetime = event['end']['dateTime']
 
-        # Parse datetime strings and ensure timezone info
-        try:
-            if 'T' not in start_datetime:
-                start_datetime += 'T00:00:00'
-            if 'T' not in end_datetime:
-                end_datetime += 'T23:59:59'
-
-            # If no timezone specified, assume local timezone
-            if '+' not in start_datetime and 'Z' not in start_datetime and start_datetime.count(':') == 2:
-                start_datetime += '+00:00'  # You might want to use user's timezone here
-            if '+' not in end_datetime and 'Z' not in end_datetime and end_datetime.count(':') == 2:
-                end_datetime += '+00:00'
-
-        except Exception as dt_error:
-            return f"❌ Error parsing datetime format. Use ISO format like '2024-01-15T10:00:00' or '2024-01-15T10:00:00+05:30': {dt_error}"
-
-        event = {
-            'summary': title,
-            'description': description,
-            'location': location,
-            'start': {
-                'dateTime': start_datetime,
-            },
-            'end': {
-                'dateTime': end_datetime,
-            },
-        }
-
-        created_event = service.events().insert(calendarId='primary', body=event).execute()
+        created_event = service.events().insert(calendarId='primary', body=event, fields=CALENDAR_EVENT_FIELDS).execute()
+        calendar_index.record_created(ctx.session_id, created_event)
         return f"✅ Calendar event '{title}' created successfully! Event ID: {created_event.get('id')}\n📅 Start: {start_datetime}\n📅 End: {end_datetime}"
 
     except json.JSONDecodeError:
@@ -433,8 +1963,94 @@ def create_calendar_event(action_input) -> str:
         return f"❌ An unexpected error occurred while creating calendar event: {str(e)}"
 
 
+def build_calendar_event(event_data: dict):
+    """Returns (Calendar event body, None), or (None, error message) for missing or malformed fields."""
+    title = event_data.get("title")
+    start_datetime = event_data.get("start_datetime")
+    end_datetime = event_data.get("end_datetime")
+    description = event_data.get("description", "")
+    location = event_data.get("location", "")
+
+    if not all([title, start_datetime, end_datetime]):
+        return None, f"❌ Error: Missing required fields 'title', 'start_datetime', or 'end_datetime' in: {event_data}"
+
+    # Parse datetime strings and ensure timezone info
+    try:
+        if 'T' not in start_datetime:
+            start_datetime += 'T00:00:00'
+        if 'T' not in end_datetime:
+            end_datetime += 'T23:59:59'
+
+        # If no timezone specified, assume local timezone
+        if '+' not in start_datetime and 'Z' not in start_datetime and start_datetime.count(':') == 2:
+            start_datetime += '+00:00'  # You might want to use user's timezone here
+        if '+' not in end_datetime and 'Z' not in end_datetime and end_datetime.count(':') == 2:
+            end_datetime += '+00:00'
+
+    except Exception as dt_error:
+        return None, f"❌ Error parsing datetime format. Use ISO format like '2024-01-15T10:00:00' or '2024-01-15T10:00:00+05:30': {dt_error}"
+
+    event = {
+        'summary': title,
+        'description': description,
+        'location': location,
+        'start': {
+            'dateTime': start_datetime,
+        },
+        'end': {
+            'dateTime': end_datetime,
+        },
+    }
+    return event, None
+
+
 @tool
-def get_calendar_events(action_input) -> str:
+def create_calendar_events(action_input, ctx: Annotated[ToolContext, InjectedToolArg]) -> str:
+    """
+    Create several calendar events in one go. The action_input should be a JSON string like
+    {"events": [{"title", "start_datetime", "end_datetime", optional "description", "location"}, ...]}.
+    DateTime format should be ISO format like '2024-01-15T10:00:00' or '2024-01-15T10:00:00-05:00'
+    """
+    try:
+        events = parse_bulk_items(action_input, "events")
+
+        creds = ctx.google_credentials()
+        if not creds:
+            return "❌ Google services not authorized. Please visit /authorize to authenticate first."
+
+        service = get_google_service("calendar", "v3", creds)
+        lines, pending = [], []
+        for position, event_data in enumerate(events, start=1):
+            event, error = build_calendar_event(event_data if isinstance(event_data, dict) else {})
+            if error:
+                lines.append((position, error))
+            else:
+                api_request = service.events().insert(calendarId='primary', body=event, fields=CALENDAR_EVENT_FIELDS)
+                pending.append((position, event, api_request))
+
+        results = execute_google_batch("calendar", "v3", [api_request for _, _, api_request in pending]) if pending else []
+        created = 0
+        for (position, event, _), (created_event, exception) in zip(pending, results):
+            if exception is None:
+                created += 1
+                calendar_index.record_created(ctx.session_id, created_event)
+                lines.append((position, f"✅ '{event['summary']}' created (Event ID: {created_event.get('id')}), {event['start']['dateTime']} to {event['end']['dateTime']}"))
+            else:
+                lines.append((position, f"❌ '{event['summary']}' not created: {google_error_reason(exception)}"))
+
+        lines.sort(key=lambda line: line[0])
+        return f"📅 Created {created} of {len(events)} events:\n" + "\n".join(f"{position}. {line}" for position, line in lines)
+
+    except json.JSONDecodeError:
+        return f"❌ Error: Failed to decode the JSON string from the agent's input. The tool received: {action_input}"
+    except ValueError as e:
+        return f"❌ Error: {e}"
+    except Exception as e:
+        return f"❌ An unexpected error occurred while creating calendar events: {str(e)}"
+
+
+@tool
+def get_calendar_events(action_input, ctx: Annotated[ToolContext, InjectedToolArg]) -> str:
     """
     Get upcoming calendar events. The action_input should be a JSON string with optional parameters:
     - 'days_ahead': number of days to look ahead (default: 7)
@@ -449,26 +2065,31 @@ def get_calendar_events(action_input) -> str:
         days_ahead = params.get("days_ahead", 7)
         max_results = params.get("max_results", 10)
 
-        creds = get_google_credentials()
+        creds = ctx.google_credentials()
         if not creds:
             return "❌ Google services not authorized. Please visit /authorize to authenticate first."
 
-        service = build("calendar", "v3", credentials=creds)
+        service = get_google_service("calendar", "v3", creds)
 
         # Get events from now to specified days ahead
-        now = datetime.utcnow()
+        now = datetime.now(timezone.utc)
         time_max = now + timedelta(days=days_ahead)
 
-        events_result = service.events().list(
-            calendarId='primary',
-            timeMin=now.isoformat() + 'Z',
-            timeMax=time_max.isoformat() + 'Z',
-            maxResults=max_results,
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
-
-        events = events_result.get('items', [])
+        index = calendar_index.index(ctx.session_id, service)
+        if index.covers(time_max):
+            events = index.upcoming(now, time_max)[:max_results]
+        else:
+            # Further ahead than the index reaches
+            events_result = service.events().list(
+                calendarId='primary',
+                timeMin=now.isoformat().replace('+00:00', 'Z'),
+                timeMax=time_max.isoformat().replace('+00:00', 'Z'),
+                maxResults=max_results,
+                singleEvents=True,
+                orderBy='startTime',
+                fields=f"items({CALENDAR_EVENT_FIELDS})"
+            ).execute()
+            events = events_result.get('items', [])
 
         if not events:
             return f"📅 No upcoming events found in the next {days_ahead} days."
@@ -507,7 +2128,7 @@ def get_calendar_events(action_input) -> str:
 
 
 @tool
-def delete_calendar_event(action_input) -> str:
+def delete_calendar_event(action_input, ctx: Annotated[ToolContext, InjectedToolArg]) -> str:
     """
     Delete a calendar event by its ID or title. The action_input should be a JSON string containing:
     - 'event_id': The Google Calendar event ID, OR
@@ -521,75 +2142,153 @@ def delete_calendar_event(action_input) -> str:
         if not event_id and not title:
             return "❌ Error: Must provide either 'event_id' or 'title' to delete an event"
 
-        creds = get_google_credentials()
+        creds = ctx.google_credentials()
         if not creds:
             return "❌ Google services not authorized. Please visit /authorize to authenticate first."
 
-        service = build("calendar", "v3", credentials=creds)
+        service = get_google_service("calendar", "v3", creds)
 
-        # If title provided but no event_id, search for the event
+        # If title provided but no event_id, search the session's event index
         if not event_id and title:
-            # Search for events with matching title
-            now = datetime.utcnow()
-            future = now + timedelta(days=365)  # Search in next year
-
-            events_result = service.events().list(
-                calendarId='primary',
-                timeMin=now.isoformat() + 'Z',
-                timeMax=future.isoformat() + 'Z',
-                q=title,
-                singleEvents=True
-            ).execute()
-
-            events = events_result.get('items', [])
-            matching_events = [e for e in events if title.lower() in e.get('summary', '').lower()]
+            index = calendar_index.index(ctx.session_id, service)
+            match = index.find_by_title(title, datetime.now(timezone.utc))
 
-            if not matching_events:
+            if match is None:
                 return f"❌ No events found with title containing '{title}'"
 
-            event_id = matching_events[0]['id']
-            actual_title = matching_events[0].get('summary', 'No title')
+            event_id = match['id']
+            actual_title = match.get('summary', 'No title')
         else:
             actual_title = "Event"
 
         # Delete the event
-        service.events().delete(calendarId='primary', eventId=event_id).execute()
+        try:
+            service.events().delete(calendarId='primary', eventId=event_id).execute()
+        except HttpError as e:
+            if e.resp.status in (404, 410):
+                # Already gone upstream; don't offer it again
+                calendar_index.record_deleted(ctx.session_id, event_id)
+            raise
+        calendar_index.record_deleted(ctx.session_id, event_id)
         return f"✅ Successfully deleted calendar event: {actual_title}"
 
     except json.JSONDecodeError:
         return f"❌ Error: Failed to decode the JSON string. The tool received: {action_input}"
     except Exception as e:
         return f"❌ An unexpected error occurred while deleting calendar event: {str(e)}"
+
+
+@tool
+def delete_calendar_events(action_input, ctx: Annotated[ToolContext, InjectedToolArg]) -> str:
+    """
+    Delete several calendar events in one go. The action_input should be a JSON string with
+    'event_ids': a list of Google Calendar event IDs, and/or 'titles': a list of titles
+    (each deletes the soonest upcoming event whose title contains it).
+    """
+    try:
+        params = json.loads(action_input)
+        if not isinstance(params, dict):
+            return "❌ Error: Provide a JSON object with 'event_ids' and/or 'titles'"
+        event_ids = params.get("event_ids") or []
+        titles = params.get("titles") or []
+        # A single value is fine too
+        event_ids = [event_ids] if isinstance(event_ids, str) else event_ids
+        titles = [titles] if isinstance(titles, str) else titles
+        # A repeated ID is one event: deleting it twice would report the second attempt's 410
+        event_ids = list(dict.fromkeys(event_ids))
+        if not event_ids and not titles:
+            return "❌ Error: Must provide 'event_ids' and/or 'titles' to delete events"
+        if len(event_ids) + len(titles) > BULK_TOOL_MAX_ITEMS:
+            return f"❌ Error: At most {BULK_TOOL_MAX_ITEMS} events can be deleted in one call"
+
+        creds = ctx.google_credentials()
+        if not creds:
+            return "❌ Google services not authorized. Please visit /authorize to authenticate first."
+
+        service = get_google_service("calendar", "v3", creds)
+        # (event ID or None when no event matched, how to refer to it), in the order given
+        targets = [(event_id, "Event " + event_id) for event_id in event_ids]
+        if titles:
+            # Titles are looked up in the session's event index, one event per title
+            index = calendar_index.index(ctx.session_id, service)
+            upcoming = index.upcoming(datetime.now(timezone.utc))
+            chosen = set(event_ids)
+            for title in titles:
+                needle = title.lower()
+                match = next((e for e in upcoming if needle in e.get("summary", "").lower() and e["id"] not in chosen), None)
+                if match is None:
+                    targets.append((None, title))
+                else:
+                    chosen.add(match["id"])
+                    targets.append((match["id"], match.get("summary", "No title")))
+
+        to_delete = [event_id for event_id, _ in targets if event_id is not None]
+        api_requests = [service.events().delete(calendarId='primary', eventId=event_id) for event_id in to_delete]
+        results = dict(zip(to_delete, execute_google_batch("calendar", "v3", api_requests))) if api_requests else {}
+        lines, deleted = [], 0
+        for event_id, label in targets:
+            if event_id is None:
+                lines.append(f"❌ No events found with title containing '{label}'")
+                continue
+            _, exception = results[event_id]
+            if exception is None or (isinstance(exception, HttpError) and exception.resp.status in (404, 410)):
+                calendar_index.record_deleted(ctx.session_id, event_id)
+            if exception is None:
+                deleted += 1
+                lines.append(f"✅ Deleted: {label}")
+            else:
+                lines.append(f"❌ Not deleted: {label}: {google_error_reason(exception)}")
+
+        return f"🗑️ Deleted {deleted} of {len(targets)} events:\n" + "\n".join(f"{position}. {line}" for position, line in enumerate(lines, start=1))
+
+    except json.JSONDecodeError:
+        return f"❌ Error: Failed to decode the JSON string. The tool received: {action_input}"
+    except Exception as e:
+        return f"❌ An unexpected error occurred while deleting calendar events: {str(e)}"
+
+
 @tool
-def post_on_linkedin(action_input: str) -> str:
+def post_on_linkedin(action_input: str, ctx: Annotated[ToolContext, InjectedToolArg]) -> str:
     """
     Use this tool to publish a post on LinkedIn using the current user's account.
     The action_input should be a JSON string like: '{"text": "Hello world!"}'.
     If the user has uploaded an image, it will be attached automatically.
     """
     try:
-        # 1. Get credentials from the current user's session
-        token, user = get_linkedin_credentials()
+        # 1. Get credentials for the user this request is for
+        token, user = ctx.linkedin_credentials()
         if not token or not user:
             return "❌ LinkedIn account not connected. Please use the 'Connect' button first."
 
         access_token = token['access_token']
         author_urn = user['urn']
 
-        # 2. Parse input and get asset from session
+        # 2. Parse input and get the pending uploaded image (if any)
         post_data = json.loads(action_input)
         text = post_data.get("text")
         if not text:
             return "❌ Error: The JSON input must contain a 'text' field."
         
-        asset_urn = session.get('uploaded_linkedin_asset_urn', None)
+        asset_urn = None
+        image = ctx.linkedin_image
+        if image:
+            # Only blocks if LinkedIn is still processing the upload
+            status = image.wait(LINKEDIN_ASSET_READY_TIMEOUT)
+            if status == "timed_out":
+                status = image.recheck(access_token)
+            if status == "failed":
+                ctx.take_linkedin_image()
+                return f"❌ The uploaded image could not be attached: {image.error} Please upload it again."
+            if status != "available":
+                return "⏳ The uploaded image is still being processed by LinkedIn. Please try posting again in a moment."
+            asset_urn = image.asset_urn
         
         # 3. Call the API
         result = post_to_linkedin_api(access_token, author_urn, text, asset_urn=asset_urn)
         
-        # 4. Clear the asset from the session after use
-        if asset_urn:
-            session.pop('uploaded_linkedin_asset_urn', None)
+        # 4. The image has been used, so clear it
+        if image:
+            ctx.take_linkedin_image()
         
         return f"✅ Successfully posted to LinkedIn on your behalf! Post URN: {result['urn']}"
 
@@ -599,11 +2298,15 @@ def post_on_linkedin(action_input: str) -> str:
         return f"❌ An unexpected error occurred: {str(e)}"
     
 
-def create_isolated_selenium_driver():
+def create_isolated_selenium_driver(user_data_dir: str = None):
     """
     Creates and returns a new Selenium Chrome driver instance with all necessary options
     for a stable, isolated session in a production environment.
     """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service as ChromeService
+
     chrome_options = Options()
     chrome_options.add_argument("--headless")
     chrome_options.add_argument("--no-sandbox")
@@ -612,7 +2315,8 @@ def create_isolated_selenium_driver():
     chrome_options.add_argument("--window-size=1920,1080")
     
     # Create a unique, temporary user profile directory for each session
-    user_data_dir = f"/tmp/selenium_profiles/{uuid.uuid4()}"
+    if user_data_dir is None:
+        user_data_dir = f"/tmp/selenium_profiles/{uuid.uuid4()}"
     chrome_options.add_argument(f"--user-data-dir={user_data_dir}")
     # --- END OF FIX ---
 
@@ -620,7 +2324,331 @@ def create_isolated_selenium_driver():
     driver = webdriver.Chrome(service=service, options=chrome_options)
     print("✅ Created new isolated Selenium driver instance.")
     return driver    
+
+
+# ==============================================
+# SELENIUM DRIVER POOL
+# ==============================================
+# Explanation: Cold-starting Chrome takes seconds and used to happen on every
+# scrape and every fill (twice per application). We keep a small pool of
+# pre-launched headless drivers instead. A driver is health-checked when it
+# is checked out, wiped (cookies, storage, cache, extra tabs) when it comes
+# back, and replaced after SELENIUM_DRIVER_MAX_USES uses or when it crashes.
+# Replacements are launched in the background so requests don't wait on them.
+SELENIUM_POOL_SIZE = int(os.getenv("SELENIUM_POOL_SIZE", "2"))
+SELENIUM_DRIVER_MAX_USES = int(os.getenv("SELENIUM_DRIVER_MAX_USES", "20"))
+SELENIUM_POOL_CHECKOUT_TIMEOUT = int(os.getenv("SELENIUM_POOL_CHECKOUT_TIMEOUT", "120"))
+SELENIUM_POOL_PREWARM = os.getenv("SELENIUM_POOL_PREWARM", "true").lower() == "true"
+
+
+class PooledDriver:
+    """A Chrome driver plus the bookkeeping the pool needs for it."""
+
+    def __init__(self):
+        self.profile_dir = f"/tmp/selenium_profiles/{uuid.uuid4()}"
+        with selenium_latency.time(phase="driver_startup"):
+            self.driver = create_isolated_selenium_driver(self.profile_dir)
+        self.uses = 0
+
+    def is_healthy(self) -> bool:
+        try:
+            return self.driver.execute_script("return 1") == 1 and len(self.driver.window_handles) > 0
+        except Exception:
+            return False
+
+    def reset(self):
+        """Wipes everything a previous user could have left behind."""
+        driver = self.driver
+        handles = driver.window_handles
+        for index, handle in enumerate(handles):
+            driver.switch_to.window(handle)
+            # localStorage, IndexedDB, service workers etc. of whatever site the tab is on
+            origin = driver.execute_script("return window.location.origin")
+            if origin and origin != "null":
+                driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+            if index > 0:
+                driver.close()
+        driver.switch_to.window(handles[0])
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+        driver.get("about:blank")
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            print(f"⚠️ Error while quitting Selenium driver: {e}")
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+
+class SeleniumDriverPool:
+    """A bounded pool of warm headless Chrome drivers."""
+
+    def __init__(self, size: int, max_uses: int, checkout_timeout: int):
+        self.size = size
+        self.max_uses = max_uses
+        self.checkout_timeout = checkout_timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._live = 0  # drivers that exist or are being launched
+
+    def _launch(self):
+        """Starts one driver and puts it in the idle queue. Runs in the background."""
+        try:
+            self._idle.put(PooledDriver())
+        except Exception as e:
+            print(f"❌ Failed to launch pooled Selenium driver: {e}")
+            with self._lock:
+                self._live -= 1
+
+    def _launch_in_background(self):
+        threading.Thread(target=self._launch, daemon=True).start()
+
+    def warm_up(self):
+        """Fills the pool up to its configured size without blocking the caller."""
+        with self._lock:
+            missing = self.size - self._live
+            self._live += max(missing, 0)
+        for _ in range(max(missing, 0)):
+            self._launch_in_background()
+
+    def _discard(self, pooled: PooledDriver, replace: bool = True):
+        pooled.quit()
+        with self._lock:
+            self._live -= 1
+        if replace:
+            self.warm_up()
+
+    def checkout(self) -> PooledDriver:
+        deadline = time.monotonic() + self.checkout_timeout
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_launch = self._live < self.size
+                    if can_launch:
+                        self._live += 1
+                if can_launch:
+                    # Nothing warm yet: pay the cold start once, on this request
+                    try:
+                        return PooledDriver()
+                    except Exception:
+                        with self._lock:
+                            self._live -= 1
+                        raise
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("Timed out waiting for a free Selenium driver.")
+                try:
+                    pooled = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    raise TimeoutError("Timed out waiting for a free Selenium driver.")
+
+            if pooled.is_healthy():
+                return pooled
+            print("⚠️ Pooled Selenium driver failed its health check. Replacing it.")
+            self._discard(pooled)
+
+    def release(self, pooled: PooledDriver):
+        pooled.uses += 1
+        if pooled.uses >= self.max_uses:
+            print(f"♻️ Recycling Selenium driver after {pooled.uses} uses.")
+            self._discard(pooled)
+            return
+        try:
+            pooled.reset()
+        except Exception as e:
+            print(f"⚠️ Could not reset Selenium driver, discarding it: {e}")
+            self._discard(pooled)
+            return
+        self._idle.put(pooled)
+
+    @contextmanager
+    def driver(self):
+        """Checks out a clean driver for the duration of a `with` block."""
+        pooled = self.checkout()
+        try:
+            yield pooled.driver
+        finally:
+            self.release(pooled)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": self.size, "live": self._live, "idle": self._idle.qsize()}
+
+    def shutdown(self):
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(pooled, replace=False)
+
+
+selenium_pool = SeleniumDriverPool(SELENIUM_POOL_SIZE, SELENIUM_DRIVER_MAX_USES, SELENIUM_POOL_CHECKOUT_TIMEOUT)
+atexit.register(selenium_pool.shutdown)
+# Pre-warming (in the background) is started by `create_app`
+
     
+# ==============================================
+# FORM SCHEMA EXTRACTION
+# ==============================================
+# Explanation: Sending the whole `page_source` to the LLM meant paying for
+# scripts, styles, SVGs and ads on every form. We distill the page down to
+# just what the prompts need: each field's id, type, label, options and
+# whether it is required, with radio buttons / checkboxes grouped by name.
+FORM_FIELD_TAGS = ("input", "select", "textarea")
+IGNORED_INPUT_TYPES = {"hidden", "submit", "button", "reset", "image"}
+NOISE_TAGS = ["script", "style", "noscript", "svg", "iframe", "template", "link", "meta"]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for logging prompt sizes."""
+    return len(text) // 4
+
+
+def _clean_text(text) -> str:
+    return " ".join((text or "").split())
+
+
+def _field_label(doc, element) -> str:
+    """Finds the best human-readable label for a single form control."""
+    field_id = element.get("id")
+    if field_id:
+        for label in doc.xpath("//label[@for=$id]", id=field_id):
+            text = _clean_text(label.text_content())
+            if text:
+                return text
+    for ancestor in element.iterancestors("label"):
+        text = _clean_text(ancestor.text_content())
+        if text:
+            return text
+    labelled_by = element.get("aria-labelledby")
+    if labelled_by:
+        parts = [_clean_text(node.text_content()) for ref in labelled_by.split() for node in doc.xpath("//*[@id=$id]", id=ref)]
+        if any(parts):
+            return " ".join(p for p in parts if p)
+    return _clean_text(element.get("aria-label") or element.get("placeholder") or element.get("title"))
+
+
+def _group_label(element, max_levels: int = 4) -> str:
+    """For radio/checkbox groups: the nearest legend or free-standing label above the options."""
+    for level, ancestor in enumerate(element.iterancestors()):
+        if level >= max_levels or ancestor.tag == "form":
+            break
+        for node in ancestor.xpath(".//legend | .//label[not(@for)]"):
+            if element in node.iterdescendants():
+                continue
+            text = _clean_text(node.text_content())
+            if text:
+                return text
+    return ""
+
+
+def _container(element, max_levels: int = 6):
+    """Custom dropdown widgets are driven through the element (with an id) wrapping their input."""
+    for level, ancestor in enumerate(element.iterancestors()):
+        if level >= max_levels or ancestor.tag == "form":
+            break
+        if ancestor.get("id"):
+            return ancestor
+    return None
+
+
+def _is_required(element) -> bool:
+    return element.get("required") is not None or element.get("aria-required") == "true"
+
+
+def extract_form_schema(html: str) -> dict:
+    """Reduces a page to a compact description of its form fields."""
+    doc = lxml_html.fromstring(html)
+    for bad in doc.xpath("|".join(f"//{tag}" for tag in NOISE_TAGS)):
+        bad.drop_tree()
+
+    title = _clean_text(doc.findtext(".//title"))
+    forms = doc.xpath("//form") or [doc]
+    schema = {"title": title, "forms": []}
+
+    for form in forms:
+        fields = []
+        groups = {}
+        submit_ids = []
+        for element in form.iter(*FORM_FIELD_TAGS, "button"):
+            tag = element.tag
+            field_type = (element.get("type") or ("text" if tag == "input" else tag)).lower()
+
+            if tag == "button" or field_type in ("submit", "image"):
+                if (tag != "button" or field_type == "submit") and element.get("id"):
+                    submit_ids.append(element.get("id"))
+                continue
+            if field_type in IGNORED_INPUT_TYPES or element.get("disabled") is not None:
+                continue
+
+            if field_type in ("radio", "checkbox"):
+                group_name = element.get("name") or element.get("id")
+                group = groups.get(group_name)
+                if group is None:
+                    group = {"group": group_name, "type": field_type, "label": _group_label(element), "options": []}
+                    if _is_required(element):
+                        group["required"] = True
+                    groups[group_name] = group
+                    fields.append(group)
+                option = {"id": element.get("id"), "label": _field_label(doc, element), "value": element.get("value")}
+                group["options"].append({k: v for k, v in option.items() if v})
+                continue
+
+            field = {
+                "id": element.get("id"),
+                "name": element.get("name"),
+                "type": field_type,
+                "label": _field_label(doc, element),
+            }
+            if _is_required(element):
+                field["required"] = True
+            if tag == "select":
+                field["options"] = [_clean_text(o.text_content()) for o in element.iter("option") if _clean_text(o.text_content())]
+            if element.get("role") == "combobox" or element.get("aria-autocomplete"):
+                field["widget"] = "combobox"
+                container = _container(element)
+                if container is not None:
+                    field["container_id"] = container.get("id")
+                    # e.g. the "Select State" placeholder rendered inside the widget
+                    field["label"] = field["label"] or _clean_text(container.text_content())
+            fields.append({k: v for k, v in field.items() if v})
+
+        if fields:
+            entry = {"id": form.get("id"), "fields": fields}
+            if submit_ids:
+                entry["submit_ids"] = submit_ids
+            schema["forms"].append({k: v for k, v in entry.items() if v})
+
+    return schema
+
+
+def distill_form_html(html: str) -> str:
+    """
+    Returns the compact JSON form schema to put in a prompt, logging the size reduction.
+    Falls back to the raw HTML if no form fields could be found.
+    """
+    try:
+        schema = extract_form_schema(html)
+    except Exception as e:
+        print(f"⚠️ Could not extract form schema, using raw HTML: {e}")
+        return html
+    if not schema["forms"]:
+        print("⚠️ No form fields found in page, using raw HTML.")
+        return html
+
+    distilled = json.dumps(schema, separators=(",", ":"), ensure_ascii=False)
+    before, after = len(html.encode()), len(distilled.encode())
+    print(
+        f"📉 Form schema: {before:,} → {after:,} bytes "
+        f"(~{estimate_tokens(html):,} → ~{estimate_tokens(distilled):,} tokens, {100 - after * 100 // max(before, 1)}% smaller)"
+    )
+    return distilled
+
+
 def scrape_with_selenium(url: str) -> str:
     """
     Uses Selenium in a visible browser to reliably get the full HTML of a page.
@@ -628,137 +2656,400 @@ def scrape_with_selenium(url: str) -> str:
     """
     print("🤖 Starting Selenium scraper for analysis")
     
-    driver = create_isolated_selenium_driver()
-    
-    try:
-        driver.get(url)
-        # Wait for the main form element to be present
-        WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.TAG_NAME, "form")))
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
+    with selenium_pool.driver() as driver:
+        with selenium_latency.time(phase="page_load"):
+            driver.get(url)
+            # Wait for the main form element to be present
+            WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.TAG_NAME, "form")))
         print("  - Form loaded successfully. Returning HTML.")
         html = driver.page_source
         return html
-    finally:
-        driver.quit()
 
-def execute_selenium_fill(url: str, mapped_form_data: dict, user_data: dict):
+# ==============================================
+# FORM SCHEMA CACHE
+# ==============================================
+# Explanation: A job application is a two-step flow: the first tool call
+# scrapes the page to find out what to ask the user, the second one fills it.
+# Both used to launch Chrome and load the same page. We keep the distilled
+# schema per URL for a while so the fill phase can reuse it. With
+# FORM_SCHEMA_REVALIDATE on, a plain conditional HTTP GET checks whether the
+# page changed (ETag / Last-Modified / form hash) before trusting the cache.
+# The hash covers the fields extract_form_schema finds in that response, not
+# the raw body, so a fresh CSRF token, nonce or timestamp on every load
+# doesn't count as a change.
+FORM_SCHEMA_CACHE_TTL = int(os.getenv("FORM_SCHEMA_CACHE_TTL", "1800"))
+FORM_SCHEMA_CACHE_MAX_ENTRIES = int(os.getenv("FORM_SCHEMA_CACHE_MAX_ENTRIES", "256"))
+FORM_SCHEMA_REVALIDATE = os.getenv("FORM_SCHEMA_REVALIDATE", "true").lower() == "true"
+FORM_SCHEMA_REVALIDATE_TIMEOUT = 5
+
+
+class CachedFormSchema:
+    """A distilled form schema plus what we need to tell whether the page changed."""
+
+    def __init__(self, schema: str):
+        self.schema = schema
+        self.schema_hash = hashlib.sha256(schema.encode()).hexdigest()
+        self.etag = None
+        self.last_modified = None
+        self.form_hash = None  # hash of the form fields in the HTML served to a plain HTTP client
+
+
+form_schema_cache = TTLCache(FORM_SCHEMA_CACHE_TTL, FORM_SCHEMA_CACHE_MAX_ENTRIES)
+
+
+def normalize_form_url(url: str) -> str:
+    """Fragments never reach the server, so '#apply' and '#top' share one entry."""
+    return urldefrag(url.strip())[0]
+
+
+def form_fields_hash(html: str):
+    """Hash of the page's form fields, ignoring hidden inputs, scripts and other per-load noise."""
+    try:
+        schema = extract_form_schema(html)
+    except Exception as e:
+        print(f"⚠️ Could not extract form fields to fingerprint: {e}")
+        return None
+    return hashlib.sha256(json.dumps(schema, sort_keys=True).encode()).hexdigest()
+
+
+def fingerprint_page(url: str, entry: CachedFormSchema):
+    """Records the page's HTTP validators and form hash on the cache entry."""
+    try:
+        response = http_client.get(url, upstream="form-pages", timeout=FORM_SCHEMA_REVALIDATE_TIMEOUT, retry=False)
+        response.raise_for_status()
+    except Exception as e:
+        print(f"⚠️ Could not fingerprint {url} for revalidation: {e}")
+        return
+    entry.etag = response.headers.get("ETag")
+    entry.last_modified = response.headers.get("Last-Modified")
+    entry.form_hash = form_fields_hash(response.text)
+
+
+def form_page_changed(url: str, entry: CachedFormSchema) -> bool:
+    """
+    Cheap check (no browser) of whether the page behind a cached schema changed.
+    If we can't tell (no fingerprint, request failed) we trust the cache until its TTL.
+    """
+    if not (entry.etag or entry.last_modified or entry.form_hash):
+        return False
+    headers = {}
+    if entry.etag:
+        headers["If-None-Match"] = entry.etag
+    if entry.last_modified:
+        headers["If-Modified-Since"] = entry.last_modified
+    try:
+        response = http_client.get(url, upstream="form-pages", headers=headers, timeout=FORM_SCHEMA_REVALIDATE_TIMEOUT, retry=False)
+    except Exception as e:
+        print(f"⚠️ Could not revalidate cached form schema for {url}: {e}")
+        return False
+    if response.status_code == 304:
+        return False
+    if response.status_code != 200 or entry.form_hash is None:
+        return False
+    form_hash = form_fields_hash(response.text)
+    return form_hash is not None and form_hash != entry.form_hash
+
+
+def get_form_schema(url: str, revalidate: bool = False) -> str:
+    """
+    Returns the distilled form schema for `url`, scraping with Selenium only on a
+    cache miss (or, with `revalidate`, when the page has changed since).
+    """
+    key = normalize_form_url(url)
+    hit, entry = form_schema_cache.get(key)
+    if hit:
+        if not (revalidate and form_page_changed(url, entry)):
+            print(f"♻️ Reusing cached form schema for {key} (sha256 {entry.schema_hash[:12]})")
+            return entry.schema
+        print(f"🔄 Page changed since it was scraped, re-scraping {key}")
+
+    schema = distill_form_html(scrape_with_selenium(url))
+    entry = CachedFormSchema(schema)
+    form_schema_cache.set(key, entry)
+    if FORM_SCHEMA_REVALIDATE:
+        # Fingerprinting is only needed later, so keep it off this request's path
+        threading.Thread(target=fingerprint_page, args=(url, entry), daemon=True).start()
+    return schema
+
+
+def execute_selenium_fill(url: str, mapped_form_data: dict, user_data: dict, screenshot_dir: str = None, on_step=None):
     """
     This is the definitive script. It interacts with every component
     using the correct, proven method for that component.
+    `on_step` (optional) is called with a short message as each stage completes.
     """
-    driver = create_isolated_selenium_driver()
-    driver.maximize_window()
+    if screenshot_dir is None:
+        screenshot_dir = os.path.join("output", "final_screenshots")
+    if on_step is None:
+        on_step = lambda message: None
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.common.keys import Keys
+    from selenium.webdriver.support.ui import WebDriverWait, Select
+    from selenium.webdriver.support import expected_conditions as EC
+
+    with selenium_pool.driver() as driver:
+        driver.maximize_window()
     
-    print(f"🤖 Navigating to {url} with Definitive Selenium Engine...")
-    driver.get(url)
-    WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.ID, "userForm")))
-    print("  - Page and form loaded. Starting to fill form.")
-
-    screenshot_dir = os.path.join("output", "final_screenshots")
-    os.makedirs(screenshot_dir, exist_ok=True)
-    driver.save_screenshot(os.path.join(screenshot_dir, "0_page_loaded.png"))
-
-    for field_id, value in mapped_form_data.items():
-        try:
-            print(f"\n--- Processing Field ID: '{field_id}' with Value: '{value}' ---")
+        print(f"🤖 Navigating to {url} with Definitive Selenium Engine...")
+        with selenium_latency.time(phase="page_load"):
+            driver.get(url)
+            WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.ID, "userForm")))
+        print("  - Page and form loaded. Starting to fill form.")
+
+        os.makedirs(screenshot_dir, exist_ok=True)
+        driver.save_screenshot(os.path.join(screenshot_dir, "0_page_loaded.png"))
+        on_step("Page loaded")
+
+        for field_id, value in mapped_form_data.items():
+            field_start = time.perf_counter()
+            try:
+                print(f"\n--- Processing Field ID: '{field_id}' with Value: '{value}' ---")
             
-            element = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, field_id)))
-            driver.execute_script("arguments[0].scrollIntoView(true);", element)
-            time.sleep(0.5)
+                element = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, field_id)))
+                driver.execute_script("arguments[0].scrollIntoView(true);", element)
+                time.sleep(0.5)
 
             
-            if 'gender' in field_id or 'hobbies' in field_id:
-                label_selector = f"//label[@for='{field_id}']"
-                label_element = driver.find_element(By.XPATH, label_selector)
-                label_element.click()
-                print(f"  - ✅ Clicked label: '{label_element.text}'")
+                if 'gender' in field_id or 'hobbies' in field_id:
+                    label_selector = f"//label[@for='{field_id}']"
+                    label_element = driver.find_element(By.XPATH, label_selector)
+                    label_element.click()
+                    print(f"  - ✅ Clicked label: '{label_element.text}'")
             
             
-            elif field_id == "dateOfBirthInput":
-                print(f"  - Interacting with date picker for '{value}'...")
+                elif field_id == "dateOfBirthInput":
+                    print(f"  - Interacting with date picker for '{value}'...")
                
-                date_obj = datetime.strptime(value, "%d %b %Y")
+                    date_obj = datetime.strptime(value, "%d %b %Y")
                 
-                element.click() # 1. Click the input to open the calendar
+                    element.click() # 1. Click the input to open the calendar
                 
-                # 2. Select the Year from its dropdown
-                year_dropdown = Select(WebDriverWait(driver, 5).until(EC.element_to_be_clickable((By.CLASS_NAME, 'react-datepicker__year-select'))))
-                year_dropdown.select_by_visible_text(date_obj.strftime("%Y"))
+                    # 2. Select the Year from its dropdown
+                    year_dropdown = Select(WebDriverWait(driver, 5).until(EC.element_to_be_clickable((By.CLASS_NAME, 'react-datepicker__year-select'))))
+                    year_dropdown.select_by_visible_text(date_obj.strftime("%Y"))
                 
-                # 3. Select the Month from its dropdown
-                month_dropdown = Select(WebDriverWait(driver, 5).until(EC.element_to_be_clickable((By.CLASS_NAME, 'react-datepicker__month-select'))))
-                month_dropdown.select_by_visible_text(date_obj.strftime("%B"))
+                    # 3. Select the Month from its dropdown
+                    month_dropdown = Select(WebDriverWait(driver, 5).until(EC.element_to_be_clickable((By.CLASS_NAME, 'react-datepicker__month-select'))))
+                    month_dropdown.select_by_visible_text(date_obj.strftime("%B"))
                 
-                # 4. Select the Day by clicking it
-                day_selector = f"//div[contains(@class, 'react-datepicker__day') and not(contains(@class, 'outside-month')) and text()='{date_obj.day}']"
-                day_element = WebDriverWait(driver, 5).until(EC.element_to_be_clickable((By.XPATH, day_selector)))
-                day_element.click()
-                print("  - ✅ Date set.")
-
-            elif field_id == "uploadPicture":
-                element.send_keys(value)
-                print("  - ✅ File path sent.")
-
-            elif field_id == "subjectsInput":
-                element.send_keys(value)
-                time.sleep(0.5)
-                element.send_keys(Keys.ENTER)
-                print(f"  - ✅ Selected subject '{value}'.")
+                    # 4. Select the Day by clicking it
+                    day_selector = f"//div[contains(@class, 'react-datepicker__day') and not(contains(@class, 'outside-month')) and text()='{date_obj.day}']"
+                    day_element = WebDriverWait(driver, 5).until(EC.element_to_be_clickable((By.XPATH, day_selector)))
+                    day_element.click()
+                    print("  - ✅ Date set.")
+
+                elif field_id == "uploadPicture":
+                    element.send_keys(value)
+                    print("  - ✅ File path sent.")
+
+                elif field_id == "subjectsInput":
+                    element.send_keys(value)
+                    time.sleep(0.5)
+                    element.send_keys(Keys.ENTER)
+                    print(f"  - ✅ Selected subject '{value}'.")
+
+                elif field_id == "state":
+                    # Handle state selection
+                    element.send_keys(value)
+                    time.sleep(0.5)
+                
+                    option_selector = f"//div[contains(@class, 'option') and text()='{value}']"
+                    option = WebDriverWait(driver, 5).until(
+                        EC.element_to_be_clickable((By.XPATH, option_selector))
+                    )
+                    option.click()
+                    print(f"  - ✅ Selected state '{value}'.")
+                
+                elif field_id == "city":
+                    # Wait for city dropdown to become enabled after state selection
+                    WebDriverWait(driver, 5).until(
+                        EC.element_to_be_clickable((By.ID, "city"))
+                    )
+                
+                    # Click to open the dropdown
+                    element.click()
+                    time.sleep(0.3)
+                
+                    # Type the city name
+                    element.send_keys(value)
+                    time.sleep(0.5)
+                
+                    # Select the option
+                    option_selector = f"//div[contains(@class, 'option') and text()='{value}']"
+                    option = WebDriverWait(driver, 5).until(
+                        EC.element_to_be_clickable((By.XPATH, option_selector))
+                    )
+                    option.click()
+                    print(f"  - ✅ Selected city '{value}'.")
+
+                else: # Standard text fields
+                    element.clear()
+                    element.send_keys(value)
+                    print("  - ✅ Typed.")
+
+                on_step(f"Filled field '{field_id}'")
+
+            except Exception as e:
+                print(f"  - ❌ An error occurred on field '{field_id}': {e}")
+                on_step(f"Could not fill field '{field_id}': {e}")
+            selenium_latency.observe(time.perf_counter() - field_start, phase="field_fill")
+    
+        print("\n\n✅ Form filling process complete. Submitting form...")
+        with selenium_latency.time(phase="submit"):
+            submit_button = driver.find_element(By.ID, "submit")
+            driver.execute_script("arguments[0].click();", submit_button)
+            print("✅ Form submitted!")
+            time.sleep(5)
+        driver.save_screenshot(os.path.join(screenshot_dir, "2_form_submitted.png"))
+        on_step("Form submitted")
+
+        print("\n🎉🎉🎉 100% COMPLETE. CONGRATULATIONS. THIS IS IT. 🎉🎉🎉")
+
+def run_form_fill(url: str, user_data: dict, screenshot_dir: str = None, on_step=None) -> str:
+    """Scrapes the form, asks the LLM to map the user's data onto it and fills it in."""
+    if on_step is None:
+        on_step = lambda message: None
+
+    print(f"🤖 Starting Selenium Execution for URL: {url}")
+    form_schema = get_form_schema(url, revalidate=FORM_SCHEMA_REVALIDATE)
+    on_step("Form schema ready")
+    # This is the definitive prompt for our proven execution engine
+    mapping_prompt = f"""
+    Translate the User Data into a JSON object for a Selenium bot.
+    The keys MUST be the EXACT 'id' values from the Form Schema.
+    For radio buttons and checkboxes, use the 'id' of the specific option the user chose.
+    For fields with a 'container_id' (custom dropdowns), use the 'container_id' as the key.
+
+    IMPORTANT: For the 'Date of Birth', you MUST convert the user's date (e.g., '28/09/2004') into the exact format 'DD Month YYYY' (e.g., '28 Sep 2004').
+
+    User Data: {json.dumps(user_data)}
+    Form Schema: {form_schema}
+
+    Return ONLY the final, translated JSON object.
+    """
+    print("🤖 Asking LLM to perform direct mapping for Selenium...")
+    mapped_data_str = cached_llm_invoke(deterministic_llm, mapping_prompt, persist=False).strip()
+    
+    if mapped_data_str.startswith("```json"):
+        mapped_data_str = mapped_data_str[7:-4]
+
+    final_mapped_data = json.loads(mapped_data_str)
+    print(f"🤖 LLM produced ACCURATE mapping: {final_mapped_data}")
+    on_step(f"Mapped {len(final_mapped_data)} fields")
+
+    # Call the proven Selenium execution function
+    execute_selenium_fill(url, final_mapped_data, user_data, screenshot_dir=screenshot_dir, on_step=on_step)
+    return "✅ The form has been filled on your behalf. This was successful."
+
+
+# ==============================================
+# FORM FILL JOBS
+# ==============================================
+# Explanation: A form fill takes tens of seconds of browser work. Running it
+# inside the request blocked our single gunicorn worker for everyone. The tool
+# now queues a job on a small thread pool and returns its id immediately.
+# Progress, screenshots and the final result can be polled via /jobs/<id>.
+FORM_FILL_MAX_CONCURRENCY = int(os.getenv("FORM_FILL_MAX_CONCURRENCY", str(SELENIUM_POOL_SIZE)))
+FORM_FILL_JOB_TTL = int(os.getenv("FORM_FILL_JOB_TTL", "3600"))
+FORM_FILL_JOBS_DIR = os.path.join("output", "jobs")
+
+
+class FormFillJob:
+    """State of one background form fill."""
+
+    def __init__(self, session_id: str, url: str, user_data: dict):
+        self.id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.url = url
+        self.user_data = user_data
+        self.status = "queued"  # queued -> running -> succeeded | failed
+        self.steps = []
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now(timezone.utc)
+        self.finished_at = None
+        self.screenshot_dir = os.path.join(FORM_FILL_JOBS_DIR, self.id)
+
+    def add_step(self, message: str):
+        self.steps.append({"at": datetime.now(timezone.utc).isoformat(), "message": message})
+
+    def screenshots(self) -> list:
+        if not os.path.isdir(self.screenshot_dir):
+            return []
+        return sorted(name for name in os.listdir(self.screenshot_dir) if name.endswith(".png"))
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "url": self.url,
+            "status": self.status,
+            "steps": list(self.steps),
+            "screenshots": [url_for("web.form_fill_job_screenshot", job_id=self.id, name=name) for name in self.screenshots()],
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
 
-            elif field_id == "state":
-                # Handle state selection
-                element.send_keys(value)
-                time.sleep(0.5)
-                
-                option_selector = f"//div[contains(@class, 'option') and text()='{value}']"
-                option = WebDriverWait(driver, 5).until(
-                    EC.element_to_be_clickable((By.XPATH, option_selector))
-                )
-                option.click()
-                print(f"  - ✅ Selected state '{value}'.")
-                
-            elif field_id == "city":
-                # Wait for city dropdown to become enabled after state selection
-                WebDriverWait(driver, 5).until(
-                    EC.element_to_be_clickable((By.ID, "city"))
-                )
-                
-                # Click to open the dropdown
-                element.click()
-                time.sleep(0.3)
-                
-                # Type the city name
-                element.send_keys(value)
-                time.sleep(0.5)
-                
-                # Select the option
-                option_selector = f"//div[contains(@class, 'option') and text()='{value}']"
-                option = WebDriverWait(driver, 5).until(
-                    EC.element_to_be_clickable((By.XPATH, option_selector))
-                )
-                option.click()
-                print(f"  - ✅ Selected city '{value}'.")
-
-            else: # Standard text fields
-                element.clear()
-                element.send_keys(value)
-                print("  - ✅ Typed.")
 
+class FormFillJobQueue:
+    """Runs form fills on a bounded worker pool and keeps their state for a while."""
+
+    def __init__(self, max_workers: int, job_ttl: int):
+        self.job_ttl = job_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="form-fill")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, session_id: str, url: str, user_data: dict) -> FormFillJob:
+        self._prune()
+        job = FormFillJob(session_id, url, user_data)
+        job.add_step("Queued")
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str, session_id: str):
+        """Returns the job only if it belongs to this session."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job.session_id != session_id:
+            return None
+        return job
+
+    def _run(self, job: FormFillJob):
+        job.status = "running"
+        job.add_step("Started")
+        try:
+            job.result = run_form_fill(job.url, job.user_data, screenshot_dir=job.screenshot_dir, on_step=job.add_step)
+            job.status = "succeeded"
         except Exception as e:
-            print(f"  - ❌ An error occurred on field '{field_id}': {e}")
-    
-    print("\n\n✅ Form filling process complete. Submitting form...")
-    submit_button = driver.find_element(By.ID, "submit")
-    driver.execute_script("arguments[0].click();", submit_button)
-    print("✅ Form submitted!")
-    time.sleep(5)
-    driver.save_screenshot(os.path.join(screenshot_dir, "2_form_submitted.png"))
+            print(f"❌ Form fill job {job.id} failed: {e}")
+            job.error = f"❌ An error occurred during the Selenium form filling phase: {str(e)}"
+            job.status = "failed"
+        finally:
+            job.finished_at = datetime.now(timezone.utc)
+            job.add_step("Finished")
+
+    def _prune(self):
+        """Forgets finished jobs older than the TTL and deletes their screenshots."""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.job_ttl)
+        with self._lock:
+            expired = [job for job in self._jobs.values() if job.finished_at and job.finished_at < cutoff]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            shutil.rmtree(job.screenshot_dir, ignore_errors=True)
+
+
+form_fill_jobs = FormFillJobQueue(FORM_FILL_MAX_CONCURRENCY, FORM_FILL_JOB_TTL)
 
-    print("\n🎉🎉🎉 100% COMPLETE. CONGRATULATIONS. THIS IS IT. 🎉🎉🎉")
-    time.sleep(20)
-    driver.quit()
 
 @tool
-def fill_job_application(action_input: str) -> str:
+def fill_job_application(action_input: str, ctx: Annotated[ToolContext, InjectedToolArg]) -> str:
     """
     Automates filling a web form using a robust Selenium backend.
     """
@@ -777,56 +3068,36 @@ def fill_job_application(action_input: str) -> str:
     if user_data is None:
         print(f"🤖 Starting Selenium Analysis for URL: {url}")
         try:
-            html_content = scrape_with_selenium(url)
+            form_schema = get_form_schema(url, revalidate=FORM_SCHEMA_REVALIDATE)
             analysis_prompt = f"""
-            Analyze the following HTML. Your ONLY output must be a single line starting with "Analysis complete. To fill out the form, I need the following details from you: "
+            Analyze the following form schema (JSON extracted from the page's HTML). Your ONLY output must be a single line starting with "Analysis complete. To fill out the form, I need the following details from you: "
             Followed by a simple, comma-separated list of the main visible labels (e.g., Name, Email, Gender, Hobbies).
 
-            HTML Content:
-            {html_content}
+            Form Schema:
+            {form_schema}
             """
-            analysis_response = llm.invoke(analysis_prompt)
-            return analysis_response.content
+            return cached_llm_invoke(deterministic_llm, analysis_prompt)
         except Exception as e:
             return f"❌ An error occurred during the Selenium analysis phase: {str(e)}"
 
-    # --- Mode 2: Map data and fill with Selenium ---
+    # --- Mode 2: Map data and fill with Selenium (in the background) ---
     else:
-        print(f"🤖 Starting Selenium Execution for URL: {url}")
-        try:
-            html_content = scrape_with_selenium(url)
-            # This is the definitive prompt for our proven execution engine
-            mapping_prompt = f"""
-            Translate the User Data into a JSON object for a Selenium bot.
-            The keys MUST be the EXACT 'id' attributes from the HTML.
-            For radio buttons and checkboxes, use the 'id' of the specific option the user chose.
+        job = form_fill_jobs.submit(ctx.session_id, url, user_data)
+        print(f"📥 Queued form fill job {job.id} for URL: {url}")
+        return (
+            f"✅ Your application has been queued and is being filled in the background. "
+            f"Job ID: {job.id}. You can follow its progress at /jobs/{job.id}."
+        )
 
-            IMPORTANT: For the 'Date of Birth', you MUST convert the user's date (e.g., '28/09/2004') into the exact format 'DD Month YYYY' (e.g., '28 Sep 2004').
-
-            User Data: {json.dumps(user_data)}
-            HTML Content: {html_content}
-
-            Return ONLY the final, translated JSON object.
-            """
-            print("🤖 Asking LLM to perform direct mapping for Selenium...")
-            mapping_response = llm.invoke(mapping_prompt)
-            mapped_data_str = mapping_response.content.strip()
-            
-            if mapped_data_str.startswith("```json"):
-                mapped_data_str = mapped_data_str[7:-4]
-
-            final_mapped_data = json.loads(mapped_data_str)
-            print(f"🤖 LLM produced ACCURATE mapping: {final_mapped_data}")
-
-            # Call the proven Selenium execution function
-            execute_selenium_fill(url, final_mapped_data, user_data)
-            return "✅ The form has been filled on your behalf. This was successful."
+# Initialize tools
+def create_web_search():
+    from langchain_community.tools import DuckDuckGoSearchRun
+    return DuckDuckGoSearchRun()
 
-        except Exception as e:
-            return f"❌ An error occurred during the Selenium form filling phase: {str(e)}"
 
-# Initialize tools
-search = DuckDuckGoSearchRun()
+search = LazyResource("web search", create_web_search)
+# What DuckDuckGoSearchRun returns for an empty or rate-limited search; retrying later may find results
+NO_SEARCH_RESULT = "No good DuckDuckGo Search Result was found"
 
 @tool
 def search_the_web(query: str) -> str:
@@ -834,41 +3105,562 @@ def search_the_web(query: str) -> str:
     Use this tool to search the internet for general knowledge, facts, definitions,
     or information about places. For example, use it to find the capital of a state or country.
     """
-    return search.run(query)
-tools = [fill_job_application,search_the_web, get_weather_data, get_today_date, send_email, create_calendar_event, get_calendar_events, delete_calendar_event,post_on_linkedin]
+    return search_cache.get_or_compute(
+        normalize_tool_query(query),
+        lambda: search.run(query),
+        cacheable=lambda result: bool(result.strip()) and not result.startswith(NO_SEARCH_RESULT),
+    )
+tools = [fill_job_application,search_the_web, get_weather_data, get_today_date, send_email, send_emails, create_calendar_event, create_calendar_events, get_calendar_events, delete_calendar_event, delete_calendar_events,post_on_linkedin]
+
+
+def render_tool_descriptions(tool_list: list) -> str:
+    """
+    Same output as LangChain's render_text_description, minus the `ctx`
+    argument: it is filled in by `bind_tools`, never by the model.
+    """
+    descriptions = []
+    for t in tool_list:
+        sig = inspect.signature(t.func)
+        sig = sig.replace(parameters=[p for name, p in sig.parameters.items() if name != "ctx"])
+        descriptions.append(f"{t.name}{sig} - {t.description}")
+    return "\n".join(descriptions)
+
+
+def bind_tools(ctx: ToolContext) -> list:
+    """
+    Returns the tool list for one request. Tools that take a `ctx` argument
+    get it filled in here, so the agent only ever passes them its Action Input.
+    """
+    bound = []
+    for t in tools:
+        if "ctx" in inspect.signature(t.func).parameters:
+            bound.append(Tool(name=t.name, description=t.description, func=functools.partial(t.func, ctx=ctx)))
+        else:
+            bound.append(t)
+    if AGENT_PARALLEL_TOOLS:
+        bound = add_parallel_tool(bound)
+    return bound
+
+# ==============================================
+# PARALLEL TOOL CALLS
+# ==============================================
+# Explanation: A ReAct step normally carries exactly one Action, so "weather
+# in Delhi, Mumbai and Pune" costs three LLM round trips plus three serial
+# HTTP calls. In parallel mode the model may list several independent
+# Action / Action Input pairs in one step. The output parser folds them into
+# a single call to a hidden `parallel_tool_calls` tool, which runs them on a
+# thread pool and returns all the observations together.
+AGENT_PARALLEL_TOOLS = os.getenv("AGENT_PARALLEL_TOOLS", "true").lower() == "true"
+AGENT_PARALLEL_MAX_WORKERS = int(os.getenv("AGENT_PARALLEL_MAX_WORKERS", "4"))
+PARALLEL_TOOL_NAME = "parallel_tool_calls"
+# Read-only tools can safely overlap; a batch with anything else runs in the order given
+PARALLEL_SAFE_TOOLS = {"search_the_web", "get_weather_data", "get_today_date", "get_calendar_events"}
+
+parallel_tool_executor = ThreadPoolExecutor(max_workers=AGENT_PARALLEL_MAX_WORKERS, thread_name_prefix="agent-tool")
+
+PARALLEL_INSTRUCTIONS = """
+If the question needs several tool calls that do not depend on each other (for example the weather in a few cities and the user's calendar events), you may request them all in one step by repeating the Action and Action Input lines. All of their Observations will come back together:
+Action: get_weather_data
+Action Input: Delhi
+Action: get_weather_data
+Action Input: Mumbai
+"""
+
+ACTION_PAIR_REGEX = re.compile(
+    r"Action\s*\d*\s*:[\s]*(.*?)[\s]*Action\s*\d*\s*Input\s*\d*\s*:[\s]*(.*?)(?=\n\s*Action\s*\d*\s*:|\Z)",
+    re.DOTALL,
+)
+
+
+class ParallelReActOutputParser(ReActSingleInputOutputParser):
+    """ReAct parser that also understands several Action / Action Input pairs in one step."""
+
+    def parse(self, text: str):
+        matches = ACTION_PAIR_REGEX.findall(text)
+        if len(matches) < 2 or FINAL_ANSWER_ACTION in text:
+            return super().parse(text)
+        calls = [{"tool": name.strip(), "input": value.strip(" ").strip().strip('"')} for name, value in matches]
+        return AgentAction(PARALLEL_TOOL_NAME, json.dumps(calls), text)
+
+
+def run_parallel_tool_calls(tool_input: str, tools_by_name: dict, callbacks=None) -> str:
+    """Runs the batched calls and formats every observation under its own heading."""
+    calls = json.loads(tool_input)
+
+    def run_one(call):
+        t = tools_by_name.get(call["tool"])
+        if t is None:
+            return f"{call['tool']} is not a valid tool, try one of [{', '.join(tools_by_name)}]."
+        try:
+            return t.run(call["input"], callbacks=callbacks)
+        except Exception as e:
+            return f"❌ An unexpected error occurred in {call['tool']}: {str(e)}"
+
+    if all(call["tool"] in PARALLEL_SAFE_TOOLS for call in calls):
+        print(f"⚡ Running {len(calls)} tool calls in parallel")
+        observations = list(parallel_tool_executor.map(run_one, calls))
+    else:
+        observations = [run_one(call) for call in calls]
+
+    return "\n\n".join(
+        f"[{i}] {call['tool']}({call['input']}):\n{observation}"
+        for i, (call, observation) in enumerate(zip(calls, observations), start=1)
+    )
+
+
+def add_parallel_tool(bound_tools: list) -> list:
+    """Adds the hidden batching tool, wired to this request's tool instances."""
+    tools_by_name = {t.name: t for t in bound_tools}
+    parallel_tool = Tool(
+        name=PARALLEL_TOOL_NAME,
+        description="Runs several independent tool calls at once.",
+        func=functools.partial(run_parallel_tool_calls, tools_by_name=tools_by_name),
+    )
+    return bound_tools + [parallel_tool]
+
 
 # ==============================================
 # LLM SETUP
 # ==============================================
-# ===CODE FOR RENDER DEPLOYMENT ===
-credentials_json_str = os.getenv("GOOGLE_CREDENTIALS_JSON")
-if not credentials_json_str:
-    raise ValueError("The GOOGLE_CREDENTIALS_JSON environment variable is not set.")
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+# "scripted" replaces Gemini with the replaying fake from scripted_llm.py, for
+# offline benchmarks (see benchmarks/bench_offline.py) and tests
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+
+if LLM_BACKEND == "gemini":
+    # ===CODE FOR RENDER DEPLOYMENT ===
+    credentials_json_str = os.getenv("GOOGLE_CREDENTIALS_JSON")
+    if not credentials_json_str:
+        raise ValueError("The GOOGLE_CREDENTIALS_JSON environment variable is not set.")
+    # ======================================
+
+
+def load_service_account_credentials():
+    from google.oauth2 import service_account
+    credentials_info = json.loads(credentials_json_str)
+    return service_account.Credentials.from_service_account_info(credentials_info)
+
+
+credentials = LazyResource("google service account", load_service_account_credentials)
+
+
+def create_chat_model(temperature: float):
+    """The one place chat models are created, so a stand-in can be plugged in."""
+    if LLM_BACKEND == "scripted":
+        from scripted_llm import ScriptedChatModel
+        return ScriptedChatModel.from_env(temperature=temperature, callbacks=[llm_metrics_callback])
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    model = ChatGoogleGenerativeAI(
+        model=LLM_MODEL, temperature=temperature, credentials=credentials.get(), callbacks=[llm_metrics_callback]
+    )
+    print(f"✅ LLM initialized (temperature {temperature})")
+    return model
+
+
+llm = LazyResource("llm", lambda: create_chat_model(temperature=0.4))
+
+# ==============================================
+# LLM RESPONSE CACHE
+# ==============================================
+# Explanation: The job-application analysis and mapping prompts, and the
+# plain-LLM fallback in safe_invoke, often receive byte-identical prompts
+# (the same form analyzed for many users, say). Those calls go through
+# `cached_llm_invoke`, an exact-match cache keyed by model, temperature and
+# a hash of the prompt. A small in-memory LRU sits in front of an optional
+# on-disk SQLite table that survives restarts; both expire entries after a
+# TTL and the table is trimmed (least recently used first) once it outgrows
+# LLM_CACHE_MAX_BYTES. Only models at or below LLM_CACHE_MAX_TEMPERATURE are
+# cached, since a sampled answer isn't a reusable one; these sub-calls use
+# `deterministic_llm` (temperature 0) for that reason.
+# Prompts and responses can hold personal data (the mapping prompt carries the
+# user's application details), so the disk tier is off unless
+# LLM_CACHE_DISK_ENABLED is set, and calls made with persist=False never
+# reach it either way.
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_DISK_ENABLED = os.getenv("LLM_CACHE_DISK_ENABLED", "false").lower() == "true"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(tempfile.gettempdir(), "llm_cache.sqlite3"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+LLM_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0"))
+
+deterministic_llm = LazyResource("deterministic llm", lambda: create_chat_model(temperature=0))
+
+
+class LLMResponseCache:
+    """Two-tier (memory LRU, then SQLite) exact-match cache of LLM responses. No `path`, no disk tier."""
+
+    def __init__(self, path: str, ttl: int, memory_entries: int, max_bytes: int):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._memory = TTLCache(ttl, memory_entries)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._db = None
+        if not path:
+            return
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_responses ("
+                " key TEXT PRIMARY KEY, model TEXT NOT NULL, response TEXT NOT NULL,"
+                " size INTEGER NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS llm_responses_last_used ON llm_responses (last_used)")
+
+    @staticmethod
+    def key(model_name: str, temperature: float, prompt: str) -> str:
+        payload = json.dumps([model_name, temperature, prompt])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str, persist: bool = True):
+        hit, response = self._memory.get(key)
+        if hit:
+            with self._lock:
+                self.memory_hits += 1
+            return response
+
+        now = time.time()
+        with self._lock:
+            if self._db is None or not persist:
+                self.misses += 1
+                return None
+            row = self._db.execute(
+                "SELECT response FROM llm_responses WHERE key = ? AND created_at > ?", (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            with self._db:
+                self._db.execute("UPDATE llm_responses SET last_used = ? WHERE key = ?", (now, key))
+        self._memory.set(key, row[0])
+        return row[0]
+
+    def set(self, key: str, model_name: str, response: str, persist: bool = True):
+        self._memory.set(key, response)
+        if self._db is None or not persist:
+            return
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, model, response, size, created_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model_name, response, len(response.encode()), now, now),
+            )
+            self._db.execute("DELETE FROM llm_responses WHERE created_at <= ?", (now - self.ttl,))
+            self._trim()
+
+    def _trim(self):
+        """Drops least recently used rows until the table is back under max_bytes. Caller holds the lock."""
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        doomed, freed = [], 0
+        for key, size in self._db.execute("SELECT key, size FROM llm_responses ORDER BY last_used"):
+            doomed.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._db.executemany("DELETE FROM llm_responses WHERE key = ?", doomed)
+        for (key,) in doomed:
+            self._memory.invalidate(key)
+
+    def count_bypass(self):
+        with self._lock:
+            self.bypassed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = size = 0
+            if self._db is not None:
+                entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_responses").fetchone()
+            return {
+                "disk_enabled": self._db is not None,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "memory_entries": len(self._memory),
+                "disk_entries": entries,
+                "disk_bytes": size,
+            }
+
+
+llm_response_cache = LLMResponseCache(LLM_CACHE_PATH if LLM_CACHE_DISK_ENABLED else None, LLM_CACHE_TTL, LLM_CACHE_MEMORY_ENTRIES, LLM_CACHE_MAX_BYTES)
+
+
+def cached_llm_invoke(model, prompt: str, persist: bool = True) -> str:
+    """
+    `model.invoke(prompt).content`, answered from the cache when the model is deterministic enough.
+    Pass persist=False for prompts with user data: they are then only cached in memory.
+    """
+    temperature = model.temperature or 0.0
+    if not LLM_CACHE_ENABLED or temperature > LLM_CACHE_MAX_TEMPERATURE:
+        llm_response_cache.count_bypass()
+        return model.invoke(prompt).content
+
+    key = LLMResponseCache.key(model.model, temperature, prompt)
+    response = llm_response_cache.get(key, persist)
+    if response is not None:
+        return response
+    response = model.invoke(prompt).content
+    if isinstance(response, str) and response.strip():
+        llm_response_cache.set(key, model.model, response, persist)
+    return response
 
-credentials_info = json.loads(credentials_json_str)
-credentials = service_account.Credentials.from_service_account_info(credentials_info)
-# ======================================
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0.4, credentials=credentials)
-print("✅ LLM initialized")
 
 # ==============================================
 # MEMORY SETUP
 # ==============================================
-user_conversations = {}
+# Explanation: Conversations live in process memory. A plain dict kept every
+# session's full history forever, so memory grew with every new cookie. The
+# store below evicts idle sessions and least recently used ones when over
+# budget, and trims each session to its newest messages.
+CONVERSATION_MAX_SESSIONS = int(os.getenv("CONVERSATION_MAX_SESSIONS", "1000"))
+CONVERSATION_IDLE_TTL = int(os.getenv("CONVERSATION_IDLE_TTL", str(24 * 3600)))
+CONVERSATION_MAX_MESSAGES = int(os.getenv("CONVERSATION_MAX_MESSAGES", "100"))
+CONVERSATION_MAX_SESSION_BYTES = int(os.getenv("CONVERSATION_MAX_SESSION_BYTES", str(256 * 1024)))
+CONVERSATION_MAX_TOTAL_BYTES = int(os.getenv("CONVERSATION_MAX_TOTAL_BYTES", str(64 * 1024 * 1024)))
+
+
+def message_size(message: BaseMessage) -> int:
+    """Approximate resident size of a message: the UTF-8 length of its content."""
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content, default=str)
+    return len(content.encode())
+
+
+class BoundedChatMessageHistory(BaseChatMessageHistory):
+    """In-memory chat history capped by message count and bytes; reports its size to the store."""
+
+    def __init__(self, store: "ConversationStore", session_id: str):
+        self.store = store
+        self.session_id = session_id
+        self.messages = []
+        self.size_bytes = 0
+        # Position bookkeeping for the rolling summary (see HISTORY WINDOW below):
+        # `dropped` messages were trimmed from the front, and the summary covers
+        # every message before absolute position `summary_upto`.
+        self.dropped = 0
+        self.summary = ""
+        self.summary_upto = 0
+
+    def add_messages(self, messages) -> None:
+        before = self.size_bytes
+        for message in messages:
+            self.messages.append(message)
+            self.size_bytes += message_size(message)
+        # Drop the oldest messages, but always keep the newest one
+        while len(self.messages) > 1 and (
+            len(self.messages) > self.store.max_messages or self.size_bytes > self.store.max_session_bytes
+        ):
+            self.size_bytes -= message_size(self.messages.pop(0))
+            self.dropped += 1
+        self.store.resized(self, self.size_bytes - before)
+
+    def clear(self) -> None:
+        before = self.size_bytes
+        self.messages = []
+        self.size_bytes = 0
+        self.dropped = 0
+        self.summary = ""
+        self.summary_upto = 0
+        self.store.resized(self, -before)
+
+
+class ConversationStore:
+    """Per-session chat histories with LRU + idle-TTL eviction and a global memory budget."""
+
+    def __init__(self, max_sessions: int, idle_ttl: int, max_messages: int, max_session_bytes: int, max_total_bytes: int):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_messages = max_messages
+        self.max_session_bytes = max_session_bytes
+        self.max_total_bytes = max_total_bytes
+        self._histories = OrderedDict()  # session_id -> (last_used, history), oldest first
+        self._total_bytes = 0
+        self._evictions = 0
+        self._lock = threading.RLock()
+
+    def get(self, session_id: str) -> BoundedChatMessageHistory:
+        with self._lock:
+            entry = self._histories.get(session_id)
+            if entry is None:
+                history = BoundedChatMessageHistory(self, session_id)
+                print(f"🆕 Created new conversation history for session: {session_id}")
+            else:
+                history = entry[1]
+            self._histories[session_id] = (time.monotonic(), history)
+            self._histories.move_to_end(session_id)
+            self._evict(keep=session_id)
+            return history
+
+    def peek(self, session_id: str):
+        """Returns the existing history without creating one or touching its LRU position."""
+        with self._lock:
+            entry = self._histories.get(session_id)
+            return entry[1] if entry else None
+
+    def resized(self, history: BoundedChatMessageHistory, delta: int):
+        with self._lock:
+            if self._histories.get(history.session_id, (None, None))[1] is not history:
+                return  # already evicted; its bytes were released then
+            self._total_bytes += delta
+            if self._total_bytes > self.max_total_bytes:
+                self._evict(keep=history.session_id)
+
+    def _evict(self, keep: str):
+        now = time.monotonic()
+        while self._histories:
+            session_id, (last_used, history) = next(iter(self._histories.items()))
+            if session_id == keep:
+                break
+            idle = now - last_used > self.idle_ttl
+            over_budget = len(self._histories) > self.max_sessions or self._total_bytes > self.max_total_bytes
+            if not (idle or over_budget):
+                break
+            del self._histories[session_id]
+            self._total_bytes -= history.size_bytes
+            self._evictions += 1
+            print(f"🧹 Evicted conversation history for session: {session_id}")
+
+    def gauges(self) -> dict:
+        with self._lock:
+            return {
+                "resident_sessions": len(self._histories),
+                "resident_bytes": self._total_bytes,
+                "evictions_total": self._evictions,
+            }
+
+
+conversation_store = ConversationStore(
+    CONVERSATION_MAX_SESSIONS,
+    CONVERSATION_IDLE_TTL,
+    CONVERSATION_MAX_MESSAGES,
+    CONVERSATION_MAX_SESSION_BYTES,
+    CONVERSATION_MAX_TOTAL_BYTES,
+)
 
 
-def get_session_history(session_id: str) -> ChatMessageHistory:
-    if session_id not in user_conversations:
-        user_conversations[session_id] = ChatMessageHistory()
-        print(f"🆕 Created new conversation history for session: {session_id}")
-    return user_conversations[session_id]
+def get_session_history(session_id: str) -> BoundedChatMessageHistory:
+    return conversation_store.get(session_id)
 
 
 # ==============================================
-# AGENT SETUP
+# HISTORY WINDOW
 # ==============================================
-react_prompt = hub.pull("hwchase17/react")
+# Explanation: The agent prompt used to receive the full history on every
+# ReAct iteration, so prompts grew with every turn. Now `{chat_history}` is
+# built to a token budget: the most recent turns verbatim, and anything older
+# folded into a rolling summary. The summary is produced by a background
+# thread once enough unsummarized text has piled up, never on the request path.
+# Until it catches up, older messages it doesn't cover yet stay in the prompt
+# verbatim (over budget if need be) rather than disappearing.
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+HISTORY_SUMMARY_TRIGGER_TOKENS = int(os.getenv("HISTORY_SUMMARY_TRIGGER_TOKENS", "400"))
+HISTORY_SUMMARY_MAX_WORDS = 150
+
+history_summary_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-summary")
+summaries_in_flight = set()
+summaries_lock = threading.Lock()
+
+
+def format_chat_history(messages) -> str:
+    formatted_history = []
+    for message in messages:
+        if hasattr(message, 'type'):
+            if message.type == 'human':
+                formatted_history.append(f"Human: {message.content}")
+            elif message.type == 'ai':
+                formatted_history.append(f"Assistant: {message.content}")
+
+    return "\n".join(formatted_history)
+
+
+def summarize_history(history: BoundedChatMessageHistory, upto: int):
+    """Background job: folds messages before absolute position `upto` into the rolling summary."""
+    try:
+        start = max(history.summary_upto, history.dropped)
+        new_messages = history.messages[start - history.dropped:upto - history.dropped]
+        if not new_messages:
+            return
+        prompt = f"""
+        Update the running summary of a conversation between a user and an AI assistant.
+        Keep names, dates, email addresses, URLs, decisions and any facts the assistant may need later.
+        Reply with the updated summary only, in at most {HISTORY_SUMMARY_MAX_WORDS} words.
+
+        Current summary:
+        {history.summary or "(none)"}
+
+        New conversation lines:
+        {format_chat_history(new_messages)}
+        """
+        summary = llm.invoke(prompt).content.strip()
+        if history.summary_upto < upto:
+            history.summary = summary
+            history.summary_upto = upto
+            print(f"📝 Summarized conversation for session {history.session_id} up to message {upto}")
+    except Exception as e:
+        print(f"⚠️ Could not summarize conversation history: {e}")
+    finally:
+        with summaries_lock:
+            summaries_in_flight.discard(history.session_id)
+
+
+def schedule_history_summary(history: BoundedChatMessageHistory, upto: int):
+    with summaries_lock:
+        if history.session_id in summaries_in_flight:
+            return
+        summaries_in_flight.add(history.session_id)
+    history_summary_executor.submit(summarize_history, history, upto)
+
+
+def build_history_context(history: BoundedChatMessageHistory) -> str:
+    """Renders the history for the prompt within HISTORY_TOKEN_BUDGET."""
+    messages = list(history.messages)
+    summary = history.summary
+    budget = HISTORY_TOKEN_BUDGET - estimate_tokens(summary)
+
+    # Walk back from the newest message until the budget is used up
+    window_start = len(messages)
+    used = 0
+    for index in range(len(messages) - 1, -1, -1):
+        cost = message_size(messages[index]) // 4
+        if used + cost > budget and window_start < len(messages):
+            break
+        used += cost
+        window_start = index
+
+    # Older messages that the summary doesn't cover yet
+    window_start_abs = history.dropped + window_start
+    summarized_end = min(max(history.summary_upto - history.dropped, 0), window_start)
+    unsummarized = messages[summarized_end:window_start]
+    if unsummarized and sum(message_size(m) for m in unsummarized) // 4 >= HISTORY_SUMMARY_TRIGGER_TOKENS:
+        schedule_history_summary(history, window_start_abs)
+
+    parts = []
+    if summary:
+        parts.append(f"Summary of earlier conversation: {summary}")
+    recent = format_chat_history(messages[summarized_end:])
+    if recent:
+        parts.append(recent)
+    return "\n".join(parts) if parts else "No previous conversation."
+
+
+def window_chat_history(inputs: dict, config) -> dict:
+    """Swaps the raw message list injected by RunnableWithMessageHistory for the budgeted text."""
+    history = config["configurable"]["message_history"]
+    return {**inputs, "chat_history": build_history_context(history)}
+
 
+# ==============================================
+# AGENT SETUP
+# ==============================================
 memory_aware_prompt = PromptTemplate.from_template(
     """You are a helpful assistant with access to tools for searching the web,
 getting weather info, sending emails, managing calendar events, and fetching dates.
@@ -885,12 +3677,14 @@ IMPORTANT INSTRUCTIONS:
 
 FOR EMAIL OPERATIONS:
 - When using the `send_email` tool, provide Action Input as a valid JSON object with: "recipient", "subject", and "body".
+- To send several emails, use `send_emails` once instead of calling `send_email` repeatedly: provide JSON with "emails" (a list of objects with "recipient", "subject", "body"), or with "recipients" (a list of addresses) plus one "subject" and "body".
 
 FOR CALENDAR OPERATIONS:
 - When using `create_calendar_event`, provide JSON with: "title", "start_datetime", "end_datetime", and optionally "description", "location"
 - DateTime format: Use ISO format like '2024-01-15T10:00:00' or '2024-01-15T14:30:00+05:30'
 - When using `get_calendar_events`, provide JSON with optional: "days_ahead" (default: 7), "max_results" (default: 10)
 - When using `delete_calendar_event`, provide JSON with either "event_id" or "title"
+- To create or delete several events, use `create_calendar_events` (JSON with "events": a list of event objects) or `delete_calendar_events` (JSON with "event_ids" and/or "titles") once instead of one call per event
 
 ✅ Correct Examples:
 Action: send_email
@@ -905,6 +3699,12 @@ Action Input: {{"days_ahead": 7, "max_results": 5}}
 Action: delete_calendar_event
 Action Input: {{"title": "Old Meeting"}}
 
+Action: create_calendar_events
+Action Input: {{"events": [{{"title": "Standup", "start_datetime": "2024-01-16T09:00:00", "end_datetime": "2024-01-16T09:15:00"}}, {{"title": "Retro", "start_datetime": "2024-01-16T16:00:00", "end_datetime": "2024-01-16T17:00:00"}}]}}
+
+Action: send_emails
+Action Input: {{"recipients": ["ann@example.com", "bob@example.com"], "subject": "Offsite", "body": "The offsite moves to Friday."}}
+
 If the user doesn't provide required information, ask for clarification first.
 
 FOR LINKEDIN OPERATIONS:
@@ -917,6 +3717,7 @@ FOR LINKEDIN OPERATIONS:
 1.  **Analyze First:** When the user gives you a job URL, your FIRST and ONLY action is to call the `fill_job_application` tool with JUST the `url`.
 2.  **Ask for Details:** The tool will return a message starting with "Analysis complete...". When you see this, your ONLY next step is to output this exact message to the user as your "Final Answer".
 3.  **Gather and Execute:** The user will provide their data. Now, call the `fill_job_application` tool for the SECOND time, including both the `url` and the `user_data`.
+4.  **Report the Job:** The second call queues the work and returns a Job ID. Output that message to the user as your "Final Answer" without calling the tool again.
 
 Use this format for reasoning and actions:
 
@@ -928,32 +3729,509 @@ Observation: result of the action
 ... (repeat as needed)
 Thought: I now know the final answer
 Final Answer: the final answer to the user
-
+{parallel_instructions}
 Begin!
 
 Question: {input}
 Thought: {agent_scratchpad}"""
 )
 
-agent = create_react_agent(llm, tools, memory_aware_prompt)
+def create_agent():
+    return create_react_agent(
+        llm.get(),
+        tools,
+        memory_aware_prompt.partial(parallel_instructions=PARALLEL_INSTRUCTIONS if AGENT_PARALLEL_TOOLS else ""),
+        output_parser=ParallelReActOutputParser() if AGENT_PARALLEL_TOOLS else None,
+        tools_renderer=render_tool_descriptions,
+    )
+
+
+agent = LazyResource("react agent", create_agent)
+
+AGENT_MAX_ITERATIONS = 12
+
+def build_agent_executor(ctx: ToolContext) -> AgentExecutor:
+    """The executor is cheap to build; building it per request binds the tools to that request."""
+    return AgentExecutor(
+        agent=agent.get(),
+        tools=bind_tools(ctx),
+        verbose=True,
+        handle_parsing_errors=True,
+        max_iterations=AGENT_MAX_ITERATIONS,
+        early_stopping_method="force"
+    )
+
+
+def run_agent_executor(inputs: dict, config) -> dict:
+    ctx = config["configurable"]["tool_context"]
+    return build_agent_executor(ctx).invoke(inputs, config=config)
 
-agent_executor = AgentExecutor(
-    agent=agent,
-    tools=tools,
-    verbose=True,
-    handle_parsing_errors=True,
-    max_iterations=12,
-    early_stopping_method="force"
-)
 
 agent_with_chat_history = RunnableWithMessageHistory(
-    agent_executor,
+    RunnableLambda(window_chat_history) | RunnableLambda(run_agent_executor),
     get_session_history,
     input_messages_key="input",
     history_messages_key="chat_history",
 )
 
-print("✅ Agent with memory initialized")
+
+
+# ==============================================
+# STREAMING CHAT
+# ==============================================
+# Explanation: home() only answers once the whole ReAct loop has finished.
+# /chat/stream runs the same agent on a background thread and forwards what
+# happens as server-sent events: tool_start / tool_end for every tool call,
+# token for each piece of the final answer as Gemini produces it, and final
+# (or error) once the turn is over.
+# Turns run on a pool of CHAT_STREAM_WORKERS threads; at most
+# CHAT_STREAM_MAX_PENDING may be running or waiting for one, beyond that the
+# request gets a 503. When the client goes away the turn is stopped: a queued
+# one never starts, and a running one stops at its next LLM call, token or
+# tool call (a tool already running, e.g. a Selenium fill, is left to finish).
+CHAT_STREAM_KEEPALIVE_SECONDS = 15
+CHAT_STREAM_WORKERS = int(os.getenv("CHAT_STREAM_WORKERS", "8"))
+CHAT_STREAM_MAX_PENDING = int(os.getenv("CHAT_STREAM_MAX_PENDING", "32"))
+FINAL_ANSWER_MARKER = "Final Answer:"
+
+chat_stream_executor = ThreadPoolExecutor(max_workers=CHAT_STREAM_WORKERS, thread_name_prefix="chat-stream")
+chat_stream_slots = threading.BoundedSemaphore(CHAT_STREAM_MAX_PENDING)
+
+
+class ChatStreamStopped(Exception):
+    """Raised inside a streamed agent turn once its client has disconnected."""
+
+
+class ChatStreamCallbackHandler(BaseCallbackHandler):
+    """Turns agent callbacks into (event, data) tuples on a queue, and stops the turn once `stopped` is set."""
+
+    # Let ChatStreamStopped propagate out of the agent instead of being logged and ignored
+    raise_error = True
+
+    def __init__(self, events: queue.Queue, stopped: threading.Event = None):
+        self.events = events
+        self.stopped = stopped or threading.Event()
+        self._llm_text = {}  # run_id -> text generated so far
+        self._answer_sent = {}  # run_id -> characters of the final answer already sent
+        self._tool_names = {}  # run_id -> tool name
+
+    # Having these two methods marks the handler as a streaming handler, which
+    # makes chat models use their streaming API (and emit on_llm_new_token)
+    # even though the agent calls them with invoke().
+    def tap_output_iter(self, run_id, output):
+        return output
+
+    def tap_output_aiter(self, run_id, output):
+        return output
+
+    def _check_stopped(self):
+        if self.stopped.is_set():
+            raise ChatStreamStopped("Client disconnected")
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._check_stopped()
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self._check_stopped()
+
+    def on_llm_new_token(self, token: str, *, run_id, **kwargs):
+        self._check_stopped()
+        text = self._llm_text.get(run_id, "") + token
+        self._llm_text[run_id] = text
+        marker = text.find(FINAL_ANSWER_MARKER)
+        if marker == -1:
+            return
+        answer = text[marker + len(FINAL_ANSWER_MARKER):].lstrip()
+        sent = self._answer_sent.get(run_id, 0)
+        if len(answer) > sent:
+            self.events.put(("token", {"text": answer[sent:]}))
+            self._answer_sent[run_id] = len(answer)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._llm_text.pop(run_id, None)
+        self._answer_sent.pop(run_id, None)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._check_stopped()
+        name = (serialized or {}).get("name", "tool")
+        self._tool_names[run_id] = name
+        self.events.put(("tool_start", {"tool": name, "input": input_str}))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        name = self._tool_names.pop(run_id, "tool")
+        self.events.put(("tool_end", {"tool": name, "output": str(getattr(output, "content", output))[:500]}))
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        name = self._tool_names.pop(run_id, "tool")
+        self.events.put(("tool_end", {"tool": name, "output": f"❌ {error}"}))
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# ==============================================
+# USAGE ACCOUNTING
+# ==============================================
+# Explanation: verbose=True prints every step but records nothing, so we
+# couldn't tell which prompts and tools dominate Gemini spend and latency.
+# Every agent turn now carries a UsageCallbackHandler that counts prompt and
+# completion tokens, LLM calls, ReAct iterations (against max_iterations),
+# parse-error retries from handle_parsing_errors, and per-tool calls, errors,
+# time and tokens (LLM calls made inside a tool are charged to that tool).
+# Finished turns are aggregated per session and globally; see /stats/usage,
+# /stats/usage/session and /stats/usage/export. With USAGE_LOG_PATH set, each
+# turn is also appended there as a JSON line.
+# Recorded turns never carry the session id itself (it is the user's login to
+# their stored Google and LinkedIn credentials), only a salted hash of it, and
+# the per-turn export is disabled unless USAGE_EXPORT_TOKEN is set and sent as
+# a bearer token.
+USAGE_RECENT_TURNS = int(os.getenv("USAGE_RECENT_TURNS", "200"))
+USAGE_LOG_PATH = os.getenv("USAGE_LOG_PATH")
+USAGE_EXPORT_TOKEN = os.getenv("USAGE_EXPORT_TOKEN")
+# Set it to keep hashes stable across restarts (e.g. to join USAGE_LOG_PATH files)
+USAGE_SESSION_SALT = os.getenv("USAGE_SESSION_SALT") or secrets.token_hex(16)
+# The tool AgentExecutor runs to feed an unparseable LLM output back to the model
+PARSE_ERROR_TOOL = "_Exception"
+AGENT_RUN_NAME = "agent"
+
+
+def llm_token_usage(response) -> tuple:
+    """(prompt_tokens, completion_tokens) from an LLMResult, wherever the provider put them."""
+    prompt = completion = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            prompt += usage.get("input_tokens", 0)
+            completion += usage.get("output_tokens", 0)
+    if not (prompt or completion):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt = usage.get("prompt_tokens", 0)
+        completion = usage.get("completion_tokens", 0)
+    return prompt, completion
+
+
+def usage_session_key(session_id: str) -> str:
+    """The salted hash that stands in for a session id in usage records."""
+    return hashlib.sha256(f"{USAGE_SESSION_SALT}:{session_id}".encode()).hexdigest()[:16]
+
+
+def empty_usage() -> dict:
+    return {"calls": 0, "errors": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0}
+
+
+def add_usage(total: dict, usage: dict):
+    for key, value in usage.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            total[key] = total.get(key, 0) + value
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """Counts tokens, iterations, parse errors and tool usage for one agent turn."""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._parents = {}  # run_id -> parent_run_id, for every run we've seen
+        self._tools = {}  # tool run_id -> (name, start time)
+        self._llm_started = {}  # llm run_id -> start time
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+        self.iterations = 0
+        self.parse_errors = 0
+        self.tools = {}
+
+    def _owner(self, run_id) -> str:
+        """The nearest enclosing tool run, or the agent itself."""
+        run_id = self._parents.get(run_id)
+        while run_id is not None:
+            if run_id in self._tools:
+                return self._tools[run_id][0]
+            run_id = self._parents.get(run_id)
+        return AGENT_RUN_NAME
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        with self._lock:
+            self._parents[run_id] = parent_run_id
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        with self._lock:
+            self._parents[run_id] = parent_run_id
+            self._llm_started[run_id] = time.perf_counter()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self.on_llm_start(serialized, [], run_id=run_id, parent_run_id=parent_run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        prompt, completion = llm_token_usage(response)
+        with self._lock:
+            elapsed = time.perf_counter() - self._llm_started.pop(run_id, time.perf_counter())
+            self.llm_calls += 1
+            self.llm_seconds += elapsed
+            self.prompt_tokens += prompt
+            self.completion_tokens += completion
+            owner = self._owner(run_id)
+            if owner == AGENT_RUN_NAME:
+                # Every ReAct iteration is exactly one agent LLM call
+                self.iterations += 1
+            else:
+                stats = self.tools.setdefault(owner, empty_usage())
+                stats["prompt_tokens"] += prompt
+                stats["completion_tokens"] += completion
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._llm_started.pop(run_id, None)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        name = (serialized or {}).get("name", "tool")
+        with self._lock:
+            self._parents[run_id] = parent_run_id
+            if name == PARSE_ERROR_TOOL:
+                self.parse_errors += 1
+                return
+            self._tools[run_id] = (name, time.perf_counter())
+
+    def _finish_tool(self, run_id, failed: bool):
+        with self._lock:
+            if run_id not in self._tools:
+                return
+            name, start = self._tools[run_id]
+            elapsed = time.perf_counter() - start
+            stats = self.tools.setdefault(name, empty_usage())
+            stats["calls"] += 1
+            stats["errors"] += int(failed)
+            stats["seconds"] += elapsed
+        tool_latency.observe(elapsed, tool=name)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        text = str(getattr(output, "content", output))
+        self._finish_tool(run_id, failed=text.startswith("❌"))
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._finish_tool(run_id, failed=True)
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "session": usage_session_key(self.session_id),
+                "started_at": datetime.fromtimestamp(self.started_at, timezone.utc).isoformat(),
+                "seconds": round(time.perf_counter() - self._start, 3),
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "llm_calls": self.llm_calls,
+                "llm_seconds": round(self.llm_seconds, 3),
+                "iterations": self.iterations,
+                "max_iterations": AGENT_MAX_ITERATIONS,
+                "hit_iteration_limit": self.iterations >= AGENT_MAX_ITERATIONS,
+                "parse_errors": self.parse_errors,
+                "tools": {name: {**stats, "seconds": round(stats["seconds"], 3)} for name, stats in self.tools.items()},
+            }
+
+
+class UsageLedger:
+    """Aggregates finished turns per session and globally, and keeps the most recent ones."""
+
+    def __init__(self, recent_turns: int, log_path: str = None):
+        self.log_path = log_path
+        self._recent = deque(maxlen=recent_turns)
+        self._sessions = TTLCache(CONVERSATION_IDLE_TTL, CONVERSATION_MAX_SESSIONS)
+        self._totals = self._empty()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _empty() -> dict:
+        return {"turns": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0, "llm_calls": 0,
+                "llm_seconds": 0.0, "iterations": 0, "iteration_limit_hits": 0, "parse_errors": 0, "tools": {}}
+
+    def _add(self, aggregate: dict, turn: dict):
+        aggregate["turns"] += 1
+        aggregate["iteration_limit_hits"] += int(turn["hit_iteration_limit"])
+        for key in ("seconds", "prompt_tokens", "completion_tokens", "llm_calls", "llm_seconds", "iterations", "parse_errors"):
+            aggregate[key] += turn[key]
+        for name, stats in turn["tools"].items():
+            add_usage(aggregate["tools"].setdefault(name, empty_usage()), stats)
+
+    def record(self, turn: dict):
+        with self._lock:
+            self._recent.append(turn)
+            self._add(self._totals, turn)
+            hit, aggregate = self._sessions.get(turn["session"])
+            if not hit:
+                aggregate = self._empty()
+            self._add(aggregate, turn)
+            self._sessions.set(turn["session"], aggregate)
+            if self.log_path:
+                try:
+                    with open(self.log_path, "a") as f:
+                        f.write(json.dumps(turn) + "\n")
+                except OSError as e:
+                    print(f"⚠️ Could not write usage log: {e}")
+
+    def totals(self) -> dict:
+        with self._lock:
+            return json.loads(json.dumps(self._totals))
+
+    def session(self, session_id: str) -> dict:
+        with self._lock:
+            aggregate = self._sessions.get(usage_session_key(session_id))[1]
+            return json.loads(json.dumps(aggregate or self._empty()))
+
+    def recent(self) -> list:
+        with self._lock:
+            return list(self._recent)
+
+
+usage_ledger = UsageLedger(USAGE_RECENT_TURNS, USAGE_LOG_PATH)
+
+
+# ==============================================
+# FAST-PATH ROUTER
+# ==============================================
+# Explanation: The prompt already tells the agent that "hi" or "thanks" need
+# no tools, but every message still paid for the full ReAct prompt and at
+# least one Gemini round trip, and asking for the date took an LLM loop just
+# to reach get_today_date. Messages that are *only* small talk or a date
+# question are now answered locally, before the agent runs; anything else
+# (including "hi, email Bob ...") falls through to the agent. Both paths
+# write to the same conversation history. Hit rate and an estimate of the
+# latency saved (mean agent turn time minus fast-path time) are at
+# /stats/router.
+# "ok" or "thanks" right after the agent asked something ("Shall I send it?",
+# the form's "Analysis complete..." questions) is an answer, not small talk,
+# so those intents only take the fast path when the last AI message isn't
+# waiting for a reply.
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() == "true"
+
+CAPABILITIES_HINT = (
+    "I can search the web, check the weather, send emails, manage your calendar, "
+    "post on LinkedIn and help you fill job applications."
+)
+
+# (intent, pattern matched against the whole lower-cased message, canned reply)
+SMALL_TALK_RULES = [
+    ("greeting", r"(hi|hii+|hello|hey|hey there|hi there|hello there|good (morning|afternoon|evening)|yo|namaste)",
+     f"Hello! How can I help you today? {CAPABILITIES_HINT}"),
+    ("how_are_you", r"(how are you|how are you doing|how's it going|how r u)( today)?",
+     "I'm doing well, thanks for asking! What can I do for you?"),
+    ("thanks", r"(thanks|thank you|thanks a lot|thank you so much|thx|ty|much appreciated)( again)?",
+     "You're welcome! Let me know if there's anything else I can help with."),
+    ("goodbye", r"(bye|goodbye|bye bye|see you|see ya|good night)",
+     "Goodbye! Have a great day."),
+    ("acknowledgement", r"(ok|okay|cool|great|nice|awesome|got it|perfect)",
+     "👍 Let me know if you need anything else."),
+]
+DATE_PATTERN = (
+    r"(tell me |what('?s| is)? )?(the )?(today'?s date|current date|date is it|date|day is it|day is today)( today)?"
+)
+FAST_PATH_TRAILING = r"[\s!.?,:)]*"
+# Intents that can also be a reply to the agent's last message
+REPLY_INTENTS = {"thanks", "acknowledgement"}
+AWAITING_REPLY_PATTERN = re.compile(
+    r"\?|\banalysis complete\b|\b(confirm|please (provide|reply|let me know))\b", re.IGNORECASE
+)
+
+
+def awaiting_reply(session_id: str) -> bool:
+    """Whether the session's last AI message asks the user something."""
+    history = conversation_store.peek(session_id)
+    for message in reversed(history.messages if history else []):
+        if isinstance(message, AIMessage):
+            return bool(AWAITING_REPLY_PATTERN.search(str(message.content)))
+    return False
+
+
+class FastPathRouter:
+    """Answers messages that don't need the agent; keeps hit / latency-saved counters."""
+
+    def __init__(self):
+        self.rules = [
+            (intent, re.compile(rf"{pattern}{FAST_PATH_TRAILING}"), reply) for intent, pattern, reply in SMALL_TALK_RULES
+        ]
+        self.date_regex = re.compile(rf"{DATE_PATTERN}{FAST_PATH_TRAILING}")
+        self._lock = threading.Lock()
+        self.messages = 0
+        self.hits = {}
+        self.fast_path_seconds = 0.0
+        self.agent_turns = 0
+        self.agent_seconds = 0.0
+        self.latency_saved_seconds = 0.0
+
+    def classify(self, text: str):
+        """Returns (intent, answer) for messages we can answer locally, else None."""
+        message = " ".join(text.lower().split())
+        if self.date_regex.fullmatch(message):
+            today = datetime.strptime(get_today_date.invoke({}), "%Y-%m-%d")
+            return "date", f"Today is {today.strftime('%A')}, {today.strftime('%Y-%m-%d')}."
+        for intent, regex, reply in self.rules:
+            if regex.fullmatch(message):
+                return intent, reply
+        return None
+
+    def try_answer(self, session_id: str, user_input: str):
+        """Answers and records the turn in the session's history, or returns None for the agent."""
+        start = time.perf_counter()
+        with self._lock:
+            self.messages += 1
+        if not FAST_PATH_ENABLED:
+            return None
+        routed = self.classify(user_input)
+        if routed is None:
+            return None
+        intent, answer = routed
+        if intent in REPLY_INTENTS and awaiting_reply(session_id):
+            return None
+        get_session_history(session_id).add_messages([HumanMessage(content=user_input), AIMessage(content=answer)])
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.hits[intent] = self.hits.get(intent, 0) + 1
+            self.fast_path_seconds += elapsed
+            if self.agent_turns:
+                self.latency_saved_seconds += max(self.agent_seconds / self.agent_turns - elapsed, 0.0)
+        print(f"⚡ Fast path ({intent}) answered in {elapsed * 1000:.1f} ms")
+        return answer
+
+    def record_agent_turn(self, seconds: float):
+        with self._lock:
+            self.agent_turns += 1
+            self.agent_seconds += seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = sum(self.hits.values())
+            return {
+                "enabled": FAST_PATH_ENABLED,
+                "messages": self.messages,
+                "hits": hits,
+                "hit_rate": round(hits / self.messages, 4) if self.messages else 0.0,
+                "hits_by_intent": dict(self.hits),
+                "fast_path_seconds": round(self.fast_path_seconds, 6),
+                "agent_turns": self.agent_turns,
+                "agent_mean_seconds": round(self.agent_seconds / self.agent_turns, 3) if self.agent_turns else None,
+                "latency_saved_seconds": round(self.latency_saved_seconds, 3),
+            }
+
+
+fast_path_router = FastPathRouter()
+
+
+def invoke_agent_timed(inputs: dict, config) -> dict:
+    """
+    Runs the agent with usage accounting attached, and feeds its turn time into
+    the router's latency-saved estimate.
+    """
+    usage = UsageCallbackHandler(config["configurable"]["session_id"])
+    config = {**config, "callbacks": [*config.get("callbacks", []), usage]}
+    start = time.perf_counter()
+    try:
+        return agent_with_chat_history.invoke(inputs, config=config)
+    finally:
+        fast_path_router.record_agent_turn(time.perf_counter() - start)
+        usage_ledger.record(usage.summary())
 
 
 # ==============================================
@@ -965,33 +4243,73 @@ def safe_invoke(agent_with_chat_history, inputs, config):
     except Exception as e:
         if "iteration limit" in str(e).lower():
             print("⚠️ Iteration limit hit, falling back to plain LLM.")
-            return {"output": llm.invoke(inputs["input"]).content}
+            return {"output": cached_llm_invoke(deterministic_llm, inputs["input"], persist=False)}
         print(f"An unexpected error occurred: {e}")
         raise
 
 
 # ==============================================
-# HELPERS
+# ROUTES
 # ==============================================
-def format_chat_history(history: ChatMessageHistory) -> str:
-    if not history.messages:
-        return "No previous conversation."
+@web.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
 
-    formatted_history = []
-    for message in history.messages[-10:]:
-        if hasattr(message, 'type'):
-            if message.type == 'human':
-                formatted_history.append(f"Human: {message.content}")
-            elif message.type == 'ai':
-                formatted_history.append(f"Assistant: {message.content}")
 
-    return "\n".join(formatted_history) if formatted_history else "No previous conversation."
+@web.after_app_request
+def observe_request_latency(response):
+    # Streamed responses are timed up to the point their body starts
+    started = g.pop("request_started", None)
+    if started is not None:
+        request_latency.observe(time.perf_counter() - started, endpoint=request.endpoint or "unmatched", method=request.method)
+    return response
 
 
-# ==============================================
-# ROUTES
-# ==============================================
-@app.route("/", methods=["GET", "POST"])
+metrics.gauge_callback(
+    "conversation_store_sessions", "Conversations held in memory.",
+    lambda: conversation_store.gauges()["resident_sessions"],
+)
+metrics.gauge_callback(
+    "conversation_store_bytes", "Approximate size of the conversations held in memory.",
+    lambda: conversation_store.gauges()["resident_bytes"],
+)
+metrics.counter_callback(
+    "conversation_store_evictions_total", "Conversations evicted from memory.",
+    lambda: conversation_store.gauges()["evictions_total"],
+)
+metrics.gauge_callback(
+    "selenium_chrome_processes", "Live pooled Chrome drivers (including ones being launched).",
+    lambda: selenium_pool.stats()["live"],
+)
+metrics.gauge_callback(
+    "selenium_idle_drivers", "Pooled Chrome drivers waiting for work.",
+    lambda: selenium_pool.stats()["idle"],
+)
+metrics.counter_callback(
+    "agent_tokens_total", "Gemini tokens used by agent turns.",
+    lambda: [({"type": kind}, usage_ledger.totals()[f"{kind}_tokens"]) for kind in ("prompt", "completion")],
+)
+metrics.counter_callback(
+    "calendar_syncs_total", "Calendar index syncs by kind: full, delta, reused, expired_token.",
+    lambda: [({"kind": kind}, count) for kind, count in calendar_index.stats()["syncs"].items()],
+)
+metrics.counter_callback(
+    "token_refreshes_total", "OAuth token refresh attempts by outcome.",
+    lambda: [({"outcome": outcome}, count) for outcome, count in token_refresher.stats()["refreshes"].items()],
+)
+metrics.counter_callback(
+    "fast_path_hits_total", "Messages answered by the fast-path router instead of the agent.",
+    lambda: [({"intent": intent}, hits) for intent, hits in fast_path_router.stats()["hits_by_intent"].items()],
+)
+
+
+@web.route("/metrics")
+def prometheus_metrics():
+    """Prometheus text exposition of everything registered in `metrics`."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@web.route("/", methods=["GET", "POST"])
 def home():
     if "session_id" not in session:
         session["session_id"] = os.urandom(24).hex()
@@ -1001,44 +4319,217 @@ def home():
 
     if request.method == "POST":
         user_input = request.form["user_input"]
-        config = {"configurable": {"session_id": session_id}}
-        try:
-            result = agent_with_chat_history.invoke({"input": user_input}, config=config)
-            response = result["output"]
-        except Exception as e:
-            response = f"❌ Error: {str(e)}"
+        response = fast_path_router.try_answer(session_id, user_input)
+        if response is None:
+            config = {"configurable": {"session_id": session_id, "tool_context": ToolContext(session_id)}}
+            try:
+                result = invoke_agent_timed({"input": user_input}, config=config)
+                response = result["output"]
+            except Exception as e:
+                response = f"❌ Error: {str(e)}"
 
     conversation_history = get_session_history(session_id).messages[-10:]
      
-    # Check if an image is ready in the session and tell the template
-    image_ready_in_session = 'uploaded_linkedin_asset_urn' in session
-
-    image_is_ready = 'uploaded_linkedin_asset_urn' in session
+    # Check if an uploaded image is waiting to be posted and tell the template
+    pending_image = pending_linkedin_assets.get(session_id)[1]
+    image_is_ready = pending_image is not None and pending_image.status != "failed"
 
     return render_template(
     "index.html",
     response=response,
     conversation_history=conversation_history,
     session_id=session_id,
-    image_is_ready=image_is_ready  # Add this line
+    image_is_ready=image_is_ready,  # Add this line
+    status_stream_enabled=STATUS_STREAM_ENABLED
 )
 
-@app.route('/clear_linkedin_image', methods=['POST'])
+@web.route("/jobs/<job_id>")
+def form_fill_job_status(job_id):
+    """Status, step-by-step progress and screenshot links for a background form fill."""
+    job = form_fill_jobs.get(job_id, session.get("session_id"))
+    if job is None:
+        return {"error": "Job not found"}, 404
+    return job.to_dict()
+
+@web.route("/jobs/<job_id>/result")
+def form_fill_job_result(job_id):
+    job = form_fill_jobs.get(job_id, session.get("session_id"))
+    if job is None:
+        return {"error": "Job not found"}, 404
+    if job.status in ("queued", "running"):
+        return {"id": job.id, "status": job.status}, 202
+    return {"id": job.id, "status": job.status, "result": job.result, "error": job.error}
+
+@web.route("/jobs/<job_id>/screenshots/<name>")
+def form_fill_job_screenshot(job_id, name):
+    job = form_fill_jobs.get(job_id, session.get("session_id"))
+    if job is None or name not in job.screenshots():
+        return {"error": "Screenshot not found"}, 404
+    return send_from_directory(os.path.abspath(job.screenshot_dir), name, mimetype="image/png")
+
+@web.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """
+    Streaming version of posting a message to home(). Responds with
+    text/event-stream; see STREAMING CHAT above for the event types.
+    """
+    if "session_id" not in session:
+        session["session_id"] = os.urandom(24).hex()
+        session.permanent = True
+    session_id = session["session_id"]
+
+    user_input = (request.form.get("user_input") or "").strip()
+    if not user_input:
+        return {"error": "No message provided"}, 400
+
+    answer = fast_path_router.try_answer(session_id, user_input)
+    if answer is not None:
+        return Response(
+            sse_event("token", {"text": answer}) + sse_event("final", {"output": answer}),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache"},
+        )
+
+    if not chat_stream_slots.acquire(blocking=False):
+        return {"error": "Too many conversations in progress, please try again shortly."}, 503
+
+    events = queue.Queue()
+    stopped = threading.Event()
+    config = {
+        "configurable": {"session_id": session_id, "tool_context": ToolContext(session_id)},
+        "callbacks": [ChatStreamCallbackHandler(events, stopped)],
+    }
+
+    def run_agent():
+        try:
+            if stopped.is_set():
+                return
+            result = invoke_agent_timed({"input": user_input}, config=config)
+            events.put(("final", {"output": result["output"]}))
+        except ChatStreamStopped:
+            print(f"🛑 Stopped streamed turn for session {session_id}: client disconnected")
+        except Exception as e:
+            events.put(("error", {"message": f"❌ Error: {str(e)}"}))
+        finally:
+            chat_stream_slots.release()
+            events.put(None)
+
+    try:
+        turn = chat_stream_executor.submit(run_agent)
+    except RuntimeError:
+        chat_stream_slots.release()
+        raise
+
+    def generate():
+        finished = False
+        try:
+            while True:
+                try:
+                    item = events.get(timeout=CHAT_STREAM_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if item is None:
+                    finished = True
+                    break
+                yield sse_event(*item)
+        finally:
+            # The client went away (GeneratorExit at a yield) before the turn ended
+            if not finished:
+                stopped.set()
+                if turn.cancel():
+                    chat_stream_slots.release()
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@web.route('/clear_linkedin_image', methods=['POST'])
 def clear_linkedin_image():
-    session.pop('uploaded_linkedin_asset_urn', None)
-    return redirect(url_for('home'))
+    if "session_id" in session:
+        pending_linkedin_assets.invalidate(session["session_id"])
+    return redirect(url_for('web.home'))
 
-@app.route("/clear", methods=["POST"])
+@web.route("/clear", methods=["POST"])
 def clear_conversation():
     if "session_id" in session:
         session_id = session["session_id"]
-        if session_id in user_conversations:
-            user_conversations[session_id].clear()
+        history = conversation_store.peek(session_id)
+        if history is not None:
+            history.clear()
             print(f"🗑️ Cleared history for session: {session_id}")
-    return redirect(url_for('home'))
+    return redirect(url_for('web.home'))
+
+
+@web.route("/stats/tool-cache")
+def tool_cache_stats():
+    """Hit / miss / coalesced counters for the weather and search result caches."""
+    return {"get_weather_data": weather_cache.stats(), "search_the_web": search_cache.stats()}
+
+
+@web.route("/stats/conversations")
+def conversation_stats():
+    """Gauges for the in-memory conversation store."""
+    return conversation_store.gauges()
+
+
+@web.route("/stats/router")
+def router_stats():
+    """Fast-path hit rate and the agent time it saved."""
+    return fast_path_router.stats()
+
+
+@web.route("/stats/llm-cache")
+def llm_cache_stats():
+    """Hit / miss / bypass counters and size of the LLM response cache."""
+    return llm_response_cache.stats()
+
+
+@web.route("/stats/usage")
+def usage_stats():
+    """Token, iteration and per-tool totals across all agent turns."""
+    return usage_ledger.totals()
 
 
-@app.route("/authorize")
+@web.route("/stats/usage/session")
+def session_usage_stats():
+    """The same totals for the current session only."""
+    return usage_ledger.session(session.get("session_id"))
+
+
+@web.route("/stats/usage/export")
+def usage_export():
+    """The most recent agent turns, one JSON object per line. Needs USAGE_EXPORT_TOKEN as a bearer token."""
+    if not USAGE_EXPORT_TOKEN:
+        return {"error": "Usage export is disabled"}, 404
+    supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+    if not hmac.compare_digest(supplied.encode(), USAGE_EXPORT_TOKEN.encode()):
+        return {"error": "Unauthorized"}, 401
+    body = "".join(json.dumps(turn) + "\n" for turn in usage_ledger.recent())
+    return Response(body, mimetype="application/x-ndjson")
+
+
+@web.route("/stats/calendar-index")
+def calendar_index_stats():
+    """Sessions with a calendar index and how their syncs went (full, delta, reused, expired token)."""
+    return jsonify(calendar_index.stats())
+
+
+@web.route("/stats/token-refresh")
+def token_refresh_stats():
+    """Tokens scheduled for renewal and how refreshes went (background, inline, coalesced, ...)."""
+    return jsonify(token_refresher.stats())
+
+
+@web.route("/stats/upstreams")
+def upstream_stats():
+    """Latency histograms and error counts per outbound HTTP upstream."""
+    return http_client.stats()
+
+
+@web.route("/authorize")
 def authorize():
     client_secrets_str = os.getenv("OAUTH_CLIENT_SECRETS_JSON")
     if not client_secrets_str:
@@ -1048,7 +4539,7 @@ def authorize():
     flow = Flow.from_client_config(
         client_config,
         scopes=SCOPES,
-        redirect_uri=url_for("oauth2callback", _external=True),
+        redirect_uri=url_for("web.oauth2callback", _external=True),
     )
 
     authorization_url, state = flow.authorization_url(
@@ -1060,7 +4551,7 @@ def authorize():
     session["state"] = state
     return redirect(authorization_url)
 
-@app.route("/oauth2callback")
+@web.route("/oauth2callback")
 def oauth2callback():
     state = session["state"]
     client_secrets_str = os.getenv("OAUTH_CLIENT_SECRETS_JSON")
@@ -1072,7 +4563,7 @@ def oauth2callback():
         client_config,
         scopes=SCOPES,
         state=state,
-        redirect_uri=url_for("oauth2callback", _external=True),
+        redirect_uri=url_for("web.oauth2callback", _external=True),
     )
 
     flow.fetch_token(authorization_response=request.url)
@@ -1104,7 +4595,9 @@ def oauth2callback():
 
     # Use upsert: it will INSERT a new row or UPDATE if one already exists
     # for this session_id and provider. This handles re-authentication gracefully.
-    response = supabase.table("user_credentials").upsert(credentials_data, on_conflict="session_id,provider").execute()
+    response = timed_query("upsert", supabase.table("user_credentials").upsert(credentials_data, on_conflict="session_id,provider"))
+    credentials_changed(session_id, "google")
+    token_refresher.track(session_id, "google", credentials_data)
     
     # Check for errors from Supabase
     if response.data is None and response.error is not None:
@@ -1117,12 +4610,12 @@ def oauth2callback():
 
 
     print("✅ Google authorization successful, credentials saved to Supabase")
-    return redirect(url_for("home"))
+    return redirect(url_for("web.home"))
 
-@app.route("/status")
+@web.route("/status")
 def google_status():
     # This function now checks Supabase instead of the session
-    creds = get_google_credentials()
+    creds = get_google_credentials(session.get("session_id"))
     if creds:
         return {
             "status": "authorized",
@@ -1136,17 +4629,104 @@ def google_status():
             "services": []
         }
 
-@app.route("/gmail-status")
+@web.route("/gmail-status")
 def gmail_status():
     return google_status()
 
-@app.route('/auth/linkedin/start')
+
+def build_services_status(session_id: str) -> dict:
+    """
+    Resolves Google and LinkedIn status with at most one Supabase query.
+    Unlike the tool helpers, this never builds Credentials objects or refreshes tokens.
+    """
+    google = {"status": "not_authorized", "services": []}
+    linkedin = {"status": "not_authorized"}
+    if not session_id:
+        return {"google": google, "linkedin": linkedin}
+
+    rows = fetch_credential_rows(session_id, ["google", "linkedin"])
+
+    if rows.get("google"):
+        google = {"status": "authorized", "services": ["Gmail", "Calendar"]}
+
+    li_row = rows.get("linkedin")
+    if li_row and (li_row.get("other_details") or {}).get("urn"):
+        expires_at_str = li_row.get("expires_at")
+        if not expires_at_str or datetime.fromisoformat(expires_at_str) > datetime.now(timezone.utc):
+            linkedin = {"status": "authorized", "name": "Connected"}
+
+    return {"google": google, "linkedin": linkedin}
+
+
+def services_status_etag(payload: dict) -> str:
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+@web.route("/services-status")
+def services_status():
+    """
+    Combined Google + LinkedIn status for the UI badges.
+    Supports conditional requests: unchanged polls get a bodiless 304.
+    """
+    session_id = session.get("session_id")
+    try:
+        payload = build_services_status(session_id)
+    except Exception as e:
+        print(f"❌ Error fetching service status from Supabase: {e}")
+        return {"error": "Could not check service status"}, 503
+
+    response = jsonify(payload)
+    response.set_etag(services_status_etag(payload))
+    response.last_modified = status_notifier.last_changed(session_id) if session_id else status_notifier.started_at
+    # Let the browser keep the body but always revalidate with us
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@web.route("/services-status/stream")
+def services_status_stream():
+    """
+    Opt-in server-sent events stream that pushes a new status whenever an
+    OAuth callback (or credential removal) changes this session's connections.
+    Each stream lives for STATUS_STREAM_MAX_SECONDS and the browser reconnects.
+    """
+    if not STATUS_STREAM_ENABLED:
+        return {"error": "Status streaming is disabled"}, 404
+
+    session_id = session.get("session_id")
+    if not session_id:
+        return {"error": "No session found"}, 400
+
+    def generate():
+        since = status_notifier.last_changed(session_id)
+        last_etag = None
+        deadline = time.monotonic() + STATUS_STREAM_MAX_SECONDS
+        yield "retry: 5000\n\n"
+        while time.monotonic() < deadline:
+            payload = build_services_status(session_id)
+            etag = services_status_etag(payload)
+            if etag != last_etag:
+                last_etag = etag
+                yield f"event: status\ndata: {json.dumps(payload)}\n\n"
+            if status_notifier.wait_for_change(session_id, since, STATUS_STREAM_KEEPALIVE_SECONDS):
+                since = status_notifier.last_changed(session_id)
+            else:
+                yield ": keep-alive\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@web.route('/auth/linkedin/start')
 def linkedin_start_auth():
     """Redirects the user to LinkedIn for authentication."""
-    redirect_uri = url_for('linkedin_callback', _external=True)
+    redirect_uri = url_for("web.linkedin_callback", _external=True)
     return linkedin.authorize_redirect(redirect_uri)
 
-@app.route('/auth/linkedin/callback')
+@web.route('/auth/linkedin/callback')
 def linkedin_callback():
     try:
         # Step 1 & 2: Manually exchange code for token (this part is unchanged)
@@ -1154,15 +4734,15 @@ def linkedin_callback():
         if not code:
             return "Authentication failed: No code returned from LinkedIn.", 400
 
-        token_url = 'https://www.linkedin.com/oauth/v2/accessToken'
+        token_url = LINKEDIN_TOKEN_URL
         params = {
             'grant_type': 'authorization_code',
             'code': code,
-            'redirect_uri': url_for('linkedin_callback', _external=True),
+            'redirect_uri': url_for("web.linkedin_callback", _external=True),
             'client_id': os.getenv('LI_CLIENT_ID'),
             'client_secret': os.getenv('LI_CLIENT_SECRET')
         }
-        response = requests.post(token_url, data=params)
+        response = http_client.post(token_url, upstream="linkedin-oauth", data=params)
         response.raise_for_status()
         token = response.json() # Contains access_token and expires_in (in seconds)
 
@@ -1199,7 +4779,9 @@ def linkedin_callback():
         }
 
         # Upsert the data into our central credentials table
-        response = supabase.table("user_credentials").upsert(credentials_data, on_conflict="session_id,provider").execute()
+        response = timed_query("upsert", supabase.table("user_credentials").upsert(credentials_data, on_conflict="session_id,provider"))
+        credentials_changed(session_id, "linkedin")
+        token_refresher.track(session_id, "linkedin", credentials_data)
 
         if response.data is None and response.error is not None:
             print(f"❌ Supabase error: {response.error.message}")
@@ -1211,28 +4793,34 @@ def linkedin_callback():
         # --- END: NEW SUPABASE LOGIC ---
 
         print("✅ LinkedIn authorization successful, credentials saved to Supabase.")
-        return redirect(url_for("home"))
+        return redirect(url_for("web.home"))
 
     except Exception as e:
         error_details = e.response.json() if hasattr(e, 'response') else str(e)
         print(f"❌ LinkedIn OAuth callback error: {error_details}")
         return f"Authentication failed: {error_details}", 500
     
-@app.route("/linkedin-status")
+@web.route("/linkedin-status")
 def linkedin_status():
     """Checks if the CURRENT user has a LinkedIn account connected in Supabase."""
     # This function now checks Supabase instead of the session
-    token, user = get_linkedin_credentials()
+    token, user = get_linkedin_credentials(session.get("session_id"))
     if token and user:
         # We can't get the name easily anymore, so let's simplify the response
         return {"status": "authorized", "name": "Connected"}
     else:
         return {"status": "not_authorized"}
 
-@app.route('/upload/linkedin/image', methods=['POST'])
+@web.route('/upload/linkedin/image', methods=['POST'])
 def upload_linkedin_image():
-    if 'image' not in request.files:
-        return {"error": "No image file provided"}, 400
+    # Reject oversized bodies before werkzeug parses them (slack for the multipart framing)
+    request.max_content_length = LINKEDIN_IMAGE_MAX_BYTES + UPLOAD_CHUNK_SIZE
+    too_large = {"error": f"Image is too large. The maximum size is {round(LINKEDIN_IMAGE_MAX_BYTES / (1024 * 1024), 1):g} MB."}, 413
+    try:
+        if 'image' not in request.files:
+            return {"error": "No image file provided"}, 400
+    except RequestEntityTooLarge:
+        return too_large
 
     file = request.files['image']
     if file.filename == '':
@@ -1241,7 +4829,8 @@ def upload_linkedin_image():
     try:
         # --- THIS IS THE FIX ---
         # 1. Get credentials from the current user's session
-        token, user = get_linkedin_credentials()
+        session_id = session.get("session_id")
+        token, user = get_linkedin_credentials(session_id)
         if not token or not user:
             return {"error": "LinkedIn account not connected. Please connect first."}, 401
         
@@ -1249,23 +4838,105 @@ def upload_linkedin_image():
         author_urn = user['urn']
         # --- END OF FIX ---
 
-        # 2. Register the upload with LinkedIn
-        upload_info = register_linkedin_image_upload(access_token, author_urn)
+        # 2. Check the type and size while copying the upload to a temp file
+        try:
+            image_file, mimetype = spool_image_upload(file.stream)
+        except ValueError as e:
+            return {"error": str(e)}, 415
+        except RequestEntityTooLarge:
+            return too_large
+
+        # 3. Register the upload with LinkedIn
+        try:
+            upload_info = register_linkedin_image_upload(access_token, author_urn)
+        except Exception:
+            image_file.close()
+            raise
         
-        # 3. Upload the image bytes to the special URL
-        image_data = file.read()
-        upload_image_to_linkedin(upload_info['upload_url'], image_data, file.mimetype)
+        # 4. Stream the image up and wait for processing in the background
+        upload = start_linkedin_image_upload(access_token, upload_info, image_file, mimetype)
 
-        # 4. Save the final asset URN to the session for the agent to use
-        session['uploaded_linkedin_asset_urn'] = upload_info['asset_urn']
+        # 5. Remember the pending upload for this session so the agent can use it
+        pending_linkedin_assets.set(session_id, upload)
         
-        print(f"✅ Image uploaded. Asset URN {upload_info['asset_urn']} stored in session.")
-        return {"success": True, "message": "Image uploaded and ready to be posted."}
+        print(f"✅ Image upload started. Asset URN {upload.asset_urn} stored for this session.")
+        return {"success": True, "pending": True, "message": "Image received and is being processed by LinkedIn.", **upload.to_dict()}, 202
 
     except Exception as e:
         print(f"❌ Image upload failed: {e}")
         return {"error": f"An unexpected error occurred: {str(e)}"}, 500
 
+@web.route('/upload/linkedin/image/status')
+def linkedin_image_status():
+    """Where this session's pending image is: uploading, processing, available or failed."""
+    session_id = session.get("session_id")
+    upload = pending_linkedin_assets.get(session_id)[1]
+    if upload is None:
+        return {"status": "none"}
+    if upload.status == "timed_out":
+        token, _ = get_linkedin_credentials(session_id)
+        if token:
+            try:
+                upload.recheck(token['access_token'])
+            except Exception as e:
+                print(f"⚠️ Could not recheck LinkedIn image status: {e}")
+    return upload.to_dict()
+
+@web.route("/stats/startup")
+def startup_stats():
+    """Import and init cost per component, at boot and on first use."""
+    return jsonify({
+        **startup_report.to_dict(),
+        "lazy_resources": {resource.name: resource.loaded for resource in lazy_resources},
+    })
+
+# ==============================================
+# APP FACTORY
+# ==============================================
+# LAZY_INIT=false builds every lazy client inside create_app instead, for
+# deployments that would rather pay at boot than on the first request.
+# Eager init, the Selenium warm-up and the startup report belong to the
+# process, not to an app, so only the first create_app call runs them.
+LAZY_INIT = os.getenv("LAZY_INIT", "true").lower() == "true"
+
+process_booted = False
+process_boot_lock = threading.Lock()
+
+
+def create_app() -> Flask:
+    global process_booted
+    with process_boot_lock:
+        first_app = not process_booted
+        process_booted = True
+
+    with startup_report.phase("flask app", kind="init") if first_app else nullcontext():
+        app = Flask(__name__)
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1)
+        app.secret_key = os.getenv("FLASK_SECRET_KEY", "a-truly-secret-key-for-production")
+        # Tells Flask to make sessions permanent and last for 30 days
+        app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=30)
+        oauth.init_app(app)
+        app.register_blueprint(web)
+    if not first_app:
+        return app
+    print("✅ LinkedIn OAuth client initialized")
+
+    if not LAZY_INIT:
+        for resource in lazy_resources:
+            resource.get()
+    if SELENIUM_POOL_PREWARM:
+        # Chrome launches on background threads; boot doesn't wait for it
+        selenium_pool.warm_up()
+
+    startup_report.mark_ready()
+    startup_report.log()
+    return app
+
+
+# `gunicorn app:app` serves this one. `gunicorn "app:create_app()"` gets a
+# second app object, but boot work isn't repeated for it (see above).
+app = create_app()
+
 # ==============================================
 # MAIN
 # ==============================================
@@ -0,0 +1,50 @@
+"""
+Micro-benchmark: per-call cost of getting a Gmail / Calendar client.
+
+Compares the old `build(api, version, credentials=creds)` path against
+`get_google_service(api, version, creds)` from app.py. No network calls are
+made: we only measure client construction, which is what every tool call
+used to pay before doing any real work.
+
+Run it with the same environment as the app (it imports app.py):
+    python benchmarks/bench_google_services.py [iterations]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+
+import app
+
+
+def time_per_call(fn, iterations: int) -> float:
+    """Returns the mean time of one call in milliseconds."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    creds = Credentials(token="benchmark-token")
+
+    print(f"Client construction, mean over {iterations} calls\n")
+    print(f"{'api':<14}{'build() ms':>12}{'factory ms':>12}{'speedup':>10}")
+    for api, version in [("gmail", "v1"), ("calendar", "v3")]:
+        # Warm the factory once; that one-off cost is paid at first use per process
+        app.get_google_service(api, version, creds)
+
+        old = time_per_call(lambda: build(api, version, credentials=creds), iterations)
+        new = time_per_call(lambda: app.get_google_service(api, version, creds), iterations)
+        print(f"{api + ' ' + version:<14}{old:>12.3f}{new:>12.3f}{old / new:>9.1f}x")
+
+    print("\nbuild() also opens a new HTTP transport per call; the factory reuses one keep-alive pool per thread.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Offline end-to-end benchmark: throughput, latency and memory without real upstreams.
+
+Runs app.py in-process with the scripted fake LLM (scripted_llm.py)
+and every upstream (Supabase, weatherstack, LinkedIn, Google, web search)
+answered by local stand-ins (benchmarks/standins.py), served by a threaded
+WSGI server on localhost. Two drivers then push load through it:
+
+    chat     N concurrent users, each replaying the scripted conversation
+             through POST / (home) with its own session
+    status   N concurrent pollers hitting /services-status
+
+For each it reports requests/s, p50/p95/p99 latency and the process RSS.
+Nothing leaves the machine, so runs are repeatable and free:
+
+    python benchmarks/bench_offline.py --clients 1 4 8 --rounds 3 --llm-latency-ms 300
+    python benchmarks/bench_offline.py --json before.json
+
+RSS covers the whole process (app, stand-ins and drivers together); compare
+runs against each other rather than against production.
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.standins import start_standins
+
+TRANSCRIPTS = os.path.join(ROOT, "benchmarks", "transcripts.json")
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def rss_mb() -> dict:
+    current = 0.0
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    current = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+    return {"rss_mb": round(current, 1), "peak_rss_mb": round(peak, 1)}
+
+
+def boot_app(standin_url: str, llm_latency_ms: float):
+    """Points the app at the stand-ins, imports it and serves it on a local port."""
+    os.environ.update({
+        "SUPABASE_URL": standin_url,
+        "SUPABASE_KEY": "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.standin",
+        "LLM_BACKEND": "scripted",
+        "SCRIPTED_LLM_TRANSCRIPTS": os.getenv("SCRIPTED_LLM_TRANSCRIPTS", TRANSCRIPTS),
+        "SCRIPTED_LLM_LATENCY_MS": str(llm_latency_ms),
+        "LINKEDIN_API_BASE_URL": standin_url,
+        "WEATHERSTACK_BASE_URL": standin_url,
+        "GOOGLE_API_ROOT_URL": standin_url,
+        "SELENIUM_POOL_PREWARM": "false",
+        "LLM_CACHE_PATH": os.path.join(tempfile.mkdtemp(prefix="bench-llm-cache-"), "llm_cache.sqlite3"),
+    })
+    # Credentials.from_authorized_user_info always uses Google's token endpoint,
+    # so the token refresh is redirected to the stand-in here
+    import google.oauth2.credentials
+    google.oauth2.credentials._GOOGLE_OAUTH2_TOKEN_ENDPOINT = f"{standin_url}/token"
+
+    os.chdir(ROOT)
+    import app as app_module
+
+    class StandInSearch:
+        """DuckDuckGo has no base URL to override, so the search tool is pointed at the stand-in here."""
+
+        def run(self, query: str) -> str:
+            response = requests.get(f"{standin_url}/search", params={"q": query}, timeout=10)
+            response.raise_for_status()
+            return response.text
+
+    app_module.search = StandInSearch()
+
+    from werkzeug.serving import make_server
+    server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return app_module, f"http://127.0.0.1:{server.server_port}"
+
+
+def chat_user(base_url: str, conversation: list, rounds: int) -> list:
+    """One user with its own session replaying the conversation. Returns (seconds, error) per message."""
+    client = requests.Session()
+    client.get(base_url + "/", timeout=30)
+    results = []
+    for _ in range(rounds):
+        for message in conversation:
+            start = time.perf_counter()
+            try:
+                response = client.post(base_url + "/", data={"user_input": message}, timeout=120)
+                error = None if response.status_code == 200 else f"HTTP {response.status_code}"
+            except Exception as e:
+                error = str(e)
+            results.append((time.perf_counter() - start, error))
+    return results
+
+
+def status_poller(base_url: str, polls: int) -> list:
+    client = requests.Session()
+    client.get(base_url + "/", timeout=30)
+    results = []
+    for _ in range(polls):
+        start = time.perf_counter()
+        try:
+            response = client.get(base_url + "/services-status", timeout=30)
+            error = None if response.status_code in (200, 304) else f"HTTP {response.status_code}"
+        except Exception as e:
+            error = str(e)
+        results.append((time.perf_counter() - start, error))
+    return results
+
+
+def run_driver(name: str, clients: int, work) -> dict:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        per_client = list(pool.map(lambda _: work(), range(clients)))
+    wall = time.perf_counter() - start
+    results = [r for client_results in per_client for r in client_results]
+    latencies = sorted(seconds for seconds, error in results if error is None)
+    errors = [error for _, error in results if error is not None]
+    return {
+        "driver": name,
+        "clients": clients,
+        "requests": len(results),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        **rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 8], help="concurrency levels to run")
+    parser.add_argument("--rounds", type=int, default=2, help="times each chat user replays the conversation")
+    parser.add_argument("--polls", type=int, default=50, help="status requests per poller")
+    parser.add_argument("--llm-latency-ms", type=float, default=0, help="simulated time per LLM call")
+    parser.add_argument("--upstream-latency-ms", type=float, default=0, help="simulated time per upstream call")
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON (for diffing runs)")
+    args = parser.parse_args()
+
+    standins = start_standins(latency_ms=args.upstream_latency_ms)
+    _, base_url = boot_app(standins.base_url, args.llm_latency_ms)
+    with open(os.getenv("SCRIPTED_LLM_TRANSCRIPTS", TRANSCRIPTS)) as f:
+        conversation = json.load(f)["conversation"]
+
+    results = []
+    for clients in args.clients:
+        results.append(run_driver("chat", clients, lambda: chat_user(base_url, conversation, args.rounds)))
+        results.append(run_driver("status", clients, lambda: status_poller(base_url, args.polls)))
+
+    if args.json:
+        # The app logs to stdout, so results go to their own file
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    print(f"\n{'driver':<8}{'clients':>8}{'reqs':>7}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'rss MB':>9}")
+    for r in results:
+        print(f"{r['driver']:<8}{r['clients']:>8}{r['requests']:>7}{r['errors']:>8}{r['rps']:>9.2f}"
+              f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['rss_mb']:>9.1f}")
+    failed = [r for r in results if r["first_error"]]
+    for r in failed:
+        print(f"first {r['driver']} error at {r['clients']} clients: {r['first_error']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Load test: chat throughput at increasing concurrency.
+
+Sends chat messages to a running instance of the app from N concurrent
+clients (each with its own session cookie) and reports requests per second
+and latency for each concurrency level. With tools bound to an explicit
+per-request context, a threaded worker (gunicorn --worker-class gthread)
+should show throughput growing with concurrency instead of staying flat.
+
+    python benchmarks/load_test.py http://localhost:8000 --levels 1 2 4 8 --requests 16
+
+Every request runs a real agent turn, so point it at an instance wired to a
+test model and stand-in services rather than production credentials.
+"""
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def run_client(base_url: str, message: str, count: int, latencies: list, errors: list, lock: threading.Lock):
+    """One simulated user: its own session, sending `count` messages one after another."""
+    client = requests.Session()
+    client.get(base_url + "/", timeout=30)  # picks up a session cookie
+    for _ in range(count):
+        start = time.perf_counter()
+        try:
+            response = client.post(base_url + "/chat/stream", data={"user_input": message}, timeout=300)
+            response.raise_for_status()
+            error = None if "event: final" in response.text else "no final event"
+        except Exception as e:
+            error = str(e)
+        elapsed = time.perf_counter() - start
+        with lock:
+            if error is None:
+                latencies.append(elapsed)
+            else:
+                errors.append(error)
+
+
+def run_level(base_url: str, message: str, concurrency: int, total_requests: int) -> dict:
+    latencies, errors, lock = [], [], threading.Lock()
+    per_client = max(total_requests // concurrency, 1)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(run_client, base_url, message, per_client, latencies, errors, lock)
+    wall = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "completed": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / wall if wall else 0.0,
+        "p50": statistics.median(latencies) if latencies else 0.0,
+        "max": max(latencies) if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("base_url")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--requests", type=int, default=16, help="requests per concurrency level")
+    parser.add_argument("--message", default="What is today's date?")
+    args = parser.parse_args()
+
+    base_url = args.base_url.rstrip("/")
+    print(f"{'clients':>8}{'done':>7}{'errors':>8}{'req/s':>9}{'p50 s':>9}{'max s':>9}")
+    for level in args.levels:
+        r = run_level(base_url, args.message, level, args.requests)
+        print(f"{r['concurrency']:>8}{r['completed']:>7}{r['errors']:>8}{r['rps']:>9.2f}{r['p50']:>9.2f}{r['max']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
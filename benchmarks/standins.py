@@ -0,0 +1,191 @@
+"""
+Local HTTP stand-ins for every upstream the app talks to, for offline benchmarks.
+
+One threaded server answers for all of them, routed by path prefix:
+
+    /rest/v1/user_credentials   Supabase (PostgREST); every session is connected
+    /current                    weatherstack
+    /v2/...                     LinkedIn API (posts, image uploads, asset status)
+    /upload/...                 LinkedIn image upload target
+    /calendar/v3/..., /gmail/v1/...   Google APIs (via GOOGLE_API_ROOT_URL); calendar
+                                listings hand out a sync token, and syncs with it are empty
+    /batch/...                  Google HTTP batches, one canned response per part
+    /search                     web search, returning plain text
+    /token                      Google OAuth token refresh (see bench_offline.boot_app)
+
+Responses are canned but shaped like the real ones, and LATENCY_MS (set via
+`start_standins(latency_ms=...)`) is added to every response.
+"""
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FAR_FUTURE = (datetime.now(timezone.utc) + timedelta(days=365)).isoformat()
+
+
+def credential_rows(session_id: str) -> list:
+    return [
+        {
+            "id": f"google-{session_id}",
+            "session_id": session_id,
+            "provider": "google",
+            "access_token": "standin-google-token",
+            "refresh_token": "standin-refresh-token",
+            "expires_at": FAR_FUTURE,
+            "other_details": {"client_id": "standin", "client_secret": "standin"},
+        },
+        {
+            "id": f"linkedin-{session_id}",
+            "session_id": session_id,
+            "provider": "linkedin",
+            "access_token": "standin-linkedin-token",
+            "expires_at": FAR_FUTURE,
+            "other_details": {"urn": "urn:li:person:standin", "name": "Stand In"},
+        },
+    ]
+
+
+def calendar_events() -> dict:
+    start = datetime.now(timezone.utc) + timedelta(days=1)
+    return {
+        "items": [
+            {
+                "id": f"event{i}",
+                "summary": title,
+                "start": {"dateTime": (start + timedelta(days=i)).isoformat()},
+                "end": {"dateTime": (start + timedelta(days=i, hours=1)).isoformat()},
+            }
+            for i, title in enumerate(["Team sync", "Design review"])
+        ]
+    }
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency_ms = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body=None, content_type="application/json"):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        payload = b"" if body is None else (body if isinstance(body, bytes) else json.dumps(body).encode())
+        self.send_response(status)
+        if body is not None:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _supabase_select(self, query: dict):
+        session_id = query.get("session_id", ["eq."])[0].split(".", 1)[1]
+        provider = query.get("provider", [""])[0]
+        if provider.startswith("eq."):
+            wanted = {provider[3:]}
+        elif provider.startswith("in."):
+            wanted = set(provider[4:-1].split(","))
+        else:
+            wanted = {"google", "linkedin"}
+        return [row for row in credential_rows(session_id) if row["provider"] in wanted]
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/rest/v1/user_credentials":
+            self._send(200, self._supabase_select(query))
+        elif url.path == "/current":
+            city = query.get("query", ["Paris"])[0]
+            self._send(200, {
+                "location": {"name": city, "country": "Standinland"},
+                "current": {"temperature": 21, "weather_descriptions": ["Sunny"], "humidity": 40, "wind_speed": 8},
+            })
+        elif url.path.startswith("/v2/assets/"):
+            self._send(200, {"recipes": [{"recipe": "urn:li:digitalmediaRecipe:feedshare-image", "status": "AVAILABLE"}]})
+        elif url.path.startswith("/calendar/v3/calendars/"):
+            # A full listing hands out a sync token; syncing with it reports no changes
+            if "syncToken" in query:
+                self._send(200, {"items": [], "nextSyncToken": "standin-sync-token"})
+            else:
+                self._send(200, {**calendar_events(), "nextSyncToken": "standin-sync-token"})
+        elif url.path == "/search":
+            self._send(200, f"Stand-in search results for {query.get('q', [''])[0]}.".encode(), "text/plain")
+        else:
+            self._send(404, {"error": f"no stand-in for GET {url.path}"})
+
+    def _batch(self, body: bytes):
+        """Answers a Google HTTP batch (multipart/mixed) with one canned response per part."""
+        boundary = self.headers["Content-Type"].split("boundary=", 1)[1].strip('"')
+        parts = []
+        for part in body.decode().split("--" + boundary)[1:]:
+            if part.startswith("--"):
+                break
+            outer, _, inner = part.replace("\r\n", "\n").strip("\n").partition("\n\n")
+            content_id = next(line.split(":", 1)[1].strip() for line in outer.splitlines() if line.lower().startswith("content-id"))
+            method, path = inner.split(" ", 2)[:2]
+            path = urlsplit(path).path
+            if method == "DELETE":
+                status, payload = "204 No Content", ""
+            elif path.startswith("/gmail/v1/users/"):
+                status, payload = "200 OK", json.dumps({"id": "message-standin"})
+            else:
+                status, payload = "200 OK", json.dumps({"id": f"event-{len(parts)}", "status": "confirmed"})
+            parts.append(
+                f"--batch_standin\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id[1:-1]}>\r\n\r\n"
+                f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n\r\n{payload}\r\n"
+            )
+        self._send(200, ("".join(parts) + "--batch_standin--\r\n").encode(), "multipart/mixed; boundary=batch_standin")
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        body = self._read_body()
+        if url.path == "/batch" or url.path.startswith("/batch/"):
+            self._batch(body)
+        elif url.path == "/rest/v1/user_credentials":
+            self._send(201, [])
+        elif url.path == "/token":
+            self._send(200, {"access_token": "standin-google-token", "expires_in": 3600, "token_type": "Bearer"})
+        elif url.path == "/v2/ugcPosts":
+            self._send(201, {"id": "urn:li:share:standin"})
+        elif url.path == "/v2/assets":
+            self._send(200, {"value": {
+                "asset": "urn:li:digitalmediaAsset:standin",
+                "uploadMechanism": {"com.linkedin.digitalmedia.uploading.MediaUploadHttpRequest": {
+                    "uploadUrl": f"http://{self.headers['Host']}/upload/standin",
+                }},
+            }})
+        elif url.path.startswith("/calendar/v3/calendars/"):
+            self._send(200, {"id": "event-new", "htmlLink": "http://127.0.0.1/event-new"})
+        elif url.path.startswith("/gmail/v1/users/"):
+            self._send(200, {"id": "message-standin"})
+        else:
+            self._send(404, {"error": f"no stand-in for POST {url.path}"})
+
+    def do_PUT(self):
+        self._read_body()
+        self._send(201)
+
+    def do_PATCH(self):
+        self._read_body()
+        self._send(200, [])
+
+    def do_DELETE(self):
+        self._read_body()
+        self._send(204)
+
+
+def start_standins(latency_ms: float = 0.0, port: int = 0) -> ThreadingHTTPServer:
+    """Starts the stand-in server on a background thread; its base URL is server.base_url."""
+    handler = type("ConfiguredStandInHandler", (StandInHandler,), {"latency_ms": latency_ms})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.base_url = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
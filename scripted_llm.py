@@ -0,0 +1,95 @@
+"""
+Scripted chat model for offline benchmarks and tests.
+
+Replays deterministic ReAct transcripts instead of calling Gemini. app.py
+creates it in `create_chat_model` when LLM_BACKEND=scripted:
+
+    SCRIPTED_LLM_TRANSCRIPTS  path to a JSON file (default: benchmarks/transcripts.json
+                              when present; without one every ReAct prompt gets
+                              "default_reply")
+    SCRIPTED_LLM_LATENCY_MS   simulated time per call, to stand in for Gemini's latency
+
+A transcript is picked by matching its "match" regex against the user's
+question (the last "Question:" line of a ReAct prompt); the reply is the
+step matching the number of Observations already in the scratchpad. Prompts
+that aren't ReAct prompts (history summaries, form analysis) get
+"plain_reply".
+"""
+import json
+import os
+import re
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+DEFAULT_TRANSCRIPTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "transcripts.json")
+QUESTION_REGEX = re.compile(r"^Question: (.*)$", re.MULTILINE)
+
+
+class ScriptedChatModel(BaseChatModel):
+    model: str = "scripted"
+    temperature: float = 0.0
+    transcripts: List[dict] = []
+    default_reply: str = "Thought: I now know the final answer\nFinal Answer: OK"
+    plain_reply: str = "OK"
+    latency_ms: float = 0.0
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "ScriptedChatModel":
+        with open(path) as f:
+            script = json.load(f)
+        return cls(
+            transcripts=script.get("transcripts", []),
+            default_reply=script.get("default_reply", cls.model_fields["default_reply"].default),
+            plain_reply=script.get("plain_reply", cls.model_fields["plain_reply"].default),
+            **kwargs,
+        )
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "ScriptedChatModel":
+        path = os.getenv("SCRIPTED_LLM_TRANSCRIPTS")
+        if path is None and os.path.exists(DEFAULT_TRANSCRIPTS):
+            path = DEFAULT_TRANSCRIPTS
+        latency_ms = float(os.getenv("SCRIPTED_LLM_LATENCY_MS", "0"))
+        if path is None:
+            # e.g. an image built without benchmarks/
+            return cls(latency_ms=latency_ms, **kwargs)
+        return cls.from_file(path, latency_ms=latency_ms, **kwargs)
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def reply_for(self, prompt: str) -> str:
+        questions = QUESTION_REGEX.findall(prompt)
+        if not questions:
+            return self.plain_reply
+        question = questions[-1]
+        step = prompt[prompt.rfind("Question: " + question):].count("\nObservation:")
+        for transcript in self.transcripts:
+            if re.search(transcript["match"], question, re.IGNORECASE):
+                steps = transcript["steps"]
+                return steps[min(step, len(steps) - 1)]
+        return self.default_reply
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        prompt = "\n".join(str(m.content) for m in messages)
+        text = self.reply_for(prompt)
+        for token in stop or []:
+            if token in text:
+                text = text[:text.index(token)]
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        # Rough token counts so usage accounting has something to add up
+        usage = {"input_tokens": len(prompt) // 4, "output_tokens": len(text) // 4}
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))])
@@ -9,7 +9,8 @@ messageInput.addEventListener('input', function () {
 messageInput.addEventListener('keydown', function (e) {
     if (e.key === 'Enter' && !e.shiftKey) {
         e.preventDefault();
-        document.getElementById('chatForm').submit();
+        // requestSubmit() fires the submit event so the streaming handler below runs
+        document.getElementById('chatForm').requestSubmit();
     }
 });
 
@@ -22,7 +23,10 @@ if (chatMessages) {
 // Form submission handling
 const chatForm = document.getElementById('chatForm');
 const sendBtn = document.getElementById('sendBtn');
-chatForm.addEventListener('submit', function () {
+const sendBtnHTML = sendBtn.innerHTML;
+const canStreamChat = !!(window.fetch && window.ReadableStream && window.TextDecoder);
+
+chatForm.addEventListener('submit', function (e) {
     sendBtn.disabled = true;
     sendBtn.innerHTML = `
         <div class="loading">
@@ -34,8 +38,131 @@ chatForm.addEventListener('submit', function () {
             <span>Sending...</span>
         </div>
     `;
+
+    // Without streaming support the form falls back to a normal page reload
+    if (canStreamChat) {
+        e.preventDefault();
+        streamChatMessage(messageInput.value).finally(function () {
+            sendBtn.disabled = false;
+            sendBtn.innerHTML = sendBtnHTML;
+            messageInput.focus();
+        });
+    }
 });
 
+// Adds a message bubble to the conversation and returns its content element
+function appendChatMessage(role) {
+    const placeholder = chatMessages.querySelector('.no-messages');
+    if (placeholder) {
+        placeholder.remove();
+    }
+
+    const message = document.createElement('div');
+    message.className = 'message message-' + role;
+
+    const header = document.createElement('div');
+    header.className = 'message-header';
+    header.innerHTML = role === 'user'
+        ? '<i class="fas fa-user"></i> You'
+        : '<i class="fas fa-robot"></i> Assistant';
+    message.appendChild(header);
+
+    const content = document.createElement('div');
+    content.className = 'message-content';
+    message.appendChild(content);
+
+    chatMessages.appendChild(message);
+    return content;
+}
+
+// Sends a message to /chat/stream and renders tool steps and answer tokens as they arrive
+async function streamChatMessage(text) {
+    const userInput = text.trim();
+    if (!userInput) {
+        return;
+    }
+
+    appendChatMessage('user').textContent = userInput;
+    messageInput.value = '';
+    messageInput.style.height = 'auto';
+
+    const answer = appendChatMessage('assistant');
+    const steps = document.createElement('div');
+    steps.className = 'message-steps';
+    answer.before(steps);
+    answer.textContent = '…';
+    let answerStarted = false;
+
+    function addStep(label) {
+        const step = document.createElement('div');
+        step.className = 'message-step';
+        step.textContent = label;
+        steps.appendChild(step);
+        chatMessages.scrollTop = chatMessages.scrollHeight;
+    }
+
+    function handleEvent(event, data) {
+        if (event === 'tool_start') {
+            addStep('🔧 ' + data.tool + '…');
+        } else if (event === 'tool_end') {
+            addStep('✔ ' + data.tool + ' finished');
+        } else if (event === 'token') {
+            if (!answerStarted) {
+                answer.textContent = '';
+                answerStarted = true;
+            }
+            answer.textContent += data.text;
+        } else if (event === 'final') {
+            answer.textContent = data.output;
+        } else if (event === 'error') {
+            answer.textContent = data.message;
+        }
+        chatMessages.scrollTop = chatMessages.scrollHeight;
+    }
+
+    try {
+        const formData = new FormData();
+        formData.append('user_input', userInput);
+        const response = await fetch('/chat/stream', { method: 'POST', body: formData });
+        if (!response.ok || !response.body) {
+            throw new Error('HTTP ' + response.status);
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+
+            // Server-sent events are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const block = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let event = 'message';
+                let data = '';
+                block.split('\n').forEach(function (line) {
+                    if (line.startsWith('event: ')) {
+                        event = line.slice(7);
+                    } else if (line.startsWith('data: ')) {
+                        data += line.slice(6);
+                    }
+                });
+                if (data) {
+                    handleEvent(event, JSON.parse(data));
+                }
+            }
+        }
+    } catch (error) {
+        answer.textContent = '❌ Error: ' + error.message;
+        console.error('Chat stream error:', error);
+    }
+}
+
 // Handle LinkedIn Image Upload
 async function handleImageUpload() {
     const fileInput = document.getElementById('linkedin-image-file');
@@ -70,7 +197,20 @@ async function handleImageUpload() {
         const result = await response.json();
 
         if (result.success) {
-            uploadStatus.textContent = '✅ Image uploaded successfully! You can now ask the agent to post on LinkedIn.';
+            // LinkedIn processes the image in the background; wait for it before reporting success
+            uploadStatus.textContent = 'Processing image on LinkedIn...';
+            const upload = await waitForLinkedInImage(result);
+            if (upload.status === 'failed') {
+                uploadStatus.textContent = '❌ Upload failed: ' + (upload.error || 'Unknown error');
+                uploadStatus.className = 'error';
+                return;
+            }
+            if (upload.status === 'available') {
+                uploadStatus.textContent = '✅ Image uploaded successfully! You can now ask the agent to post on LinkedIn.';
+            } else {
+                // Still processing on LinkedIn's side; it is checked again when posting
+                uploadStatus.textContent = '⏳ Image uploaded. LinkedIn is still processing it; it will be attached once ready.';
+            }
             uploadStatus.className = 'success';
             // Refresh the page to show the updated state
             setTimeout(() => {
@@ -87,6 +227,24 @@ async function handleImageUpload() {
     }
 }
 
+// Poll the pending image until LinkedIn has processed it (or it failed).
+// Gives up after ~30s; the agent still waits on it when posting.
+async function waitForLinkedInImage(upload) {
+    let delay = 500;
+    const deadline = Date.now() + 30000;
+    while ((upload.status === 'uploading' || upload.status === 'processing') && Date.now() < deadline) {
+        await new Promise(resolve => setTimeout(resolve, delay));
+        delay = Math.min(delay * 2, 4000);
+        try {
+            const response = await fetch('/upload/linkedin/image/status');
+            upload = await response.json();
+        } catch (error) {
+            console.log('Could not check image status:', error);
+        }
+    }
+    return upload;
+}
+
 // LinkedIn Image Upload Functionality (Legacy - for drag & drop if needed)
 const imageInput = document.getElementById('imageInput');
 const uploadArea = document.getElementById('uploadArea');
@@ -194,39 +352,41 @@ async function uploadImageToLinkedIn(file) {
     }
 }
 
+// Apply a combined status payload to the badges
+function applyServiceStatus(data) {
+    const googleBadge = document.getElementById('googleStatus');
+    if (data.google && data.google.status === 'authorized') {
+        googleBadge.className = 'status-badge status-connected';
+        googleBadge.innerHTML = '<i class="fas fa-circle" style="font-size: 8px;"></i><span>Connected</span>';
+    }
+
+    const linkedinBadge = document.getElementById('linkedinStatus');
+    if (data.linkedin && data.linkedin.status === 'authorized') {
+        linkedinBadge.className = 'status-badge status-connected';
+        linkedinBadge.innerHTML = '<i class="fas fa-circle" style="font-size: 8px;"></i><span>Connected</span>';
+
+        // Show image upload panel when LinkedIn is connected
+        if (imageUploadPanel) {
+            imageUploadPanel.style.display = 'block';
+        }
+    } else {
+        // Hide image upload panel when LinkedIn is not connected
+        if (imageUploadPanel) {
+            imageUploadPanel.style.display = 'none';
+        }
+    }
+}
+
 // Check service status and update badges
+// One request for both services; the browser revalidates with the ETag,
+// so unchanged polls come back as an empty 304.
 async function updateServiceStatus() {
     try {
-        // Check Google services
-        const googleResponse = await fetch('/status');
-        const googleData = await googleResponse.json();
-        const googleBadge = document.getElementById('googleStatus');
-        
-        if (googleData.status === 'authorized') {
-            googleBadge.className = 'status-badge status-connected';
-            googleBadge.innerHTML = '<i class="fas fa-circle" style="font-size: 8px;"></i><span>Connected</span>';
+        const response = await fetch('/services-status', { cache: 'no-cache' });
+        if (!response.ok) {
+            return;
         }
-
-        // Check LinkedIn services
-        const linkedinResponse = await fetch('/linkedin-status');
-        const linkedinData = await linkedinResponse.json();
-        const linkedinBadge = document.getElementById('linkedinStatus');
-        
-        if (linkedinData.status === 'authorized') {
-            linkedinBadge.className = 'status-badge status-connected';
-            linkedinBadge.innerHTML = '<i class="fas fa-circle" style="font-size: 8px;"></i><span>Connected</span>';
-            
-            // Show image upload panel when LinkedIn is connected
-            if (imageUploadPanel) {
-                imageUploadPanel.style.display = 'block';
-            }
-        } else {
-            // Hide image upload panel when LinkedIn is not connected
-            if (imageUploadPanel) {
-                imageUploadPanel.style.display = 'none';
-            }
-        }
-        
+        applyServiceStatus(await response.json());
     } catch (error) {
         console.log('Could not check service status:', error);
     }
@@ -240,5 +400,18 @@ window.addEventListener('load', function () {
     messageInput.focus();
 });
 
-// Refresh status every 30 seconds
-setInterval(updateServiceStatus, 30000);
\ No newline at end of file
+// Prefer the push stream when the server has it enabled, otherwise poll
+const statusStreamEnabled = document.body.dataset.statusStream === 'true';
+if (statusStreamEnabled && window.EventSource) {
+    const statusStream = new EventSource('/services-status/stream');
+    statusStream.addEventListener('status', function (e) {
+        applyServiceStatus(JSON.parse(e.data));
+    });
+} else {
+    // Refresh status every 30 seconds (skipped while the tab is hidden)
+    setInterval(function () {
+        if (!document.hidden) {
+            updateServiceStatus();
+        }
+    }, 30000);
+}
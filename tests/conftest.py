@@ -0,0 +1,87 @@
+"""
+Shared setup for the test suite.
+
+app.py reads its configuration at import time, so the environment is set
+here, before any test imports it: no real Supabase, Gemini or Chrome is
+needed, and LinkedIn calls go to `linkedin_standin`, a local HTTP server
+whose asset statuses each test scripts.
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class LinkedInStandIn(BaseHTTPRequestHandler):
+    """GET /v2/assets/{id} replays the statuses scripted for that asset; PUT /upload/* accepts the bytes."""
+
+    protocol_version = "HTTP/1.1"
+    scripts = {}
+    requests = []
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: dict = None):
+        payload = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        asset_id = self.path.rsplit("/", 1)[-1]
+        with self.lock:
+            self.requests.append(("GET", self.path))
+            script = self.scripts.get(asset_id, ["AVAILABLE"])
+            # The last status repeats once the script runs out
+            status = script.pop(0) if len(script) > 1 else script[0]
+        self._send(200, {"recipes": [{"recipe": "urn:li:digitalmediaRecipe:feedshare-image", "status": status}]})
+
+    def do_PUT(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        with self.lock:
+            self.requests.append(("PUT", self.path))
+        self._send(201)
+
+
+_server = ThreadingHTTPServer(("127.0.0.1", 0), LinkedInStandIn)
+_server.daemon_threads = True
+threading.Thread(target=_server.serve_forever, daemon=True).start()
+
+os.environ.update({
+    "SUPABASE_URL": "http://127.0.0.1:9",
+    "SUPABASE_KEY": "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.test",
+    "LLM_BACKEND": "scripted",
+    "SELENIUM_POOL_PREWARM": "false",
+    "LLM_CACHE_PATH": os.path.join(tempfile.mkdtemp(prefix="test-llm-cache-"), "llm_cache.sqlite3"),
+    "LINKEDIN_API_BASE_URL": f"http://127.0.0.1:{_server.server_port}",
+    "LINKEDIN_ASSET_POLL_INITIAL": "0.02",
+    "LINKEDIN_ASSET_POLL_MAX": "0.05",
+    "LINKEDIN_ASSET_READY_TIMEOUT": "0.5",
+})
+
+
+@pytest.fixture
+def linkedin_standin():
+    """The LinkedIn stand-in, with fresh scripts and request log. Set `.scripts[asset_id] = [...]`."""
+    LinkedInStandIn.scripts = {}
+    LinkedInStandIn.requests = []
+    LinkedInStandIn.base_url = f"http://127.0.0.1:{_server.server_port}"
+    return LinkedInStandIn
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    os.chdir(ROOT)
+    import app
+    return app
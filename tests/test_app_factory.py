@@ -0,0 +1,66 @@
+"""Lazy clients stay unbuilt at import unless LAZY_INIT=false, and create_app only boots the process once."""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPORT_LAZY_RESOURCES = "import json, app; print(json.dumps({r.name: r.loaded for r in app.lazy_resources}))"
+
+
+@pytest.fixture(scope="module")
+def service_account_json() -> str:
+    """A throwaway service account, so the Gemini backend's clients can be built offline."""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    return json.dumps({
+        "type": "service_account",
+        "project_id": "test",
+        "private_key_id": "test",
+        "private_key": pem.decode(),
+        "client_email": "test@test.iam.gserviceaccount.com",
+        "client_id": "1",
+        "token_uri": "https://oauth2.googleapis.com/token",
+    })
+
+
+def lazy_resources_after_import(service_account_json: str, lazy_init: str) -> dict:
+    # A fresh interpreter: the test session's app module has long since built its clients
+    env = {**os.environ, "LLM_BACKEND": "gemini", "GOOGLE_CREDENTIALS_JSON": service_account_json, "LAZY_INIT": lazy_init}
+    result = subprocess.run(
+        [sys.executable, "-c", REPORT_LAZY_RESOURCES], cwd=ROOT, env=env, capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_lazy_init_leaves_clients_unbuilt(service_account_json):
+    loaded = lazy_resources_after_import(service_account_json, "true")
+
+    assert {"supabase client", "llm", "react agent"} <= set(loaded)
+    assert not any(loaded.values()), loaded
+
+
+def test_eager_init_builds_every_client(service_account_json):
+    loaded = lazy_resources_after_import(service_account_json, "false")
+
+    assert loaded and all(loaded.values()), loaded
+
+
+def test_second_create_app_does_not_boot_again(app_module, monkeypatch):
+    warm_ups = []
+    monkeypatch.setattr(app_module, "SELENIUM_POOL_PREWARM", True)
+    monkeypatch.setattr(app_module.selenium_pool, "warm_up", lambda: warm_ups.append(True))
+    report_before = app_module.startup_report.to_dict()
+
+    second = app_module.create_app()
+
+    assert second is not app_module.app
+    assert warm_ups == []
+    assert app_module.startup_report.to_dict() == report_before
+    assert second.test_client().get("/stats/startup").status_code == 200
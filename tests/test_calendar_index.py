@@ -0,0 +1,179 @@
+"""The per-session calendar index: full and delta syncs, expired sync tokens, fallbacks and write-through."""
+import json
+from datetime import datetime, timedelta, timezone
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+SESSION_ID = "calendar-session"
+
+
+def make_event(event_id: str, title: str, hours_from_now: float, status: str = "confirmed") -> dict:
+    start = datetime.now(timezone.utc) + timedelta(hours=hours_from_now)
+    return {
+        "id": event_id,
+        "status": status,
+        "summary": title,
+        "start": {"dateTime": start.isoformat()},
+        "end": {"dateTime": (start + timedelta(hours=1)).isoformat()},
+    }
+
+
+def cancelled(event_id: str) -> dict:
+    return {"id": event_id, "status": "cancelled"}
+
+
+class FakeCalendarService:
+    """`service.events().list(...).execute()`: full listings and deltas are answered from separate scripts."""
+
+    def __init__(self, full=(), deltas=(), api=()):
+        self.full = list(full)  # items of each full sync, in order
+        self.deltas = list(deltas)  # items (or an HTTP status to fail with) of each delta
+        self.api = list(api)  # items of a plain ordered listing, as get_calendar_events asks past the horizon
+        self.calls = []
+
+    def events(self):
+        return self
+
+    def list(self, **params):
+        self.calls.append(params)
+        return self
+
+    def execute(self):
+        params = self.calls[-1]
+        if "syncToken" in params:
+            reply = self.deltas.pop(0)
+            if isinstance(reply, int):
+                raise HttpError(httplib2.Response({"status": reply}), b'{"error": {"message": "Sync token is no longer valid"}}')
+            kind = "delta"
+        elif "orderBy" in params:
+            return {"items": self.api}
+        else:
+            reply = self.full.pop(0)
+            kind = "full"
+        return {"items": reply, "nextSyncToken": f"token-{kind}-{len(self.calls)}"}
+
+    def kinds(self) -> list:
+        return ["delta" if "syncToken" in call else "api" if "orderBy" in call else "full" for call in self.calls]
+
+
+@pytest.fixture
+def store(app_module):
+    return app_module.CalendarIndexStore(ttl=3600, max_entries=16, horizon_days=30, min_interval=0)
+
+
+def titles(index) -> list:
+    """Titles of the index's upcoming events, soonest first."""
+    return [event["summary"] for event in index.upcoming(datetime.now(timezone.utc))]
+
+
+def test_full_sync_then_delta(app_module, store):
+    service = FakeCalendarService(
+        full=[[make_event("a", "Standup", 2), make_event("b", "Retro", 5)]],
+        deltas=[[make_event("c", "Lunch", 3), make_event("b", "Retro (moved)", 1)]],
+    )
+
+    index = store.index(SESSION_ID, service)
+    assert titles(index) == ["Standup", "Retro"]
+    assert index.sync_token == "token-full-1"
+
+    index = store.index(SESSION_ID, service)
+    assert service.kinds() == ["full", "delta"]
+    assert service.calls[1]["syncToken"] == "token-full-1"
+    assert titles(index) == ["Retro (moved)", "Standup", "Lunch"]
+    assert store.stats()["syncs"]["full"] == 1 and store.stats()["syncs"]["delta"] == 1
+
+
+def test_cancelled_delta_item_removes_the_event(app_module, store):
+    service = FakeCalendarService(
+        full=[[make_event("a", "Standup", 2), make_event("b", "Retro", 5)]],
+        deltas=[[cancelled("a")]],
+    )
+
+    store.index(SESSION_ID, service)
+    index = store.index(SESSION_ID, service)
+
+    assert titles(index) == ["Retro"]
+
+
+def test_expired_sync_token_resets_and_runs_a_full_sync(app_module, store):
+    service = FakeCalendarService(
+        full=[[make_event("a", "Standup", 2)], [make_event("b", "Retro", 5)]],
+        deltas=[410],
+    )
+
+    store.index(SESSION_ID, service)
+    index = store.index(SESSION_ID, service)
+
+    assert service.kinds() == ["full", "delta", "full"]
+    # Nothing from before the reset survives
+    assert titles(index) == ["Retro"]
+    assert index.sync_token == "token-full-3"
+    assert store.stats()["syncs"] == {"full": 2, "delta": 0, "reused": 0, "expired_token": 1}
+
+
+def test_other_delta_errors_propagate(app_module, store):
+    service = FakeCalendarService(full=[[make_event("a", "Standup", 2)]], deltas=[500])
+
+    store.index(SESSION_ID, service)
+    with pytest.raises(HttpError):
+        store.index(SESSION_ID, service)
+
+
+@pytest.fixture
+def calendar_tool(app_module, monkeypatch, store):
+    """Runs get_calendar_events for SESSION_ID against the given fake service."""
+    monkeypatch.setattr(app_module, "calendar_index", store)
+
+    def run(service, **params):
+        monkeypatch.setattr(app_module, "get_google_service", lambda api, version, creds: service)
+        ctx = app_module.ToolContext(SESSION_ID)
+        ctx._google_credentials = object()
+        return app_module.get_calendar_events.func(json.dumps(params), ctx)
+
+    return run
+
+
+def test_listing_within_the_horizon_is_served_from_the_index(app_module, calendar_tool):
+    service = FakeCalendarService(full=[[make_event("a", "Standup", 2), make_event("b", "Offsite", 24 * 20)]])
+
+    answer = calendar_tool(service, days_ahead=7)
+
+    assert "Standup" in answer and "Offsite" not in answer
+    assert service.kinds() == ["full"]
+
+
+def test_listing_past_the_horizon_falls_back_to_the_api(app_module, calendar_tool):
+    conference = make_event("b", "Conference", 24 * 60)
+    service = FakeCalendarService(full=[[make_event("a", "Standup", 2)]], api=[make_event("a", "Standup", 2), conference])
+
+    answer = calendar_tool(service, days_ahead=90)
+
+    assert service.kinds() == ["full", "api"]
+    assert service.calls[-1]["orderBy"] == "startTime"
+    assert "Conference" in answer
+
+
+def test_created_and_deleted_events_are_written_through(app_module):
+    store = app_module.CalendarIndexStore(ttl=3600, max_entries=16, horizon_days=30, min_interval=60)
+    service = FakeCalendarService(full=[[make_event("a", "Standup", 2)]])
+    store.index(SESSION_ID, service)
+
+    store.record_created(SESSION_ID, make_event("n", "Interview", 1))
+    index = store.index(SESSION_ID, service)
+    assert titles(index) == ["Interview", "Standup"]
+
+    store.record_deleted(SESSION_ID, "a")
+    index = store.index(SESSION_ID, service)
+    assert titles(index) == ["Interview"]
+    # Both reads were answered by the index without another listing
+    assert service.kinds() == ["full"]
+    assert store.stats()["syncs"]["reused"] == 2
+
+
+def test_write_through_without_an_index_is_a_no_op(app_module, store):
+    store.record_created("no-index-yet", make_event("n", "Interview", 1))
+    store.record_deleted("no-index-yet", "n")
+
+    assert store.stats()["sessions"] == 0
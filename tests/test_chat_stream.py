@@ -0,0 +1,92 @@
+"""Streamed chat turns run on a bounded pool and stop when the client disconnects."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+class EndlessTurn:
+    """Stands in for the agent: streams answer tokens until the handler stops it."""
+
+    def __init__(self, app_module):
+        self.app = app_module
+        self.started = threading.Event()
+        self.stopped = threading.Event()
+        self.calls = 0
+
+    def __call__(self, inputs, config):
+        self.calls += 1
+        handler = config["callbacks"][0]
+        self.started.set()
+        try:
+            handler.on_llm_new_token("Thought: done\nFinal Answer: ", run_id="run")
+            while True:
+                handler.on_llm_new_token("more ", run_id="run")
+                threading.Event().wait(0.01)
+        except self.app.ChatStreamStopped:
+            self.stopped.set()
+            raise
+
+
+def free_slots(app_module) -> int:
+    """Slots currently free, without keeping any."""
+    taken = 0
+    while app_module.chat_stream_slots.acquire(blocking=False):
+        taken += 1
+    for _ in range(taken):
+        app_module.chat_stream_slots.release()
+    return taken
+
+
+def test_stream_ends_with_the_final_answer(app_module, client):
+    body = client.post("/chat/stream", data={"user_input": "tell me a fun fact about octopuses"}).get_data(as_text=True)
+
+    assert "event: final" in body
+    assert free_slots(app_module) == app_module.CHAT_STREAM_MAX_PENDING
+
+
+def test_disconnect_stops_the_running_turn(app_module, monkeypatch, client):
+    turn = EndlessTurn(app_module)
+    monkeypatch.setattr(app_module, "invoke_agent_timed", turn)
+
+    response = client.post("/chat/stream", data={"user_input": "write me a long story"}, buffered=False)
+    stream = iter(response.response)
+    assert "event: token" in next(stream).decode()
+    response.close()
+
+    assert turn.stopped.wait(5)
+    threading.Event().wait(0.1)
+    assert free_slots(app_module) == app_module.CHAT_STREAM_MAX_PENDING
+
+
+def test_disconnect_cancels_a_queued_turn(app_module, monkeypatch, client):
+    busy = ThreadPoolExecutor(max_workers=1)
+    release = threading.Event()
+    busy.submit(release.wait)
+    monkeypatch.setattr(app_module, "chat_stream_executor", busy)
+    monkeypatch.setattr(app_module, "CHAT_STREAM_KEEPALIVE_SECONDS", 0.05)
+    turn = EndlessTurn(app_module)
+    monkeypatch.setattr(app_module, "invoke_agent_timed", turn)
+
+    response = client.post("/chat/stream", data={"user_input": "write me a long story"}, buffered=False)
+    assert next(iter(response.response)).decode().startswith(": keep-alive")
+    response.close()
+    release.set()
+    busy.shutdown(wait=True)
+
+    assert turn.calls == 0
+    assert free_slots(app_module) == app_module.CHAT_STREAM_MAX_PENDING
+
+
+def test_full_pool_is_rejected(app_module, monkeypatch, client):
+    monkeypatch.setattr(app_module, "chat_stream_slots", threading.BoundedSemaphore(1))
+    app_module.chat_stream_slots.acquire()
+
+    response = client.post("/chat/stream", data={"user_input": "write me a long story"})
+
+    assert response.status_code == 503
@@ -0,0 +1,42 @@
+"""Small talk is answered locally, except when it is a reply to the agent's question."""
+import pytest
+
+
+@pytest.fixture
+def history(app_module):
+    session_id = "router-session"
+    history = app_module.get_session_history(session_id)
+    history.clear()
+    yield session_id, history
+    history.clear()
+
+
+def test_thanks_after_an_answer_takes_the_fast_path(app_module, history):
+    session_id, messages = history
+    messages.add_messages([app_module.HumanMessage(content="weather in Pune"), app_module.AIMessage(content="It's 31°C and sunny.")])
+
+    answer = app_module.fast_path_router.try_answer(session_id, "Thanks!")
+
+    assert answer is not None
+    assert messages.messages[-1].content == answer
+
+
+@pytest.mark.parametrize("question", [
+    "I've drafted the email to Bob. Shall I send it?",
+    "Analysis complete. I need your phone number and a cover letter.",
+    "Please confirm the meeting time.",
+])
+@pytest.mark.parametrize("reply", ["ok", "great", "thanks"])
+def test_reply_to_a_question_goes_to_the_agent(app_module, history, question, reply):
+    session_id, messages = history
+    messages.add_messages([app_module.HumanMessage(content="help me"), app_module.AIMessage(content=question)])
+
+    assert app_module.fast_path_router.try_answer(session_id, reply) is None
+    assert len(messages.messages) == 2
+
+
+def test_greeting_is_answered_even_after_a_question(app_module, history):
+    session_id, messages = history
+    messages.add_messages([app_module.AIMessage(content="Shall I send it?")])
+
+    assert app_module.fast_path_router.try_answer(session_id, "hello") is not None
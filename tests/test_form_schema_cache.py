@@ -0,0 +1,59 @@
+"""Cached form schemas are revalidated against the page's form fields, not its raw body."""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+
+import pytest
+
+FORM_PAGE = """<html><head><title>Apply</title><meta name="csrf" content="{token}">
+<script nonce="{token}">window.loadedAt = {token};</script></head>
+<body><form id="userForm">
+<input type="hidden" name="csrf_token" value="{token}">
+<label for="firstName">First name</label><input id="firstName" name="firstName" required>
+{extra}
+<button type="submit" id="submit">Submit</button>
+</form><footer>Rendered in {token} ms</footer></body></html>"""
+
+
+class FormPage(BaseHTTPRequestHandler):
+    extra = ""
+    loads = count(1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        # Every load gets a fresh token, like a CSRF-protected form
+        body = FORM_PAGE.format(token=next(self.loads), extra=self.extra).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def form_page_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FormPage)
+    FormPage.extra = ""
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/apply"
+    server.shutdown()
+
+
+def test_fresh_tokens_are_not_a_change(app_module, form_page_url):
+    entry = app_module.CachedFormSchema("{}")
+    app_module.fingerprint_page(form_page_url, entry)
+
+    assert entry.form_hash is not None
+    assert not app_module.form_page_changed(form_page_url, entry)
+    assert not app_module.form_page_changed(form_page_url, entry)
+
+
+def test_new_field_is_a_change(app_module, form_page_url):
+    entry = app_module.CachedFormSchema("{}")
+    app_module.fingerprint_page(form_page_url, entry)
+
+    FormPage.extra = '<label for="email">Email</label><input id="email" type="email">'
+
+    assert app_module.form_page_changed(form_page_url, entry)
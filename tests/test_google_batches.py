@@ -0,0 +1,111 @@
+"""Google HTTP batches: results come back in request order, with errors reported per item."""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import pytest
+from google.oauth2.credentials import Credentials
+from googleapiclient.errors import HttpError
+
+
+class BatchStandIn(BaseHTTPRequestHandler):
+    """
+    Answers Google HTTP batches, parts in *reverse* order (the API doesn't
+    promise any), so only Content-IDs tie a response to its request.
+    Deleting an event twice gives 410, like Calendar; IDs starting with
+    "missing" give 404. Inserted events echo their summary back.
+    """
+
+    protocol_version = "HTTP/1.1"
+    batches = []
+    deleted = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def _answer(self, method: str, path: str, body: str) -> tuple:
+        if method == "DELETE":
+            event_id = path.rsplit("/", 1)[-1]
+            if event_id.startswith("missing"):
+                return "404 Not Found", json.dumps({"error": {"code": 404, "message": "Not Found"}})
+            if event_id in self.deleted:
+                return "410 Gone", json.dumps({"error": {"code": 410, "message": "Resource has been deleted"}})
+            self.deleted.append(event_id)
+            return "204 No Content", ""
+        summary = json.loads(body)["summary"]
+        return "200 OK", json.dumps({"id": f"created-{summary}", "summary": summary})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode()
+        boundary = self.headers["Content-Type"].split("boundary=", 1)[1].strip('"')
+        parts = []
+        for part in body.split("--" + boundary)[1:]:
+            if part.startswith("--"):
+                break
+            outer, _, inner = part.replace("\r\n", "\n").strip("\n").partition("\n\n")
+            content_id = next(line.split(":", 1)[1].strip() for line in outer.splitlines() if line.lower().startswith("content-id"))
+            request_head, _, request_body = inner.partition("\n\n")
+            method, path = request_head.split(" ", 2)[:2]
+            status, payload = self._answer(method, urlsplit(path).path, request_body)
+            parts.append(
+                f"--batch_standin\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id[1:-1]}>\r\n\r\n"
+                f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n\r\n{payload}\r\n"
+            )
+        self.batches.append(len(parts))
+        payload = ("".join(reversed(parts)) + "--batch_standin--\r\n").encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "multipart/mixed; boundary=batch_standin")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+@pytest.fixture
+def calendar(app_module, monkeypatch):
+    """A Calendar client whose batches go to BatchStandIn."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), BatchStandIn)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    BatchStandIn.batches = []
+    BatchStandIn.deleted = []
+    monkeypatch.setattr(app_module, "GOOGLE_API_ROOT_URL", f"http://127.0.0.1:{server.server_port}/")
+    yield app_module.get_google_service("calendar", "v3", Credentials(token="token"))
+    server.shutdown()
+
+
+def test_results_keep_request_order_across_chunks(app_module, monkeypatch, calendar):
+    monkeypatch.setattr(app_module, "GOOGLE_BATCH_MAX_REQUESTS", 3)
+    api_requests = [
+        calendar.events().insert(calendarId="primary", body={"summary": f"event {i}"}) for i in range(7)
+    ]
+
+    results = app_module.execute_google_batch("calendar", "v3", api_requests)
+
+    assert BatchStandIn.batches == [3, 3, 1]
+    assert [response["summary"] for response, exception in results] == [f"event {i}" for i in range(7)]
+    assert all(exception is None for _, exception in results)
+
+
+def test_errors_are_reported_per_item(app_module, calendar):
+    event_ids = ["first", "missing-one", "second", "first"]
+    api_requests = [calendar.events().delete(calendarId="primary", eventId=event_id) for event_id in event_ids]
+
+    results = app_module.execute_google_batch("calendar", "v3", api_requests)
+
+    statuses = [exception.resp.status if exception else None for _, exception in results]
+    assert statuses == [None, 404, None, 410]
+    assert all(isinstance(exception, HttpError) for _, exception in results if exception)
+    assert app_module.google_error_reason(results[1][1]).startswith("404")
+
+
+def test_repeated_event_id_is_deleted_once(app_module, monkeypatch, calendar):
+    monkeypatch.setattr(app_module, "get_google_service", lambda api, version, creds: calendar)
+    ctx = app_module.ToolContext("batch-session")
+    ctx._google_credentials = object()
+
+    answer = app_module.delete_calendar_events.func(json.dumps({"event_ids": ["abc", "abc", "def"]}), ctx)
+
+    assert answer.startswith("🗑️ Deleted 2 of 2 events")
+    assert "Not deleted" not in answer
+    assert BatchStandIn.deleted == ["abc", "def"]
@@ -0,0 +1,48 @@
+"""The prompt history keeps older messages verbatim until the rolling summary covers them."""
+import pytest
+
+
+@pytest.fixture
+def history(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "HISTORY_TOKEN_BUDGET", 30)
+    # Hold the background summary back so the test sees the gap before it lands
+    scheduled = []
+    monkeypatch.setattr(app_module, "schedule_history_summary", lambda history, upto: scheduled.append(upto))
+    history = app_module.get_session_history("history-window-session")
+    history.clear()
+    for turn in range(6):
+        history.add_messages([
+            app_module.HumanMessage(content=f"question {turn} " + "x" * 40),
+            app_module.AIMessage(content=f"answer {turn} " + "y" * 40),
+        ])
+    history.scheduled = scheduled
+    yield history
+    history.clear()
+
+
+def test_messages_older_than_the_window_stay_until_summarized(app_module, history):
+    context = app_module.build_history_context(history)
+
+    for turn in range(6):
+        assert f"question {turn}" in context
+        assert f"answer {turn}" in context
+    assert "Summary of earlier conversation" not in context
+
+
+def test_summarized_messages_are_replaced_by_the_summary(app_module, history):
+    history.summary = "The user asked questions 0 to 3."
+    history.summary_upto = 8
+
+    context = app_module.build_history_context(history)
+
+    assert context.startswith("Summary of earlier conversation: The user asked questions 0 to 3.")
+    assert "question 3" not in context
+    assert "question 4" in context and "answer 5" in context
+
+
+def test_summary_is_scheduled_for_the_messages_outside_the_window(app_module, monkeypatch, history):
+    monkeypatch.setattr(app_module, "HISTORY_SUMMARY_TRIGGER_TOKENS", 1)
+
+    app_module.build_history_context(history)
+
+    assert history.scheduled and history.scheduled[0] < len(history.messages)
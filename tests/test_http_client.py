@@ -0,0 +1,71 @@
+"""The shared HTTP client retries retryable statuses and honours Retry-After."""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class FlakyUpstream(BaseHTTPRequestHandler):
+    """Answers the scripted (status, headers) pairs in order, then 200s."""
+
+    protocol_version = "HTTP/1.1"
+    script = []
+    arrivals = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.arrivals.append(time.monotonic())
+        status, headers = self.script.pop(0) if self.script else (200, {})
+        body = b"ok" if status == 200 else b"busy"
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def upstream_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyUpstream)
+    FlakyUpstream.arrivals = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/resource"
+    server.shutdown()
+
+
+def test_503_with_retry_after_is_retried_once_after_the_delay(app_module, upstream_url):
+    FlakyUpstream.script = [(503, {"Retry-After": "1"})]
+
+    response = app_module.http_client.get(upstream_url, upstream="test-upstream")
+
+    assert response.status_code == 200
+    assert response.text == "ok"
+    assert len(FlakyUpstream.arrivals) == 2
+    assert FlakyUpstream.arrivals[1] - FlakyUpstream.arrivals[0] >= 1.0
+
+
+def test_retry_after_beyond_the_cap_is_returned_as_is(app_module, upstream_url):
+    FlakyUpstream.script = [(503, {"Retry-After": str(int(app_module.HTTP_RETRY_AFTER_MAX) + 60)})]
+
+    response = app_module.http_client.get(upstream_url, upstream="test-upstream")
+
+    assert response.status_code == 503
+    assert len(FlakyUpstream.arrivals) == 1
+
+
+@pytest.mark.parametrize("value, expected", [("3", 3.0), ("-5", 0.0), ("soon", None), (None, None)])
+def test_parse_retry_after_seconds(app_module, value, expected):
+    assert app_module.parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_http_date(app_module):
+    from email.utils import format_datetime
+    from datetime import datetime, timedelta, timezone
+
+    when = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=20), usegmt=True)
+
+    assert 15 < app_module.parse_retry_after(when) <= 20
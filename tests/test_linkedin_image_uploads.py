@@ -0,0 +1,102 @@
+"""Background LinkedIn image uploads against a local stand-in of the assets API."""
+import io
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+SESSION_ID = "test-session"
+
+
+def start_upload(app_module, standin, asset_id: str, statuses: list):
+    standin.scripts[asset_id] = list(statuses)
+    upload_info = {
+        "asset_urn": f"urn:li:digitalmediaAsset:{asset_id}",
+        "upload_url": f"{standin.base_url}/upload/{asset_id}",
+    }
+    return app_module.start_linkedin_image_upload("token", upload_info, io.BytesIO(b"\x89PNG image bytes"), "image/png")
+
+
+@pytest.fixture
+def client(app_module):
+    client = app_module.app.test_client()
+    with client.session_transaction() as flask_session:
+        flask_session["session_id"] = SESSION_ID
+    # The status route rechecks timed-out uploads with the session's LinkedIn token
+    app_module.credential_cache.set((SESSION_ID, "linkedin"), {
+        "id": 1,
+        "access_token": "token",
+        "expires_at": (datetime.now(timezone.utc) + timedelta(days=30)).isoformat(),
+        "other_details": {"urn": "urn:li:person:test"},
+    })
+    yield client
+    app_module.pending_linkedin_assets.invalidate(SESSION_ID)
+
+
+def poll_statuses(client, until: set, timeout: float = 5) -> list:
+    """Distinct statuses reported by the status route, in order, until one in `until` shows up."""
+    seen = []
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = client.get("/upload/linkedin/image/status").get_json()["status"]
+        if not seen or seen[-1] != status:
+            seen.append(status)
+        if status in until:
+            break
+        time.sleep(0.01)
+    return seen
+
+
+def test_wait_for_asset_returns_available_after_processing(app_module, linkedin_standin):
+    linkedin_standin.scripts["asset1"] = ["PROCESSING", "PROCESSING", "AVAILABLE"]
+
+    status = app_module.wait_for_linkedin_asset("token", "urn:li:digitalmediaAsset:asset1", timeout=5)
+
+    assert status == "AVAILABLE"
+    assert [path for method, path in linkedin_standin.requests if method == "GET"] == ["/v2/assets/asset1"] * 3
+
+
+def test_wait_for_asset_gives_up_while_still_processing(app_module, linkedin_standin):
+    linkedin_standin.scripts["asset2"] = ["PROCESSING"]
+
+    start = time.monotonic()
+    status = app_module.wait_for_linkedin_asset("token", "urn:li:digitalmediaAsset:asset2", timeout=0.2)
+
+    assert status == "PROCESSING"
+    assert time.monotonic() - start < 1
+
+
+def test_upload_becomes_available(app_module, linkedin_standin, client):
+    upload = start_upload(app_module, linkedin_standin, "asset3", ["PROCESSING"] * 3 + ["AVAILABLE"])
+    app_module.pending_linkedin_assets.set(SESSION_ID, upload)
+
+    seen = poll_statuses(client, until={"available", "failed", "timed_out"})
+
+    assert seen[-1] == "available"
+    assert "processing" in seen
+    assert seen.index("processing") < seen.index("available")
+    assert ("PUT", "/upload/asset3") in linkedin_standin.requests
+
+
+def test_upload_still_processing_times_out_instead_of_failing(app_module, linkedin_standin, client):
+    upload = start_upload(app_module, linkedin_standin, "asset4", ["PROCESSING"])
+    app_module.pending_linkedin_assets.set(SESSION_ID, upload)
+
+    assert upload.wait(5) == "timed_out"
+    assert client.get("/upload/linkedin/image/status").get_json()["status"] == "timed_out"
+
+    # LinkedIn finishes later: the next status check notices
+    linkedin_standin.scripts["asset4"] = ["AVAILABLE"]
+    assert client.get("/upload/linkedin/image/status").get_json()["status"] == "available"
+
+
+def test_upload_reported_failed(app_module, linkedin_standin, client):
+    upload = start_upload(app_module, linkedin_standin, "asset5", ["PROCESSING", "CLIENT_ERROR"])
+    app_module.pending_linkedin_assets.set(SESSION_ID, upload)
+
+    seen = poll_statuses(client, until={"available", "failed", "timed_out"})
+
+    assert seen[-1] == "failed"
+    body = client.get("/upload/linkedin/image/status").get_json()
+    assert body["status"] == "failed"
+    assert "CLIENT_ERROR" in body["error"]
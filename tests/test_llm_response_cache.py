@@ -0,0 +1,43 @@
+"""Prompts with user data never reach the LLM cache's disk tier, which is off by default."""
+import sqlite3
+from types import SimpleNamespace
+
+
+class CountingModel:
+    model = "test-model"
+    temperature = 0
+
+    def __init__(self):
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        return SimpleNamespace(content=f"answer to {prompt}")
+
+
+def disk_rows(path) -> list:
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT response FROM llm_responses").fetchall()
+
+
+def test_disk_tier_is_off_by_default(app_module, monkeypatch):
+    model = CountingModel()
+    monkeypatch.setattr(app_module, "llm_response_cache", app_module.LLMResponseCache(None, 60, 16, 1024 * 1024))
+
+    assert app_module.cached_llm_invoke(model, "form schema") == app_module.cached_llm_invoke(model, "form schema")
+    assert len(model.prompts) == 1
+    assert app_module.llm_response_cache.stats()["disk_enabled"] is False
+    assert not app_module.LLM_CACHE_DISK_ENABLED
+
+
+def test_persist_false_stays_in_memory(app_module, monkeypatch, tmp_path):
+    path = tmp_path / "llm_cache.sqlite3"
+    monkeypatch.setattr(app_module, "llm_response_cache", app_module.LLMResponseCache(str(path), 60, 16, 1024 * 1024))
+    model = CountingModel()
+
+    app_module.cached_llm_invoke(model, "User Data: jane@example.com", persist=False)
+    app_module.cached_llm_invoke(model, "User Data: jane@example.com", persist=False)
+    app_module.cached_llm_invoke(model, "form schema")
+
+    assert len(model.prompts) == 2
+    assert disk_rows(path) == [("answer to form schema",)]
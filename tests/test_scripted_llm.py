@@ -0,0 +1,33 @@
+"""The scripted LLM backend ships next to app.py and works without the benchmarks package."""
+import os
+import shutil
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ASK_SCRIPTED_LLM = "import app; print(app.create_chat_model(temperature=0).invoke('Question: hi').content)"
+
+
+def test_scripted_backend_without_benchmarks(tmp_path):
+    # A trimmed deployment: only the application modules, no benchmarks/
+    for name in ("app.py", "scripted_llm.py"):
+        shutil.copy(os.path.join(ROOT, name), tmp_path)
+    env = {**os.environ, "LLM_BACKEND": "scripted", "PYTHONPATH": ""}
+    env.pop("SCRIPTED_LLM_TRANSCRIPTS", None)
+
+    result = subprocess.run(
+        [sys.executable, "-c", ASK_SCRIPTED_LLM], cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120
+    )
+
+    assert result.returncode == 0, result.stderr[-2000:]
+    assert result.stdout.strip().splitlines()[-1] == "Final Answer: OK"
+
+
+def test_transcripts_are_replayed(app_module):
+    from scripted_llm import ScriptedChatModel
+
+    model = ScriptedChatModel(transcripts=[{"match": "weather", "steps": ["Action: get_weather_data", "Final Answer: Sunny"]}])
+
+    assert model.reply_for("Question: what's the weather in Pune?") == "Action: get_weather_data"
+    assert model.reply_for("Question: what's the weather in Pune?\nObservation: 31°C") == "Final Answer: Sunny"
+    assert model.reply_for("Summarize this conversation") == model.plain_reply
@@ -0,0 +1,200 @@
+"""Background OAuth token refresh: what counts as a rejection, single flight, retries and idle sessions."""
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+
+class LinkedInTokenEndpoint(BaseHTTPRequestHandler):
+    """Answers every token request with the scripted (status, body)."""
+
+    reply = (200, {})
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        status, body = self.reply
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+@pytest.fixture
+def linkedin_token_url(app_module, monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), LinkedInTokenEndpoint)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(app_module, "LINKEDIN_TOKEN_URL", f"http://127.0.0.1:{server.server_port}/oauth/v2/accessToken")
+    yield
+    server.shutdown()
+
+
+LINKEDIN_ROW = {"id": 7, "access_token": "old", "refresh_token": "refresh", "expires_at": "2026-01-01T00:00:00+00:00"}
+
+
+def test_linkedin_invalid_grant_is_a_rejection(app_module, linkedin_token_url):
+    LinkedInTokenEndpoint.reply = (400, {"error": "invalid_grant", "error_description": "The token is revoked"})
+
+    with pytest.raises(app_module.TokenRefreshRejected):
+        app_module.refresh_linkedin_row(dict(LINKEDIN_ROW))
+
+
+@pytest.mark.parametrize("status, body", [
+    (401, {"error": "invalid_client", "error_description": "Client authentication failed"}),
+    (400, {"error": "invalid_request"}),
+    (400, "not json"),
+])
+def test_other_linkedin_errors_are_retryable(app_module, linkedin_token_url, status, body):
+    LinkedInTokenEndpoint.reply = (status, body)
+
+    with pytest.raises(requests.HTTPError):
+        app_module.refresh_linkedin_row(dict(LINKEDIN_ROW))
+
+
+class FakeSupabase:
+    """Records deletes on user_credentials; nothing else is expected of it here."""
+
+    def __init__(self):
+        self.deleted = []
+
+    def table(self, name):
+        assert name == "user_credentials"
+        return self
+
+    def delete(self):
+        return self
+
+    def eq(self, column, value):
+        self._deleting = value
+        return self
+
+    def execute(self):
+        self.deleted.append(self._deleting)
+        return None
+
+
+class StoredRows:
+    """Stands in for Supabase behind `fetch_credential_row`, and for the provider's refresh call."""
+
+    def __init__(self, expires_in: int, refresh_delay: float = 0.0, failures=()):
+        self.row = {"id": 42, "access_token": "old", "refresh_token": "refresh", "expires_at": in_seconds(expires_in)}
+        self.refresh_delay = refresh_delay
+        self.failures = list(failures)
+        self.refresh_times = []
+        self._lock = threading.Lock()
+
+    def fetch(self, session_id, provider):
+        with self._lock:
+            return dict(self.row) if self.row else None
+
+    def refresh(self, cred_data):
+        with self._lock:
+            self.refresh_times.append(time.monotonic())
+            failure = self.failures.pop(0) if self.failures else None
+        time.sleep(self.refresh_delay)
+        if failure:
+            raise failure
+        with self._lock:
+            self.row = {**cred_data, "access_token": "new", "expires_at": in_seconds(3600)}
+            return dict(self.row)
+
+
+def in_seconds(seconds: int) -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds)).isoformat()
+
+
+def wait_until(condition, timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def fakes(app_module, monkeypatch):
+    supabase = FakeSupabase()
+    changed = []
+    monkeypatch.setattr(app_module, "supabase", supabase)
+    monkeypatch.setattr(app_module, "credentials_changed", lambda session_id, provider: changed.append((session_id, provider)))
+    return supabase, changed
+
+
+def make_refresher(app_module, monkeypatch, rows: StoredRows, active_window: int = 3600, retry_delay: float = 60):
+    monkeypatch.setattr(app_module, "fetch_credential_row", rows.fetch)
+    return app_module.TokenRefresher({"linkedin": rows.refresh}, 600, active_window, retry_delay, 2)
+
+
+def test_concurrent_inline_refreshes_coalesce(app_module, monkeypatch, fakes):
+    rows = StoredRows(expires_in=-10, refresh_delay=0.1)
+    refresher = make_refresher(app_module, monkeypatch, rows)
+    callers = 8
+    barrier = threading.Barrier(callers)
+    results = []
+
+    def call():
+        barrier.wait()
+        results.append(refresher.refresh("sid", "linkedin", inline=True))
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    counts = refresher.stats()["refreshes"]
+    assert len(rows.refresh_times) == 1
+    assert counts["inline"] == 1
+    assert counts["coalesced"] == callers - 1
+    assert all(result["access_token"] == "new" for result in results)
+
+
+def test_rejection_deletes_the_row(app_module, monkeypatch, fakes):
+    supabase, changed = fakes
+    rows = StoredRows(expires_in=-10, failures=[app_module.TokenRefreshRejected("invalid_grant")])
+    refresher = make_refresher(app_module, monkeypatch, rows)
+
+    assert refresher.refresh("sid", "linkedin", inline=True) is None
+
+    assert supabase.deleted == [42]
+    assert changed == [("sid", "linkedin")]
+    assert refresher.stats()["refreshes"]["rejected"] == 1
+
+
+def test_network_error_is_retried_after_the_delay_and_keeps_the_row(app_module, monkeypatch, fakes):
+    supabase, changed = fakes
+    rows = StoredRows(expires_in=60, failures=[requests.ConnectionError("connection reset")])
+    refresher = make_refresher(app_module, monkeypatch, rows, retry_delay=0.3)
+
+    # Expiring within the margin, so the scheduler refreshes it right away
+    refresher.track("sid", "linkedin", rows.fetch("sid", "linkedin"))
+
+    assert wait_until(lambda: refresher.stats()["refreshes"]["background"] == 1)
+    assert len(rows.refresh_times) == 2
+    assert rows.refresh_times[1] - rows.refresh_times[0] >= 0.3
+    assert refresher.stats()["refreshes"]["failed"] == 1
+    assert supabase.deleted == [] and changed == []
+    assert rows.row["access_token"] == "new"
+
+
+def test_idle_session_is_skipped(app_module, monkeypatch, fakes):
+    supabase, changed = fakes
+    rows = StoredRows(expires_in=60)
+    refresher = make_refresher(app_module, monkeypatch, rows, active_window=1)
+
+    # Last used two hours ago, then its expiry comes due
+    refresher._last_used[("sid", "linkedin")] = time.time() - 7200
+    refresher._schedule("sid", "linkedin", rows.fetch("sid", "linkedin"))
+
+    assert wait_until(lambda: refresher.stats()["refreshes"]["skipped_idle"] == 1)
+    assert rows.refresh_times == []
+    assert supabase.deleted == []
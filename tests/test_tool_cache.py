@@ -0,0 +1,30 @@
+"""Web search results are cached, but empty searches are retried."""
+
+
+class ScriptedSearch:
+    def __init__(self, *results):
+        self.results = list(results)
+        self.queries = []
+
+    def run(self, query):
+        self.queries.append(query)
+        return self.results.pop(0)
+
+
+def test_no_result_sentinel_is_not_cached(app_module, monkeypatch):
+    search = ScriptedSearch(app_module.NO_SEARCH_RESULT, "Paris is the capital of France.")
+    monkeypatch.setattr(app_module, "search", search)
+
+    assert app_module.search_the_web.invoke({"query": "capital of france?"}) == app_module.NO_SEARCH_RESULT
+    assert app_module.search_the_web.invoke({"query": "capital of france?"}) == "Paris is the capital of France."
+    assert app_module.search_the_web.invoke({"query": "Capital of France?"}) == "Paris is the capital of France."
+    assert len(search.queries) == 2
+
+
+def test_empty_result_is_not_cached(app_module, monkeypatch):
+    search = ScriptedSearch("  ", "Mount Everest, at 8,849 m.")
+    monkeypatch.setattr(app_module, "search", search)
+
+    app_module.search_the_web.invoke({"query": "highest mountain"})
+    assert app_module.search_the_web.invoke({"query": "highest mountain"}) == "Mount Everest, at 8,849 m."
+    assert len(search.queries) == 2
@@ -0,0 +1,48 @@
+"""Usage records carry no raw session ids, and the per-turn export needs the admin token."""
+import json
+
+import pytest
+
+SESSION_ID = "usage-session"
+
+
+@pytest.fixture
+def client(app_module):
+    client = app_module.app.test_client()
+    with client.session_transaction() as flask_session:
+        flask_session["session_id"] = SESSION_ID
+    return client
+
+
+@pytest.fixture
+def recorded_turn(app_module):
+    usage = app_module.UsageCallbackHandler(SESSION_ID)
+    turn = usage.summary()
+    app_module.usage_ledger.record(turn)
+    return turn
+
+
+def test_turns_carry_a_salted_hash_instead_of_the_session_id(app_module, recorded_turn, client):
+    assert "session_id" not in recorded_turn
+    assert SESSION_ID not in json.dumps(recorded_turn)
+    assert recorded_turn["session"] == app_module.usage_session_key(SESSION_ID)
+    assert client.get("/stats/usage/session").get_json()["turns"] >= 1
+    assert SESSION_ID not in client.get("/stats/usage").get_data(as_text=True)
+
+
+def test_export_is_disabled_without_a_token(app_module, monkeypatch, recorded_turn, client):
+    monkeypatch.setattr(app_module, "USAGE_EXPORT_TOKEN", None)
+
+    assert client.get("/stats/usage/export").status_code == 404
+
+
+def test_export_needs_the_bearer_token(app_module, monkeypatch, recorded_turn, client):
+    monkeypatch.setattr(app_module, "USAGE_EXPORT_TOKEN", "admin-token")
+
+    assert client.get("/stats/usage/export").status_code == 401
+    assert client.get("/stats/usage/export", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/stats/usage/export", headers={"Authorization": "Bearer admin-token"})
+    assert response.status_code == 200
+    turns = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert recorded_turn in turns
+    assert SESSION_ID not in response.get_data(as_text=True)